@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Agregados de Sprints - MÉTRICAS PRECALCULADAS POR PERSONA Y ÁREA
+A partir del histórico Parquet calcula por sprint el cumplimiento de carga, las
+violaciones y la proporción de imprevistas de cada persona y área, y los guarda
+como tablas particionadas junto al histórico. Solo se recalculan los sprints cuyas
+particiones de Performance o Tareas son más nuevas que su agregado, así que el
+costo de cada actualización no crece con el número de sprints
+
+Uso:
+    python agregados_sprints.py                  # actualiza los agregados desactualizados
+"""
+
+import sys
+import logging
+import argparse
+
+import numpy as np
+import pyarrow as pa
+
+from historico_sprints import (
+    DIRECTORIO_HISTORICO, SIN_SPRINT, escribir_particion, leer_tabla, particiones
+)
+
+logger = logging.getLogger(__name__)
+
+TABLA_POR_PERSONA = "agregados/por_persona"
+TABLA_POR_AREA = "agregados/por_area"
+
+# Personas con tareas pero sin registro de Performance (sprint aún abierto)
+SIN_AREA = "Sin área"
+
+_CONTEOS = [
+    ("carga_asignada", pa.float64()),
+    ("carga_completada", pa.float64()),
+    ("tareas_totales", pa.int64()),
+    ("tareas_completadas", pa.int64()),
+    ("tareas", pa.int64()),
+    ("violaciones", pa.int64()),
+    ("imprevistas", pa.int64()),
+    ("imprevistas_completadas", pa.int64()),
+    ("cumplimiento", pa.float64()),
+    ("ratio_imprevistas", pa.float64())
+]
+
+ESQUEMA_POR_PERSONA = pa.schema([
+    ("persona_id", pa.string()),
+    ("persona", pa.string()),
+    ("area", pa.string()),
+    *_CONTEOS
+])
+
+ESQUEMA_POR_AREA = pa.schema([
+    ("area", pa.string()),
+    ("personas", pa.int64()),
+    *_CONTEOS
+])
+
+SUMABLES = [nombre for nombre, _ in _CONTEOS[:-2]]
+ENTEROS = [nombre for nombre, tipo in _CONTEOS if tipo == pa.int64()]
+
+
+def _ratios(tabla):
+    """Cumplimiento (carga completada / asignada) y proporción de imprevistas; NaN sin base"""
+    tabla["cumplimiento"] = tabla["carga_completada"] / tabla["carga_asignada"].replace(0, np.nan)
+    tabla["ratio_imprevistas"] = tabla["imprevistas"] / tabla["tareas"].replace(0, np.nan)
+    return tabla
+
+
+def agregar_por_persona(performance, tareas):
+    """Una fila por persona del sprint
+
+    performance: registros de Performance del sprint (cierre); tareas: tareas del sprint.
+    Una tarea con varias personas cuenta para cada una (igual que el cierre)
+    """
+    asignadas = tareas[["id", "personas", "prioridad", "estado", "violaciones"]].explode("personas")
+    asignadas = asignadas.dropna(subset=["personas"]).rename(columns={"personas": "persona_id"})
+    imprevista = asignadas["prioridad"].fillna("").str.lower() == "imprevista"
+    asignadas = asignadas.assign(
+        imprevista=imprevista,
+        imprevista_completada=imprevista & (asignadas["estado"] == "Listo"),
+        violaciones=asignadas["violaciones"].fillna(0)
+    )
+    por_tareas = asignadas.groupby("persona_id").agg(
+        tareas=("id", "size"),
+        violaciones=("violaciones", "sum"),
+        imprevistas=("imprevista", "sum"),
+        imprevistas_completadas=("imprevista_completada", "sum")
+    )
+
+    registros = performance[[
+        "persona_id", "nombre", "area", "carga_asignada", "carga_completada",
+        "tareas_totales", "tareas_completadas"
+    ]].dropna(subset=["persona_id"]).drop_duplicates("persona_id", keep="last").set_index("persona_id")
+    # El registro se nombra "<persona> - <sprint>"
+    registros["persona"] = registros.pop("nombre").str.rsplit(" - ", n=1).str[0]
+
+    tabla = registros.join(por_tareas, how="outer").reset_index()
+    tabla["persona"] = tabla["persona"].fillna(tabla["persona_id"])
+    tabla["area"] = tabla["area"].fillna(SIN_AREA)
+    tabla[SUMABLES] = tabla[SUMABLES].fillna(0)
+    tabla[ENTEROS] = tabla[ENTEROS].astype("int64")
+    return _ratios(tabla)[ESQUEMA_POR_PERSONA.names]
+
+
+def agregar_por_area(por_persona):
+    """Suma por área de los agregados por persona (los ratios se recalculan sobre las sumas)"""
+    tabla = por_persona.groupby("area")[SUMABLES].sum()
+    tabla["personas"] = por_persona.groupby("area").size()
+    return _ratios(tabla.reset_index())[ESQUEMA_POR_AREA.names]
+
+
+def _filas(tabla):
+    return tabla.astype(object).where(tabla.notna(), None).to_dict("records")
+
+
+def desactualizados(directorio=DIRECTORIO_HISTORICO):
+    """(sprints a recalcular, sprints cuyo origen ya no existe)"""
+    fuentes = {}
+    for tabla in ("performance", "tareas"):
+        for sprint_id, escrito in particiones(tabla, directorio).items():
+            fuentes[sprint_id] = max(escrito, fuentes.get(sprint_id, 0))
+    fuentes.pop(SIN_SPRINT, None)
+
+    calculados = particiones(TABLA_POR_PERSONA, directorio)
+    pendientes = [sprint_id for sprint_id, escrito in fuentes.items() if calculados.get(sprint_id, -1) < escrito]
+    huerfanos = [sprint_id for sprint_id in calculados if sprint_id not in fuentes]
+    return pendientes, huerfanos
+
+
+def actualizar_agregados(directorio=DIRECTORIO_HISTORICO):
+    """Recalcula solo los sprints con datos nuevos; lee únicamente sus particiones
+
+    Returns: sprints recalculados
+    """
+    pendientes, huerfanos = desactualizados(directorio)
+    for sprint_id in huerfanos:
+        escribir_particion(TABLA_POR_PERSONA, sprint_id, [], directorio, ESQUEMA_POR_PERSONA)
+        escribir_particion(TABLA_POR_AREA, sprint_id, [], directorio, ESQUEMA_POR_AREA)
+    if not pendientes:
+        return 0
+
+    performance = leer_tabla("performance", sprints=pendientes, directorio=directorio).to_pandas()
+    tareas = leer_tabla("tareas", columnas=["id", "personas", "prioridad", "estado", "violaciones", "sprint_id"],
+                        sprints=pendientes, directorio=directorio).to_pandas()
+    por_sprint_performance = dict(tuple(performance.groupby("sprint_id")))
+    por_sprint_tareas = dict(tuple(tareas.groupby("sprint_id")))
+
+    for sprint_id in pendientes:
+        por_persona = agregar_por_persona(
+            por_sprint_performance.get(sprint_id, performance.iloc[0:0]),
+            por_sprint_tareas.get(sprint_id, tareas.iloc[0:0])
+        )
+        # Por área primero: el agregado por persona marca el sprint como al día
+        escribir_particion(TABLA_POR_AREA, sprint_id, _filas(agregar_por_area(por_persona)),
+                           directorio, ESQUEMA_POR_AREA)
+        escribir_particion(TABLA_POR_PERSONA, sprint_id, _filas(por_persona), directorio, ESQUEMA_POR_PERSONA)
+    return len(pendientes)
+
+
+def leer_agregados(sprints=None, directorio=DIRECTORIO_HISTORICO):
+    """(por_persona, por_area) como DataFrames con nombre y fechas del sprint
+
+    sprints: ids a leer; el resto de particiones no se abre
+    """
+    info = leer_tabla("sprints", columnas=["id", "nombre", "fecha_inicio", "fecha_fin"], sprints=sprints,
+                      directorio=directorio).to_pandas()
+    info = info.rename(columns={"id": "sprint_id", "nombre": "sprint"})
+    resultado = []
+    for tabla, esquema in ((TABLA_POR_PERSONA, ESQUEMA_POR_PERSONA), (TABLA_POR_AREA, ESQUEMA_POR_AREA)):
+        datos = leer_tabla(tabla, sprints=sprints, directorio=directorio, esquema=esquema).to_pandas()
+        datos = datos.merge(info, on="sprint_id", how="left")
+        datos["sprint"] = datos["sprint"].fillna(datos["sprint_id"])
+        resultado.append(datos)
+    return tuple(resultado)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Recalcula los agregados por persona y área del histórico")
+    parser.add_argument("--directorio", default=DIRECTORIO_HISTORICO, help="Directorio del almacén")
+    args = parser.parse_args()
+
+    recalculados = actualizar_agregados(args.directorio)
+    logger.info(f"📊 Agregados recalculados: {recalculados} sprints")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Dashboard de Sprints - PERFORMANCE POR PERSONA Y ÁREA (STREAMLIT)
+Cumplimiento de carga, violaciones y proporción de imprevistas por persona y área.
+Lee solo el histórico Parquet local y sus agregados precalculados: renderizar nunca
+consulta Notion. Las lecturas se memorizan por versión del almacén (la marca de la
+última exportación), así que una página cargada no vuelve a tocar disco hasta que
+llega una exportación nueva; el botón de actualización es el único camino a la API
+
+Uso:
+    streamlit run dashboard_sprints.py
+    HISTORICO_DIRECTORIO=/ruta/historico streamlit run dashboard_sprints.py
+"""
+
+import os
+
+import altair as alt
+import streamlit as st
+
+from historico_sprints import ARCHIVO_ESTADO, DIRECTORIO_HISTORICO, exportar, leer_tabla
+from agregados_sprints import actualizar_agregados, leer_agregados
+
+# Sprints seleccionados al abrir el dashboard
+SPRINTS_POR_DEFECTO = 6
+
+
+def version_almacen(directorio):
+    """Cambia con cada exportación: invalida las lecturas memorizadas"""
+    try:
+        return os.stat(os.path.join(directorio, ARCHIVO_ESTADO)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+@st.cache_data(show_spinner=False)
+def preparar_almacen(directorio, version):
+    """Recalcula los agregados desactualizados una vez por versión del almacén"""
+    return actualizar_agregados(directorio)
+
+
+@st.cache_data(show_spinner=False)
+def sprints_disponibles(directorio, version):
+    sprints = leer_tabla("sprints", columnas=["id", "nombre", "fecha_fin"], directorio=directorio).to_pandas()
+    return sprints.sort_values("fecha_fin", ascending=False, na_position="last")
+
+
+@st.cache_data(show_spinner=False)
+def agregados(directorio, version, sprints):
+    """(por_persona, por_area) de los sprints elegidos; solo se leen sus particiones"""
+    return leer_agregados(list(sprints), directorio)
+
+
+def grafico_barras(datos, campo, titulo, formato, eje="persona"):
+    return alt.Chart(datos).mark_bar().encode(
+        x=alt.X(f"{campo}:Q", title=titulo, axis=alt.Axis(format=formato)),
+        y=alt.Y(f"{eje}:N", sort="-x", title=None),
+        color=alt.Color("sprint:N", title="Sprint"),
+        yOffset="sprint:N",
+        tooltip=[eje, "sprint", alt.Tooltip(f"{campo}:Q", format=formato)]
+    )
+
+
+def grafico_evolucion(datos, campo, titulo, formato):
+    return alt.Chart(datos).mark_line(point=True).encode(
+        x=alt.X("fecha_fin:T", title="Fin del sprint"),
+        y=alt.Y(f"{campo}:Q", title=titulo, axis=alt.Axis(format=formato)),
+        color=alt.Color("area:N", title="Área"),
+        tooltip=["area", "sprint", alt.Tooltip(f"{campo}:Q", format=formato)]
+    )
+
+
+def barra_lateral(directorio):
+    """Selección de sprints/áreas y actualización manual desde Notion"""
+    st.sidebar.header("📊 Filtros")
+    if st.sidebar.button("🔄 Actualizar desde Notion", help="Exportación incremental del histórico"):
+        with st.spinner("Exportando cambios desde la última actualización..."):
+            resumen = exportar(directorio=directorio)
+        st.sidebar.success(" | ".join(f"{tabla}: {registros}" for tabla, (registros, _) in resumen.items()))
+
+    version = version_almacen(directorio)
+    preparar_almacen(directorio, version)
+    sprints = sprints_disponibles(directorio, version)
+    nombres = dict(zip(sprints["id"], sprints["nombre"].fillna(sprints["id"])))
+    elegidos = st.sidebar.multiselect(
+        "Sprints", options=list(nombres), default=list(nombres)[:SPRINTS_POR_DEFECTO],
+        format_func=nombres.get
+    )
+    return version, elegidos
+
+
+def main():
+    st.set_page_config(page_title="Performance de Sprints", page_icon="📊", layout="wide")
+    st.title("📊 Performance de Sprints")
+    directorio = DIRECTORIO_HISTORICO
+
+    if not os.path.isdir(directorio):
+        st.warning(f"No hay histórico en '{directorio}'. Ejecuta historico_sprints.py o usa "
+                   "🔄 Actualizar desde Notion.")
+    version, elegidos = barra_lateral(directorio)
+    if not elegidos:
+        st.info("Selecciona al menos un sprint")
+        return
+
+    por_persona, por_area = agregados(directorio, version, tuple(sorted(elegidos)))
+    areas = sorted(por_area["area"].unique())
+    areas_elegidas = st.sidebar.multiselect("Áreas", options=areas, default=areas)
+    por_persona = por_persona[por_persona["area"].isin(areas_elegidas)]
+    por_area = por_area[por_area["area"].isin(areas_elegidas)]
+
+    carga_asignada = por_area["carga_asignada"].sum()
+    tareas = por_area["tareas"].sum()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("🎯 Cumplimiento de carga",
+                f"{por_area['carga_completada'].sum() / carga_asignada:.0%}" if carga_asignada else "—")
+    col2.metric("🚨 Violaciones", int(por_area["violaciones"].sum()))
+    col3.metric("⚡ Imprevistas", f"{por_area['imprevistas'].sum() / tareas:.0%}" if tareas else "—")
+    col4.metric("👥 Personas", por_persona["persona_id"].nunique())
+
+    tab_personas, tab_areas, tab_evolucion = st.tabs(["👤 Por persona", "🏢 Por área", "📈 Evolución"])
+
+    with tab_personas:
+        st.altair_chart(grafico_barras(por_persona, "cumplimiento", "Cumplimiento de carga", ".0%"),
+                        use_container_width=True)
+        izquierda, derecha = st.columns(2)
+        izquierda.altair_chart(grafico_barras(por_persona, "violaciones", "Violaciones", "d"),
+                               use_container_width=True)
+        derecha.altair_chart(grafico_barras(por_persona, "ratio_imprevistas", "Proporción imprevistas", ".0%"),
+                             use_container_width=True)
+        st.dataframe(por_persona.drop(columns=["persona_id", "sprint_id"]), use_container_width=True,
+                     hide_index=True)
+
+    with tab_areas:
+        st.altair_chart(grafico_barras(por_area, "cumplimiento", "Cumplimiento de carga", ".0%", eje="area"),
+                        use_container_width=True)
+        izquierda, derecha = st.columns(2)
+        izquierda.altair_chart(grafico_barras(por_area, "violaciones", "Violaciones", "d", eje="area"),
+                               use_container_width=True)
+        derecha.altair_chart(grafico_barras(por_area, "ratio_imprevistas", "Proporción imprevistas", ".0%", eje="area"),
+                             use_container_width=True)
+        st.dataframe(por_area.drop(columns=["sprint_id"]), use_container_width=True, hide_index=True)
+
+    with tab_evolucion:
+        for campo, titulo, formato in (("cumplimiento", "Cumplimiento de carga", ".0%"),
+                                       ("violaciones", "Violaciones", "d"),
+                                       ("ratio_imprevistas", "Proporción imprevistas", ".0%")):
+            st.altair_chart(grafico_evolucion(por_area, campo, titulo, formato), use_container_width=True)
+
+
+if __name__ == "__main__":
+    main()
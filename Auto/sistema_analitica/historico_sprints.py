@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Histórico de Sprints - ALMACÉN COLUMNAR LOCAL (PARQUET)
+Exporta de forma incremental los registros de Performance, Tareas y Sprints a
+datasets Parquet particionados por sprint (sprint_id=<id>/parte.parquet).
+Cada ejecución solo pide a Notion lo editado desde la marca de agua anterior y
+reescribe únicamente las particiones afectadas; los análisis y el dashboard leen
+en local con filtros que descartan particiones completas (sin llamar a la API)
+
+Uso:
+    python historico_sprints.py                  # incremental desde la última marca
+    python historico_sprints.py --completo       # reconstruye todo (recoge páginas eliminadas)
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+from datetime import datetime, timezone, timedelta
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from notion_client import Client
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+NOTION_TOKEN = os.getenv("NOTION_TOKEN")
+DB_SPRINTS_ID = os.getenv("DB_SPRINTS_ID")
+DB_TAREAS_ID = os.getenv("DB_TAREAS_ID")
+DB_PERFORMANCE_ID = os.getenv("DB_PERFORMANCE_ID")
+
+notion = Client(auth=NOTION_TOKEN)
+
+DIRECTORIO_HISTORICO = os.getenv("HISTORICO_DIRECTORIO", "historico_sprints")
+ARCHIVO_ESTADO = "_estado.json"
+ARCHIVO_PARTICION = "parte.parquet"
+
+# Tareas sin sprint (o registros sin relación) van a su propia partición
+SIN_SPRINT = "sin_sprint"
+
+PARTICIONADO = ds.partitioning(pa.schema([("sprint_id", pa.string())]), flavor="hive")
+
+ESQUEMAS = {
+    "performance": pa.schema([
+        ("id", pa.string()),
+        ("nombre", pa.string()),
+        ("persona_id", pa.string()),
+        ("area", pa.string()),
+        ("carga_asignada", pa.float64()),
+        ("carga_completada", pa.float64()),
+        ("tareas_totales", pa.int64()),
+        ("tareas_completadas", pa.int64()),
+        ("tareas_vinculadas", pa.list_(pa.string())),
+        ("fecha_captura", pa.string()),
+        ("estado", pa.string()),
+        ("last_edited_time", pa.string())
+    ]),
+    "tareas": pa.schema([
+        ("id", pa.string()),
+        ("nombre", pa.string()),
+        ("personas", pa.list_(pa.string())),
+        ("prioridad", pa.string()),
+        ("estado", pa.string()),
+        ("tamano", pa.string()),
+        ("carga", pa.float64()),
+        ("carga_completada", pa.float64()),
+        ("completada", pa.int64()),
+        ("violaciones", pa.int64()),
+        ("created_time", pa.string()),
+        ("last_edited_time", pa.string())
+    ]),
+    "sprints": pa.schema([
+        ("id", pa.string()),
+        ("nombre", pa.string()),
+        ("fecha_inicio", pa.string()),
+        ("fecha_fin", pa.string()),
+        ("estado", pa.string()),
+        ("monitoreo_activo", pa.bool_()),
+        ("last_edited_time", pa.string())
+    ])
+}
+
+
+def marca_agua_utc():
+    """Marca para la siguiente consulta por last_edited_time (Notion redondea al minuto)
+
+    Copia de snapshot_store.marca_agua_utc (sistema_monitoreo): la analítica no depende
+    del monitor. Si cambia el redondeo o el margen, cambiar ambas
+    """
+    marca = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=1)
+    return marca.isoformat(timespec="milliseconds").replace('+00:00', 'Z')
+
+
+# ---------- lectura de propiedades de Notion ----------
+
+def _texto(prop):
+    partes = prop.get("title") or prop.get("rich_text") or []
+    return "".join(p.get("plain_text") or p.get("text", {}).get("content", "") for p in partes) or None
+
+
+def _nombre(prop, tipo):
+    return (prop.get(tipo) or {}).get("name")
+
+
+def _numero(prop):
+    """Número directo o resultado de fórmula numérica"""
+    if "formula" in prop:
+        return (prop.get("formula") or {}).get("number")
+    return prop.get("number")
+
+
+def _entero(prop):
+    valor = _numero(prop)
+    return None if valor is None else int(valor)
+
+
+def _relacion(prop):
+    return [r["id"] for r in prop.get("relation", [])]
+
+
+def _fecha(prop):
+    return (prop.get("date") or {}).get("start")
+
+
+def _sprint_de(props):
+    sprints = _relacion(props.get("Sprint", {}))
+    return sprints[0] if sprints else SIN_SPRINT
+
+
+def fila_performance(pagina):
+    """(sprint_id, fila) de un registro de Performance"""
+    props = pagina["properties"]
+    personas = _relacion(props.get("Persona", {}))
+    return _sprint_de(props), {
+        "id": pagina["id"],
+        "nombre": _texto(props.get("Nombre", {})),
+        "persona_id": personas[0] if personas else None,
+        "area": _texto(props.get("Área", {})),
+        "carga_asignada": _numero(props.get("Carga Asignada", {})),
+        "carga_completada": _numero(props.get("Carga Completada", {})),
+        "tareas_totales": _entero(props.get("Tareas Totales", {})),
+        "tareas_completadas": _entero(props.get("Tareas Completadas", {})),
+        "tareas_vinculadas": _relacion(props.get("Tareas Vinculadas", {})),
+        "fecha_captura": _fecha(props.get("Fecha Captura", {})),
+        "estado": _nombre(props.get("Estado", {}), "select"),
+        "last_edited_time": pagina.get("last_edited_time")
+    }
+
+
+def fila_tarea(pagina):
+    """(sprint_id, fila) de una tarea"""
+    props = pagina["properties"]
+    return _sprint_de(props), {
+        "id": pagina["id"],
+        "nombre": _texto(props.get("Nombre", {})),
+        "personas": _relacion(props.get("Personas", {})),
+        "prioridad": _nombre(props.get("Prioridad", {}), "select"),
+        "estado": _nombre(props.get("Estado", {}), "status"),
+        "tamano": _nombre(props.get("Tamaño", {}), "select"),
+        "carga": _numero(props.get("Carga", {})),
+        "carga_completada": _numero(props.get("Carga Completada", {})),
+        "completada": _entero(props.get("Completada", {})),
+        "violaciones": _entero(props.get("Violaciones Detectadas", {})),
+        "created_time": pagina.get("created_time"),
+        "last_edited_time": pagina.get("last_edited_time")
+    }
+
+
+def fila_sprint(pagina):
+    """(sprint_id, fila) de un sprint: su propia partición"""
+    props = pagina["properties"]
+    return pagina["id"], {
+        "id": pagina["id"],
+        "nombre": _texto(props.get("Nombre", {})),
+        "fecha_inicio": _fecha(props.get("Fecha Inicio", {})),
+        "fecha_fin": _fecha(props.get("Fecha Fin", {})),
+        "estado": _nombre(props.get("Estado", {}), "status"),
+        "monitoreo_activo": props.get("Monitoreo Activo", {}).get("checkbox"),
+        "last_edited_time": pagina.get("last_edited_time")
+    }
+
+
+TABLAS = {
+    "performance": (lambda: DB_PERFORMANCE_ID, fila_performance),
+    "sprints": (lambda: DB_SPRINTS_ID, fila_sprint),
+    "tareas": (lambda: DB_TAREAS_ID, fila_tarea)
+}
+
+
+# ---------- almacén local ----------
+
+def ruta_tabla(tabla, directorio=DIRECTORIO_HISTORICO):
+    return os.path.join(directorio, tabla)
+
+
+def ruta_particion(tabla, sprint_id, directorio=DIRECTORIO_HISTORICO):
+    return os.path.join(ruta_tabla(tabla, directorio), f"sprint_id={sprint_id}", ARCHIVO_PARTICION)
+
+
+def particiones(tabla, directorio=DIRECTORIO_HISTORICO):
+    """{sprint_id: mtime} de las particiones escritas de la tabla (sin leer los archivos)"""
+    resultado = {}
+    ruta = ruta_tabla(tabla, directorio)
+    if not os.path.isdir(ruta):
+        return resultado
+    for carpeta in os.listdir(ruta):
+        archivo = os.path.join(ruta, carpeta, ARCHIVO_PARTICION)
+        if carpeta.startswith("sprint_id=") and os.path.exists(archivo):
+            resultado[carpeta[len("sprint_id="):]] = os.stat(archivo).st_mtime_ns
+    return resultado
+
+
+def esquema_dataset(esquema):
+    """Esquema leído: columnas del archivo + sprint_id tomado de la ruta de la partición"""
+    return esquema.append(pa.field("sprint_id", pa.string()))
+
+
+def dataset(tabla, directorio=DIRECTORIO_HISTORICO, esquema=None):
+    """Dataset Parquet de la tabla; None si aún no se exportó nada
+
+    esquema: para tablas derivadas que no están en ESQUEMAS (p.ej. agregados)
+    """
+    ruta = ruta_tabla(tabla, directorio)
+    if not os.path.isdir(ruta):
+        return None
+    esquema = esquema or ESQUEMAS[tabla]
+    return ds.dataset(ruta, format="parquet", partitioning=PARTICIONADO, schema=esquema_dataset(esquema))
+
+
+def leer_tabla(tabla, columnas=None, filtro=None, sprints=None, directorio=DIRECTORIO_HISTORICO, esquema=None):
+    """Tabla Arrow leída en local con proyección de columnas y filtros empujados al escaneo
+
+    sprints: ids a leer (las demás particiones ni se abren)
+    filtro: expresión de pyarrow.dataset adicional, p.ej. ds.field("prioridad") == "Imprevista"
+    """
+    datos = dataset(tabla, directorio, esquema)
+    if datos is None:
+        vacia = esquema_dataset(esquema or ESQUEMAS[tabla]).empty_table()
+        return vacia.select(columnas) if columnas else vacia
+
+    if sprints is not None:
+        por_sprint = ds.field("sprint_id").isin(list(sprints))
+        filtro = por_sprint if filtro is None else por_sprint & filtro
+    return datos.to_table(columns=columnas, filter=filtro)
+
+
+def escribir_particion(tabla, sprint_id, filas, directorio=DIRECTORIO_HISTORICO, esquema=None):
+    """Reemplaza la partición de forma atómica; sin filas la elimina
+
+    El temporal empieza por "." para que el escaneo del dataset lo ignore
+    """
+    ruta = ruta_particion(tabla, sprint_id, directorio)
+    carpeta = os.path.dirname(ruta)
+    if not filas:
+        if os.path.isdir(carpeta):
+            shutil.rmtree(carpeta)
+        return
+
+    os.makedirs(carpeta, exist_ok=True)
+    temporal = os.path.join(carpeta, f".{ARCHIVO_PARTICION}.{os.getpid()}.tmp")
+    pq.write_table(pa.Table.from_pylist(filas, schema=esquema or ESQUEMAS[tabla]), temporal)
+    os.replace(temporal, ruta)
+
+
+def leer_estado(directorio=DIRECTORIO_HISTORICO):
+    """Marcas de agua por tabla de la última exportación"""
+    try:
+        with open(os.path.join(directorio, ARCHIVO_ESTADO), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def guardar_estado(estado, directorio=DIRECTORIO_HISTORICO):
+    ruta = os.path.join(directorio, ARCHIVO_ESTADO)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+# ---------- exportación ----------
+
+def consultar(database_id, marca=None):
+    """Páginas de la base editadas desde la marca (todas si no hay marca)"""
+    start_cursor = None
+    while True:
+        query_params = {"database_id": database_id, "page_size": 100}
+        if marca:
+            query_params["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": marca}}
+        if start_cursor:
+            query_params["start_cursor"] = start_cursor
+
+        response = notion.databases.query(**query_params)
+        yield from response["results"]
+
+        if not response.get("has_more", False):
+            return
+        start_cursor = response.get("next_cursor")
+
+
+def exportar_tabla(tabla, marca=None, directorio=DIRECTORIO_HISTORICO):
+    """Fusiona en el almacén lo editado desde la marca y reescribe solo las particiones tocadas
+
+    Una página que cambió de sprint sale de su partición anterior.
+    Returns: (registros actualizados, particiones reescritas)
+    """
+    obtener_database, a_fila = TABLAS[tabla]
+    cambios = {}
+    for pagina in consultar(obtener_database(), marca):
+        sprint_id, fila = a_fila(pagina)
+        cambios[fila["id"]] = (sprint_id, fila)
+    if not cambios:
+        return 0, 0
+
+    # Dónde vive hoy cada registro modificado (solo se leen las columnas de partición e id)
+    anteriores = leer_tabla(tabla, columnas=["id", "sprint_id"], filtro=ds.field("id").isin(list(cambios)),
+                            directorio=directorio)
+    afectadas = set(anteriores.column("sprint_id").to_pylist())
+    afectadas.update(sprint_id for sprint_id, _ in cambios.values())
+
+    for sprint_id in afectadas:
+        actuales = leer_tabla(tabla, sprints=[sprint_id], directorio=directorio).drop_columns(["sprint_id"])
+        filas = [fila for fila in actuales.to_pylist() if fila["id"] not in cambios]
+        filas.extend(fila for destino, fila in cambios.values() if destino == sprint_id)
+        escribir_particion(tabla, sprint_id, filas, directorio)
+
+    return len(cambios), len(afectadas)
+
+
+def exportar(completo=False, directorio=DIRECTORIO_HISTORICO):
+    """Exporta las tres tablas; la marca se toma antes de consultar para no perder ediciones
+
+    completo: reconstruye en un directorio temporal y lo intercambia al terminar
+    Returns: {tabla: (registros, particiones)}
+    """
+    destino = directorio
+    if completo:
+        destino = f"{directorio}.nuevo"
+        shutil.rmtree(destino, ignore_errors=True)
+    os.makedirs(destino, exist_ok=True)
+
+    estado = {} if completo else leer_estado(directorio)
+    resumen = {}
+    for tabla in TABLAS:
+        marca = marca_agua_utc()
+        resumen[tabla] = exportar_tabla(tabla, estado.get(tabla), destino)
+        estado[tabla] = marca
+        # Cada tabla confirma su marca: un fallo posterior no repite lo ya exportado
+        guardar_estado(estado, destino)
+
+    if completo:
+        anterior = f"{directorio}.anterior"
+        shutil.rmtree(anterior, ignore_errors=True)
+        if os.path.isdir(directorio):
+            os.replace(directorio, anterior)
+        os.replace(destino, directorio)
+        shutil.rmtree(anterior, ignore_errors=True)
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta Performance, Tareas y Sprints a Parquet local")
+    parser.add_argument("--directorio", default=DIRECTORIO_HISTORICO, help="Directorio del almacén")
+    parser.add_argument("--completo", action="store_true",
+                        help="Reconstruye todo el almacén (elimina lo borrado en Notion)")
+    args = parser.parse_args()
+
+    resumen = exportar(completo=args.completo, directorio=args.directorio)
+    logger.info("=" * 50)
+    logger.info("📦 HISTÓRICO DE SPRINTS")
+    logger.info("=" * 50)
+    for tabla, (registros, particiones) in resumen.items():
+        logger.info(f"   • {tabla}: {registros} registros, {particiones} particiones reescritas")
+    logger.info(f"💾 Almacén: {args.directorio}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
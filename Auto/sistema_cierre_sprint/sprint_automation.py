@@ -106,9 +106,23 @@ def obtener_sprint_para_cierre():
         logger.critical(f"Error crítico en detección de sprint: {e}")
         return None
 
-def obtener_tareas_del_sprint(sprint_id):
-    """Obtiene todas las tareas del sprint con paginación automática"""
-    tareas = []
+# Propiedades de tarea que usa el cierre: agrupación, filtro de imprevistas y métricas
+PROPIEDADES_CIERRE = ("Nombre", "Personas", "Prioridad", "Estado", "Carga", "Carga Completada", "Completada")
+
+def proyectar_tarea(tarea):
+    """Reduce la página a su id y las propiedades del cierre, con el mismo formato de la API"""
+    props = tarea["properties"]
+    return {
+        "id": tarea["id"],
+        "properties": {nombre: props[nombre] for nombre in PROPIEDADES_CIERRE if nombre in props}
+    }
+
+def iterar_tareas_del_sprint(sprint_id):
+    """
+    Genera las tareas del sprint a medida que llega cada página de la consulta, ya proyectadas.
+    Solo una respuesta (100 páginas) se mantiene completa en memoria a la vez.
+    """
+    total = 0
     next_cursor = None
     
     while True:
@@ -118,34 +132,51 @@ def obtener_tareas_del_sprint(sprint_id):
             start_cursor=next_cursor,
             page_size=100
         )
-        tareas.extend(response["results"])
+        for tarea in response["results"]:
+            total += 1
+            yield proyectar_tarea(tarea)
         next_cursor = response.get("next_cursor")
         if not next_cursor:
             break
             
-    logger.info(f"Encontradas {len(tareas)} tareas para el sprint")
-    return tareas
+    logger.info(f"Encontradas {total} tareas para el sprint")
 
-def agrupar_tareas_por_persona(tareas):
-    """Agrupa tareas por persona, reporta tareas sin asignar"""
+def resumir_tareas_por_persona(tareas):
+    """
+    Recorre las tareas una sola vez (acepta generadores) y guarda por persona solo lo
+    que el cierre necesita: ids de sus tareas (Tareas Vinculadas y relación inversa)
+    y los totales de métricas. Ninguna tarea queda en memoria después de contarla.
+    """
     personas = {}
-    tareas_sin_asignar = []
+    tareas_sin_asignar = 0
     
     for tarea in tareas:
-        personas_asignadas = tarea["properties"].get("Personas", {}).get("relation", [])
+        props = tarea["properties"]
+        personas_asignadas = props.get("Personas", {}).get("relation", [])
         if not personas_asignadas:
-            tareas_sin_asignar.append(tarea)
+            tareas_sin_asignar += 1
             continue
-            
+        
+        excluida = es_imprevista_incompleta(props)
         for persona_rel in personas_asignadas:
-            pid = persona_rel["id"]
-            personas.setdefault(pid, []).append(tarea)
+            resumen = personas.setdefault(persona_rel["id"], {"tareas_ids": [], "excluidas": 0, **metricas_vacias()})
+            resumen["tareas_ids"].append(tarea["id"])
+            if excluida:
+                resumen["excluidas"] += 1
+            else:
+                sumar_metricas(resumen, props)
     
     if tareas_sin_asignar:
-        logger.warning(f"Hay {len(tareas_sin_asignar)} tareas sin asignar")
+        logger.warning(f"Hay {tareas_sin_asignar} tareas sin asignar")
     
     return personas, tareas_sin_asignar
 
+def es_imprevista_incompleta(props):
+    """Imprevista no completada: no cuenta para las métricas (no se planificó)"""
+    prioridad = (props.get("Prioridad", {}).get("select") or {}).get("name", "").lower()
+    estado = (props.get("Estado", {}).get("status") or {}).get("name", "")
+    return prioridad == "imprevista" and estado != "Listo"
+
 def filtrar_tareas_para_metricas(tareas):
     """
     Filtra tareas excluyendo imprevistas no completadas.
@@ -156,12 +187,8 @@ def filtrar_tareas_para_metricas(tareas):
     
     for tarea in tareas:
         props = tarea["properties"]
-        prioridad = (props.get("Prioridad", {}).get("select") or {}).get("name", "").lower()
-        estado = (props.get("Estado", {}).get("status") or {}).get("name", "")
-        
-        es_imprevista_incompleta = (prioridad == "imprevista" and estado != "Listo")
         
-        if es_imprevista_incompleta:
+        if es_imprevista_incompleta(props):
             try:
                 nombre = props["Nombre"]["title"][0]["text"]["content"]
             except:
@@ -205,32 +232,32 @@ def obtener_departamento_persona(persona_info):
         logger.error(f"Error obteniendo departamento: {e}")
         return "Error al obtener departamento"
 
+def metricas_vacias():
+    """Totales de una persona sin tareas (los valores base que se envían a Performance)"""
+    return {"carga_asignada": 0, "carga_completada": 0, "tareas_totales": 0, "tareas_completadas": 0}
+
+def sumar_metricas(metricas, props):
+    """Suma una tarea filtrada a los totales de la persona"""
+    metricas["tareas_totales"] += 1
+    try:
+        metricas["carga_asignada"] += float(props.get("Carga", {}).get("formula", {}).get("number") or 0)
+    except:
+        pass
+    try:
+        metricas["carga_completada"] += float(props.get("Carga Completada", {}).get("formula", {}).get("number") or 0)
+    except:
+        pass
+    try:
+        metricas["tareas_completadas"] += int(props.get("Completada", {}).get("formula", {}).get("number") or 0)
+    except:
+        pass
+
 def calcular_metricas_persona(tareas_filtradas):
     """Calcula métricas de performance basadas en tareas filtradas"""
-    carga_asignada = carga_completada = tareas_completadas = 0
-    
+    metricas = metricas_vacias()
     for tarea in tareas_filtradas:
-        props = tarea["properties"]
-        
-        try:
-            carga_asignada += float(props.get("Carga", {}).get("formula", {}).get("number") or 0)
-        except:
-            pass
-        try:
-            carga_completada += float(props.get("Carga Completada", {}).get("formula", {}).get("number") or 0)
-        except:
-            pass
-        try:
-            tareas_completadas += int(props.get("Completada", {}).get("formula", {}).get("number") or 0)
-        except:
-            pass
-    
-    return {
-        "carga_asignada": carga_asignada,
-        "carga_completada": carga_completada,
-        "tareas_totales": len(tareas_filtradas),
-        "tareas_completadas": tareas_completadas
-    }
+        sumar_metricas(metricas, tarea["properties"])
+    return metricas
 
 def verificar_performance_existente(persona_id, sprint_id):
     """Verifica si ya existe registro de performance para esta combinación"""
@@ -245,10 +272,12 @@ def verificar_performance_existente(persona_id, sprint_id):
     )
     return bool(response["results"])
 
-def crear_registro_performance(persona_id, sprint_id, sprint_info, tareas):
+def crear_registro_performance(persona_id, sprint_id, sprint_info, resumen):
     """
     Crea registro de performance y establece relaciones bidireccionales.
     
+    resumen: ids de tareas y totales de la persona (resumir_tareas_por_persona)
+    
     NOTA: Los porcentajes y score se calculan automáticamente en Notion via fórmulas,
     solo enviamos los valores base (carga asignada, completada, tareas totales, completadas).
     """
@@ -268,13 +297,11 @@ def crear_registro_performance(persona_id, sprint_id, sprint_info, tareas):
         return None
 
     departamento = obtener_departamento_persona(persona_info)
-    tareas_filtradas, tareas_excluidas = filtrar_tareas_para_metricas(tareas)
     
-    if tareas_excluidas:
-        logger.info(f"Excluidas {len(tareas_excluidas)} imprevistas no completadas para {persona_nombre}")
+    if resumen["excluidas"]:
+        logger.info(f"Excluidas {resumen['excluidas']} imprevistas no completadas para {persona_nombre}")
     
-    metricas = calcular_metricas_persona(tareas_filtradas)
-    tareas_ids = [{"id": tarea["id"]} for tarea in tareas]
+    tareas_ids = [{"id": tarea_id} for tarea_id in resumen["tareas_ids"]]
 
     try:
         response = notion.pages.create(
@@ -285,10 +312,10 @@ def crear_registro_performance(persona_id, sprint_id, sprint_info, tareas):
                 "Sprint": {"relation": [{"id": sprint_id}]},
                 "Área": {"rich_text": [{"text": {"content": departamento}}]},
                 "Tareas Vinculadas": {"relation": tareas_ids},
-                "Carga Asignada": {"number": metricas["carga_asignada"]},
-                "Carga Completada": {"number": metricas["carga_completada"]},
-                "Tareas Totales": {"number": metricas["tareas_totales"]},
-                "Tareas Completadas": {"number": metricas["tareas_completadas"]},
+                "Carga Asignada": {"number": resumen["carga_asignada"]},
+                "Carga Completada": {"number": resumen["carga_completada"]},
+                "Tareas Totales": {"number": resumen["tareas_totales"]},
+                "Tareas Completadas": {"number": resumen["tareas_completadas"]},
                 "Fecha Captura": {"date": {"start": datetime.now().isoformat()}},
                 "Estado": {"select": {"name": "Cerrado"}}
             }
@@ -297,9 +324,9 @@ def crear_registro_performance(persona_id, sprint_id, sprint_info, tareas):
         performance_id = response["id"]
         logger.info(f"✅ Performance creado para {persona_nombre}")
 
-        for tarea in tareas:
+        for tarea_id in resumen["tareas_ids"]:
             notion.pages.update(
-                page_id=tarea["id"],
+                page_id=tarea_id,
                 properties={"Performance Vinculada": {"relation": [{"id": performance_id}]}}
             )
 
@@ -433,16 +460,16 @@ def ejecutar_cierre_sprint():
         logger.error(f"Error validando sprint: {e}")
         return False
 
-    tareas = obtener_tareas_del_sprint(sprint_id)
-    personas, _ = agrupar_tareas_por_persona(tareas)
+    # Las tareas se resumen a medida que llegan: por persona solo quedan ids y totales
+    personas, _ = resumir_tareas_por_persona(iterar_tareas_del_sprint(sprint_id))
 
     if not personas:
         logger.warning("⚠️ No hay tareas asignadas a personas")
         return False
 
     registros_creados = 0
-    for persona_id, tareas_persona in personas.items():
-        if crear_registro_performance(persona_id, sprint_id, sprint, tareas_persona):
+    for persona_id, resumen in personas.items():
+        if crear_registro_performance(persona_id, sprint_id, sprint, resumen):
             registros_creados += 1
 
     if registros_creados == 0:
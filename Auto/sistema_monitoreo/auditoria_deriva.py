@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Auditoría de Deriva - SNAPSHOTS VS EXPORTACIÓN ACTUAL, EN BLOQUE
+Análisis post-incidente: compara todo el snapshot global con una exportación fresca
+de las tareas monitoreadas y clasifica cada campo desfasado con las reglas de bloqueo
+de procesar_cambio_propiedad (qué se habría revertido). La comparación y la
+clasificación son columnares (pandas/numpy): sin bucles por tarea
+
+Uso:
+    python auditoria_deriva.py                                  # exporta de Notion
+    python auditoria_deriva.py --tareas export.jsonl --salida deriva.csv
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from task_monitor import TaskMonitorReactivo, PROPIEDADES_MONITOREADAS, DIAS_BLOQUEO
+from snapshot_store import ARCHIVO_SNAPSHOTS, leer_snapshots
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_REPORTE = "auditoria_deriva.csv"
+
+# Personas se compara como lista ordenada (igual que el monitor): ids unidos por coma
+SEPARADOR_PERSONAS = ","
+
+COLUMNAS_REPORTE = [
+    "tarea_id", "nombre", "propiedad", "valor_anterior", "valor_actual",
+    "dias_transcurridos", "prioridad", "accion", "revertiria"
+]
+
+
+def _personas(lista):
+    return None if lista is None else SEPARADOR_PERSONAS.join(lista)
+
+
+def snapshots_a_tabla(snapshots):
+    """Una fila por snapshot (iterable de SnapshotTarea, se consume una vez)"""
+    filas = [
+        (snapshot.id_texto, snapshot.nombre, _personas(snapshot.lista_personas()),
+         snapshot.prioridad, snapshot.tamano, snapshot.estado)
+        for snapshot in snapshots
+    ]
+    return pd.DataFrame.from_records(filas, columns=["tarea_id", *PROPIEDADES_MONITOREADAS])
+
+
+def tareas_a_tabla(tareas, monitor=None):
+    """Una fila por página de Notion con los campos que usan las reglas de bloqueo"""
+    monitor = monitor or TaskMonitorReactivo()
+    filas = []
+    for tarea in tareas:
+        valores = monitor.valores_monitoreados(tarea)
+        valores["Personas"] = _personas(valores["Personas"])
+        filas.append((tarea["id"], *(valores[propiedad] for propiedad in PROPIEDADES_MONITOREADAS),
+                      monitor.get_dias_transcurridos(tarea)))
+    return pd.DataFrame.from_records(
+        filas, columns=["tarea_id", *PROPIEDADES_MONITOREADAS, "dias_transcurridos"]
+    )
+
+
+def detectar_derivas(snapshots, actuales):
+    """Formato largo: una fila por (tarea, propiedad) cuyo valor difiere del snapshot
+
+    Solo tareas presentes en ambos lados; None == None no cuenta como deriva
+    """
+    unidas = snapshots.merge(actuales, on="tarea_id", suffixes=("_anterior", "_actual"))
+    prioridad = unidas["Prioridad_actual"].fillna("")
+    bloques = []
+    for propiedad in PROPIEDADES_MONITOREADAS:
+        anterior = unidas[f"{propiedad}_anterior"]
+        actual = unidas[f"{propiedad}_actual"]
+        difiere = ~((anterior == actual) | (anterior.isna() & actual.isna()))
+        bloques.append(pd.DataFrame({
+            "tarea_id": unidas["tarea_id"][difiere],
+            "nombre": unidas["Nombre_actual"][difiere],
+            "propiedad": propiedad,
+            "valor_anterior": anterior[difiere],
+            "valor_actual": actual[difiere],
+            "dias_transcurridos": unidas["dias_transcurridos"][difiere],
+            "prioridad": prioridad[difiere]
+        }))
+    return pd.concat(bloques, ignore_index=True)
+
+
+def _cantidad_personas(valores):
+    texto = valores.fillna("")
+    return np.where(texto == "", 0, texto.str.count(SEPARADOR_PERSONAS) + 1)
+
+
+def clasificar_derivas(derivas):
+    """Acción que habría tomado procesar_cambio_propiedad para cada deriva (mismo orden de reglas)"""
+    propiedad = derivas["propiedad"].to_numpy()
+    bloqueados = derivas["dias_transcurridos"].fillna(0).to_numpy() > DIAS_BLOQUEO
+    anterior = derivas["valor_anterior"].astype("string").fillna("").str.lower().to_numpy()
+    prioridad_imprevista = derivas["prioridad"].str.lower().to_numpy() == "imprevista"
+    es_prioridad = propiedad == "Prioridad"
+    es_personas = propiedad == "Personas"
+    es_estado = propiedad == "Estado"
+
+    # Pasar a Imprevista desde otra prioridad también se revierte: solo se permite si ya lo era
+    anterior_imprevista = anterior == "imprevista"
+    quita_ultimo_responsable = (
+        (_cantidad_personas(derivas["valor_anterior"]) > 0) & (_cantidad_personas(derivas["valor_actual"]) == 0)
+    )
+
+    condiciones = [
+        es_prioridad & bloqueados & anterior_imprevista,
+        es_prioridad & bloqueados,
+        es_personas & bloqueados & quita_ultimo_responsable,
+        es_personas & bloqueados,
+        prioridad_imprevista,
+        es_estado,
+        ~bloqueados
+    ]
+    acciones = [
+        "PERMITIDO_IMPREVISTA_ANTERIOR",
+        "REVERTIR",
+        "REVERTIR",
+        "PERMITIDO_PERSONAS",
+        "PERMITIDO_IMPREVISTA",
+        "PERMITIDO_ESTADO",
+        "PERMITIDO_DIAS"
+    ]
+    derivas = derivas.copy()
+    derivas["accion"] = np.select(condiciones, acciones, default="REVERTIR")
+    derivas["revertiria"] = derivas["accion"] == "REVERTIR"
+    return derivas
+
+
+def auditar(snapshots, actuales):
+    """Compara tablas de snapshots y actuales
+
+    Returns: (reporte de derivas clasificadas, resumen)
+    """
+    ids_snapshot = set(snapshots["tarea_id"])
+    ids_actuales = set(actuales["tarea_id"])
+    reporte = clasificar_derivas(detectar_derivas(snapshots, actuales))[COLUMNAS_REPORTE]
+
+    resumen = {
+        "tareas_snapshot": len(snapshots),
+        "tareas_actuales": len(actuales),
+        "sin_snapshot": len(ids_actuales - ids_snapshot),
+        "ausentes_en_exportacion": len(ids_snapshot - ids_actuales),
+        "tareas_con_deriva": int(reporte["tarea_id"].nunique()),
+        "derivas": len(reporte),
+        "reversiones": int(reporte["revertiria"].sum()),
+        "por_propiedad": reporte.groupby("propiedad").size().to_dict(),
+        "por_accion": reporte.groupby("accion").size().to_dict()
+    }
+    return reporte, resumen
+
+
+def exportar_tareas_monitoreadas():
+    """Tareas actuales de los sprints con "Monitoreo Activo" (misma consulta que el setup)"""
+    from setup_monitoring import MonitoringSetupInteligente
+    setup = MonitoringSetupInteligente()
+    sprints = setup.sprints_con_monitoreo_activo()
+    if not sprints:
+        return iter(())
+    return setup.iterar_tareas_sprints(sprints)
+
+
+def leer_tareas(ruta):
+    """Páginas de Notion exportadas como JSONL (una página por línea)"""
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Compara el snapshot global con el estado actual de las tareas")
+    parser.add_argument("--snapshots", default=ARCHIVO_SNAPSHOTS, help="Archivo de snapshots")
+    parser.add_argument("--tareas", help="Exportación JSONL de páginas; sin este argumento se consulta Notion")
+    parser.add_argument("--salida", default=ARCHIVO_REPORTE, help="Reporte CSV de derivas")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    _, registros = leer_snapshots(args.snapshots)
+    snapshots = snapshots_a_tabla(registros)
+    actuales = tareas_a_tabla(leer_tareas(args.tareas) if args.tareas else exportar_tareas_monitoreadas())
+    cargado = time.perf_counter()
+
+    reporte, resumen = auditar(snapshots, actuales)
+    reporte.to_csv(args.salida, index=False)
+
+    logger.info("=" * 50)
+    logger.info("🔎 AUDITORÍA DE DERIVA DE SNAPSHOTS")
+    logger.info("=" * 50)
+    logger.info(f"📸 Snapshots: {resumen['tareas_snapshot']} | 📋 Tareas actuales: {resumen['tareas_actuales']}")
+    logger.info(f"🆕 Sin snapshot: {resumen['sin_snapshot']} | 🗑️ Ausentes en exportación: {resumen['ausentes_en_exportacion']}")
+    logger.info(f"🔄 Derivas: {resumen['derivas']} en {resumen['tareas_con_deriva']} tareas")
+    for propiedad, cantidad in resumen["por_propiedad"].items():
+        logger.info(f"   • {propiedad}: {cantidad}")
+    logger.info(f"❌ Se habrían revertido: {resumen['reversiones']}")
+    for accion, cantidad in resumen["por_accion"].items():
+        logger.info(f"   • {accion}: {cantidad}")
+    logger.info(f"⏱️ Carga {cargado - inicio:.2f}s | comparación {time.perf_counter() - cargado:.2f}s")
+    logger.info(f"💾 Reporte: {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Captura y Replay de Webhooks - REPRODUCCIÓN DE RÁFAGAS REALES
+Captura: el servidor agrega cada payload aceptado (con su hora de llegada) a un JSONL comprimido
+Replay: reenvía la captura a un servidor a velocidad 1x, 10x o máxima, con ids de
+evento propios de cada corrida (el índice de idempotencia no los toma por reentregas)
+
+Uso:
+    python captura_webhooks.py captura.jsonl.gz --url http://localhost:5000/webhook --velocidad 10
+    python captura_webhooks.py captura.jsonl.gz --velocidad max --concurrencia 16
+    python captura_webhooks.py captura.jsonl.gz --conservar-ids  # prueba de deduplicación
+"""
+
+import os
+import sys
+import gzip
+import hmac
+import json
+import time
+import uuid
+import zlib
+import queue
+import hashlib
+import logging
+import argparse
+import itertools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+HEADER_FIRMA = "X-Notion-Signature"
+FIN_CAPTURA = object()
+
+
+class CapturaWebhooks:
+    """Escritor de capturas en segundo plano: el endpoint solo encola, no toca disco"""
+
+    def __init__(self, ruta, registros_por_flush=100, intervalo_flush=1.0):
+        self.ruta = ruta
+        self.registros_por_flush = registros_por_flush
+        self.intervalo_flush = intervalo_flush
+        self.registros_capturados = 0
+        self._cola = queue.Queue()
+        self._escritor = threading.Thread(target=self._bucle_escritor, name="captura-webhooks", daemon=True)
+        self._escritor.start()
+        logger.info(f"🎙️ Captura de webhooks activa: {ruta}")
+
+    def registrar(self, cuerpo, firma=None):
+        """Encola el payload crudo con su hora de llegada"""
+        self._cola.put({
+            "t": time.time(),
+            "firma": firma,
+            "body": cuerpo.decode("utf-8") if isinstance(cuerpo, bytes) else cuerpo
+        })
+
+    def _bucle_escritor(self):
+        # "at": cada sesión agrega un miembro gzip nuevo; gzip los lee como un solo flujo
+        with gzip.open(self.ruta, "at", encoding="utf-8") as archivo:
+            sin_flush = 0
+            ultimo_flush = time.monotonic()
+            while True:
+                try:
+                    registro = self._cola.get(timeout=self.intervalo_flush)
+                except queue.Empty:
+                    registro = None
+
+                if registro is FIN_CAPTURA:
+                    break
+                if registro is not None:
+                    archivo.write(json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    self.registros_capturados += 1
+                    sin_flush += 1
+
+                vencido = time.monotonic() - ultimo_flush >= self.intervalo_flush
+                if sin_flush and (sin_flush >= self.registros_por_flush or vencido):
+                    # Sync flush: lo escrito es legible aunque el proceso muera después
+                    archivo.flush()
+                    sin_flush = 0
+                    ultimo_flush = time.monotonic()
+
+    def cerrar(self, timeout=5):
+        self._cola.put(FIN_CAPTURA)
+        self._escritor.join(timeout)
+
+
+def leer_captura(ruta):
+    """Itera registros de una captura (tolera un final truncado)"""
+    with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+        try:
+            for linea in archivo:
+                linea = linea.strip()
+                if linea:
+                    try:
+                        yield json.loads(linea)
+                    except json.JSONDecodeError:
+                        logger.warning("⚠️ Línea incompleta al final de la captura - ignorada")
+                        return
+        except EOFError:
+            logger.warning("⚠️ Captura truncada (servidor detenido sin cerrar) - se usa lo legible")
+
+
+def pagina_de(registro):
+    """page_id del payload capturado (None si no se puede leer)"""
+    try:
+        return json.loads(registro["body"]).get("entity", {}).get("id")
+    except (ValueError, AttributeError):
+        return None
+
+
+def reescribir_id(registro, sufijo, secreto=None):
+    """Copia del registro con el id de evento sufijado
+
+    Dos eventos con el mismo id en la captura (reentregas reales) siguen compartiéndolo.
+    La firma capturada no vale para el cuerpo nuevo: se vuelve a firmar con el secreto
+    del servidor o se omite
+    """
+    try:
+        datos = json.loads(registro["body"])
+    except ValueError:
+        return registro
+    if not isinstance(datos, dict) or not datos.get("id"):
+        return registro
+
+    datos["id"] = f"{datos['id']}-{sufijo}"
+    body = json.dumps(datos, ensure_ascii=False)
+    firma = None
+    if secreto:
+        firma = "sha256=" + hmac.new(secreto.encode(), body.encode("utf-8"), hashlib.sha256).hexdigest()
+    return dict(registro, body=body, firma=firma)
+
+
+def reproducir(registros, enviar, velocidad=1.0, concurrencia=8, conservar_ids=False, secreto=None):
+    """Reenvía registros respetando los intervalos originales divididos por velocidad
+
+    Cada página va siempre por el mismo carril (un thread), así sus webhooks llegan
+    en el orden capturado aunque haya envíos simultáneos de páginas distintas
+
+    Args:
+        registros: lista de registros de captura ({"t", "firma", "body"})
+        enviar: callable(body, headers) → código HTTP
+        velocidad: factor de aceleración; None = máxima velocidad (sin esperas)
+        concurrencia: envíos simultáneos máximos (carriles)
+        conservar_ids: reenvía los ids de evento originales (el servidor responde
+            duplicate_delivery a los que ya aceptó); por defecto cada corrida los sufija
+        secreto: WEBHOOK_SECRET del servidor, para firmar los cuerpos con id reescrito
+
+    Returns: dict con enviados, códigos, duración, eventos/s y latencias de respuesta
+    """
+    if not registros:
+        return {"enviados": 0}
+
+    codigos = Counter()
+    latencias = []
+    lock = threading.Lock()
+    sufijo = None if conservar_ids else f"replay-{uuid.uuid4().hex[:8]}"
+
+    def enviar_registro(registro):
+        if sufijo:
+            registro = reescribir_id(registro, sufijo, secreto)
+        headers = {"Content-Type": "application/json"}
+        if registro.get("firma"):
+            headers[HEADER_FIRMA] = registro["firma"]
+        inicio = time.perf_counter()
+        try:
+            codigo = enviar(registro["body"], headers)
+        except Exception as e:
+            logger.error(f"Error reenviando webhook: {e}")
+            codigo = "error"
+        with lock:
+            codigos[str(codigo)] += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    t0_captura = registros[0]["t"]
+    inicio = time.perf_counter()
+
+    concurrencia = max(1, concurrencia)
+    carriles = [ThreadPoolExecutor(max_workers=1) for _ in range(concurrencia)]
+    # Payloads sin página: se reparten en turno
+    turno = itertools.count()
+    try:
+        for registro in registros:
+            if velocidad:
+                objetivo = (registro["t"] - t0_captura) / velocidad
+                espera = objetivo - (time.perf_counter() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+            page_id = pagina_de(registro)
+            carril = zlib.crc32(str(page_id).encode()) if page_id else next(turno)
+            carriles[carril % concurrencia].submit(enviar_registro, registro)
+    finally:
+        for pool in carriles:
+            pool.shutdown(wait=True)
+
+    duracion = time.perf_counter() - inicio
+    latencias.sort()
+
+    def percentil(p):
+        return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000, 2)
+
+    return {
+        "enviados": len(registros),
+        "sufijo_ids": sufijo,
+        "codigos": dict(codigos),
+        "duracion_s": round(duracion, 3),
+        "eventos_por_segundo": round(len(registros) / duracion, 1) if duracion else None,
+        "duracion_original_s": round(registros[-1]["t"] - t0_captura, 3),
+        "latencia_respuesta_ms": {"p50": percentil(0.50), "p99": percentil(0.99), "max": percentil(1.0)}
+    }
+
+
+def crear_envio_http(url):
+    """Envío HTTP con una sesión requests por thread"""
+    import requests
+
+    local = threading.local()
+
+    def enviar(body, headers):
+        if not hasattr(local, "sesion"):
+            local.sesion = requests.Session()
+        return local.sesion.post(url, data=body.encode("utf-8"), headers=headers, timeout=30).status_code
+
+    return enviar
+
+
+def main():
+    """Replay de una captura contra un servidor de webhooks"""
+    parser = argparse.ArgumentParser(description="Reenvía una captura de webhooks a un servidor")
+    parser.add_argument("captura", help="Archivo .jsonl.gz generado con WEBHOOK_CAPTURA")
+    parser.add_argument("--url", default="http://localhost:5000/webhook")
+    parser.add_argument("--velocidad", default="1", help="Factor de velocidad (1, 10, ...) o 'max'")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--conservar-ids", action="store_true",
+                        help="Reenvía los ids de evento originales (prueba de deduplicación)")
+    parser.add_argument("--secreto", default=os.getenv("WEBHOOK_SECRET", ""),
+                        help="Secreto del servidor para firmar los cuerpos con id reescrito")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    velocidad = None if args.velocidad == "max" else float(args.velocidad)
+    registros = list(leer_captura(args.captura))
+    logger.info(f"▶️ Reproduciendo {len(registros)} webhooks a {args.url} (velocidad: {args.velocidad})")
+
+    resumen = reproducir(registros, crear_envio_http(args.url), velocidad, args.concurrencia,
+                         args.conservar_ids, args.secreto)
+
+    logger.info("=" * 50)
+    logger.info("📊 RESUMEN DE REPLAY")
+    logger.info("=" * 50)
+    for clave, valor in resumen.items():
+        logger.info(f"   {clave}: {valor}")
+
+    errores = sum(n for codigo, n in resumen.get("codigos", {}).items() if not codigo.startswith("2"))
+    sys.exit(0 if errores == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Cola Durable de Eventos - SQLITE CON COMMIT AGRUPADO
+Eventos aceptados sobreviven a reinicios: se confirman (ack) al procesarse
+y los pendientes se reproducen al arrancar
+Modo compartido: varios procesos de ingesta escriben y los workers leen por shard
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_COLA = "webhook_eventos.db"
+# Pausa tras un commit fallido antes de reintentar los acks
+ESPERA_REINTENTO = 1.0
+
+# AUTOINCREMENT: un id confirmado (borrado) nunca se reasigna, así los workers
+# pueden leer la cola compartida con un cursor "id > último leído"
+ESQUEMA_EVENTOS = """
+    CREATE TABLE {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        page_id TEXT NOT NULL,
+        recibido REAL NOT NULL,
+        payload TEXT NOT NULL,
+        shard INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+
+class LoteCommit:
+    """Lote de escritura compartido: los eventos que entran juntos comparten un fsync"""
+
+    def __init__(self):
+        self.escrito = threading.Event()
+        self.error = None
+
+    def esperar(self, timeout=None):
+        """True si el lote quedó persistido en disco"""
+        return self.escrito.wait(timeout) and self.error is None
+
+
+class ColaDurable:
+    """Cola de eventos en SQLite (WAL) con commit agrupado en un thread escritor
+
+    compartida=True: los ids los asigna SQLite (varios procesos escriben la misma base)
+    y cada fila guarda su shard para que los procesos worker lean solo los suyos
+    """
+
+    def __init__(self, ruta=ARCHIVO_COLA, compartida=False):
+        self.ruta = ruta
+        self.compartida = compartida
+        self._cond = threading.Condition()
+        self._inserciones = []
+        self._confirmaciones = []
+        self._lote_actual = LoteCommit()
+        self._siguiente_id = 1
+        self._detener = False
+        self._escritor = None
+        self._lector = None
+        self._lock_lector = threading.Lock()
+        self.pendientes_en_disco = 0
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False, timeout=30)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        # FULL: cada commit hace fsync (el costo se reparte entre el lote)
+        conexion.execute("PRAGMA synchronous=FULL")
+        conexion.execute(ESQUEMA_EVENTOS.format(tabla="IF NOT EXISTS eventos"))
+        definicion = conexion.execute("SELECT sql FROM sqlite_master WHERE name = 'eventos'").fetchone()[0]
+        if "AUTOINCREMENT" not in definicion:
+            self._migrar(conexion)
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_eventos_shard ON eventos (shard, id)")
+        conexion.commit()
+        return conexion
+
+    @staticmethod
+    def _migrar(conexion):
+        """Bases anteriores al modo multiproceso: recrea la tabla conservando los pendientes"""
+        conexion.execute("BEGIN IMMEDIATE")
+        definicion = conexion.execute("SELECT sql FROM sqlite_master WHERE name = 'eventos'").fetchone()[0]
+        if "AUTOINCREMENT" in definicion:
+            # Otro proceso migró mientras se esperaba el lock
+            conexion.rollback()
+            return
+        conexion.execute("ALTER TABLE eventos RENAME TO eventos_anterior")
+        conexion.execute(ESQUEMA_EVENTOS.format(tabla="eventos"))
+        # Los pendientes antiguos quedan en el shard 0 (se procesan en orden de llegada)
+        conexion.execute(
+            "INSERT INTO eventos (id, page_id, recibido, payload) "
+            "SELECT id, page_id, recibido, payload FROM eventos_anterior"
+        )
+        conexion.execute("DROP TABLE eventos_anterior")
+        conexion.commit()
+        logger.info("🔧 Cola durable migrada al esquema multiproceso")
+
+    def iniciar(self, reproducir=True):
+        """Abre la base, devuelve eventos no confirmados y arranca el escritor
+
+        reproducir=False (procesos de ingesta): los pendientes quedan para los workers
+        """
+        conexion = self._conectar()
+        filas = conexion.execute("SELECT id, payload FROM eventos ORDER BY id").fetchall() if reproducir else []
+        maximo = conexion.execute("SELECT COALESCE(MAX(id), 0) FROM eventos").fetchone()[0]
+        self.pendientes_en_disco = conexion.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+        conexion.close()
+
+        self._siguiente_id = maximo + 1
+
+        pendientes = [self._desde_fila(id_evento, payload) for id_evento, payload in filas]
+
+        self._escritor = threading.Thread(target=self._bucle_escritor, name="cola-durable", daemon=True)
+        self._escritor.start()
+
+        if pendientes:
+            logger.warning(f"♻️ {len(pendientes)} eventos sin procesar recuperados de {self.ruta}")
+        return pendientes
+
+    @staticmethod
+    def _desde_fila(id_evento, payload):
+        evento = json.loads(payload)
+        evento["_ids_durables"] = [id_evento]
+        return evento
+
+    def agregar(self, evento, shard=0):
+        """Registra evento para el próximo commit; devuelve el lote a esperar"""
+        payload = json.dumps(
+            {clave: valor for clave, valor in evento.items() if not clave.startswith("_")},
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        with self._cond:
+            # Compartida: otro proceso puede estar insertando, el id lo asigna SQLite
+            id_evento = None if self.compartida else self._siguiente_id
+            self._siguiente_id += 1
+            self._inserciones.append((id_evento, evento["page_id"], time.time(), payload, shard))
+            self.pendientes_en_disco += 1
+            lote = self._lote_actual
+            self._cond.notify()
+
+        if id_evento is not None:
+            evento["_ids_durables"] = [id_evento]
+        return lote
+
+    def leer_pendientes(self, shards, desde_id=0, limite=500):
+        """Eventos sin confirmar de los shards indicados con id mayor a desde_id (modo worker)"""
+        marcadores = ",".join("?" * len(shards))
+        with self._lock_lector:
+            if self._lector is None:
+                self._lector = self._conectar()
+            filas = self._lector.execute(
+                f"SELECT id, payload FROM eventos WHERE shard IN ({marcadores}) AND id > ? ORDER BY id LIMIT ?",
+                (*shards, desde_id, limite)
+            ).fetchall()
+        return [self._desde_fila(id_evento, payload) for id_evento, payload in filas]
+
+    def contar_pendientes(self):
+        """Eventos sin confirmar en la base (todos los procesos)"""
+        with self._lock_lector:
+            if self._lector is None:
+                self._lector = self._conectar()
+            return self._lector.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+
+    def confirmar(self, ids):
+        """Ack: los eventos procesados se borran en el siguiente commit"""
+        if not ids:
+            return
+        with self._cond:
+            self._confirmaciones.extend(ids)
+            self.pendientes_en_disco -= len(ids)
+            self._cond.notify()
+
+    def _bucle_escritor(self):
+        conexion = self._conectar()
+        while True:
+            with self._cond:
+                while not (self._inserciones or self._confirmaciones or self._detener):
+                    self._cond.wait()
+                if self._detener and not (self._inserciones or self._confirmaciones):
+                    break
+                # Lo acumulado mientras se hacía el commit anterior entra en este lote
+                inserciones, self._inserciones = self._inserciones, []
+                confirmaciones, self._confirmaciones = self._confirmaciones, []
+                lote, self._lote_actual = self._lote_actual, LoteCommit()
+
+            fallo = False
+            try:
+                conexion.executemany(
+                    "INSERT INTO eventos (id, page_id, recibido, payload, shard) VALUES (?, ?, ?, ?, ?)",
+                    inserciones
+                )
+                conexion.executemany("DELETE FROM eventos WHERE id = ?", [(i,) for i in confirmaciones])
+                conexion.commit()
+            except Exception as e:
+                logger.error(f"Error escribiendo cola durable: {e}")
+                lote.error = e
+                conexion.rollback()
+                fallo = True
+                self._deshacer_lote(inserciones, confirmaciones)
+            finally:
+                lote.escrito.set()
+
+            if fallo:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._detener, ESPERA_REINTENTO)
+
+        conexion.close()
+
+    def _deshacer_lote(self, inserciones, confirmaciones):
+        """Rollback: las inserciones no llegaron a disco (su lote informa el error) y
+        los acks vuelven al próximo lote, o el evento se reprocesaría al reiniciar
+        """
+        with self._cond:
+            self.pendientes_en_disco -= len(inserciones)
+            if self._detener:
+                # Sin más lotes: los eventos siguen en disco y se reproducen al arrancar
+                self.pendientes_en_disco += len(confirmaciones)
+            else:
+                self._confirmaciones[:0] = confirmaciones
+
+    def detener(self, timeout=5):
+        """Escribe lo pendiente y detiene el escritor"""
+        if not self._escritor:
+            return
+        with self._cond:
+            self._detener = True
+            self._cond.notify()
+        self._escritor.join(timeout)
+        with self._lock_lector:
+            if self._lector is not None:
+                self._lector.close()
+                self._lector = None
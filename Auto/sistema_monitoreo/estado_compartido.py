@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Estado Compartido - SNAPSHOTS Y MARCAS ANTI-BUCLE EN SQLITE ENTRE PROCESOS
+Despliegue multiproceso: los procesos de ingesta y los workers por shard leen
+y escriben la misma base local (WAL) en lugar de diccionarios en memoria
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections.abc import MutableMapping
+
+from snapshot_store import ARCHIVO_SNAPSHOTS, SnapshotTarea, escribir_snapshots, leer_snapshots, uuid_a_bytes
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_ESTADO_COMPARTIDO = "monitor_compartido.db"
+
+
+class BaseCompartida:
+    """Conexión SQLite por hilo (los workers de shard comparten el objeto)"""
+
+    def __init__(self, ruta=ARCHIVO_ESTADO_COMPARTIDO):
+        self.ruta = ruta
+        self._local = threading.local()
+
+    def conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.executescript("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    tarea_id TEXT PRIMARY KEY,
+                    registro TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS mapas (
+                    mapa TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    PRIMARY KEY (mapa, clave)
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    clave TEXT PRIMARY KEY,
+                    valor TEXT
+                );
+                CREATE TABLE IF NOT EXISTS cambios_snapshots (
+                    tarea_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                );
+            """)
+            self._local.conexion = conexion
+        return conexion
+
+
+class MapaCompartido(MutableMapping):
+    """Diccionario respaldado por la base compartida (valores serializados en JSON)
+
+    Reemplaza cambios_sistema_timestamps, webhooks_en_espera y ultima_actividad_usuarios
+    """
+
+    def __init__(self, base, nombre):
+        self.base = base
+        self.nombre = nombre
+
+    def __getitem__(self, clave):
+        fila = self.base.conexion().execute(
+            "SELECT valor FROM mapas WHERE mapa = ? AND clave = ?", (self.nombre, clave)
+        ).fetchone()
+        if fila is None:
+            raise KeyError(clave)
+        return json.loads(fila[0])
+
+    def __setitem__(self, clave, valor):
+        conexion = self.base.conexion()
+        conexion.execute(
+            "INSERT OR REPLACE INTO mapas (mapa, clave, valor) VALUES (?, ?, ?)",
+            (self.nombre, clave, json.dumps(valor, ensure_ascii=False))
+        )
+        conexion.commit()
+
+    def __delitem__(self, clave):
+        conexion = self.base.conexion()
+        cursor = conexion.execute("DELETE FROM mapas WHERE mapa = ? AND clave = ?", (self.nombre, clave))
+        conexion.commit()
+        if cursor.rowcount == 0:
+            raise KeyError(clave)
+
+    def __contains__(self, clave):
+        return self.base.conexion().execute(
+            "SELECT 1 FROM mapas WHERE mapa = ? AND clave = ?", (self.nombre, clave)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        # Copia: el llamador puede borrar mientras recorre
+        filas = self.base.conexion().execute("SELECT clave FROM mapas WHERE mapa = ?", (self.nombre,)).fetchall()
+        return iter([fila[0] for fila in filas])
+
+    def __len__(self):
+        return self.base.conexion().execute(
+            "SELECT COUNT(*) FROM mapas WHERE mapa = ?", (self.nombre,)
+        ).fetchone()[0]
+
+    def items(self):
+        filas = self.base.conexion().execute(
+            "SELECT clave, valor FROM mapas WHERE mapa = ?", (self.nombre,)
+        ).fetchall()
+        return [(clave, json.loads(valor)) for clave, valor in filas]
+
+    def values(self):
+        return [valor for _, valor in self.items()]
+
+
+class SnapshotStoreCompartido:
+    """Misma interfaz que SnapshotStore; los snapshots viven en la base compartida
+
+    task_snapshots.json sigue siendo el formato de intercambio: se fusiona cuando
+    setup_monitoring lo reescribe y persistir() lo exporta. Solo el proceso con
+    exportador=True lo escribe, y solo si la base cambió desde la última exportación
+    """
+
+    listo = True
+
+    def __init__(self, base, ruta=ARCHIVO_SNAPSHOTS, exportador=False):
+        self.base = base
+        self.ruta = ruta
+        self.exportador = exportador
+        self._mtime = None
+
+    def existe_archivo(self):
+        return os.path.exists(self.ruta)
+
+    def cargar(self):
+        """Importa el JSON si cambió desde la última importación (de cualquier proceso)"""
+        self.recargar_si_cambio()
+        return len(self)
+
+    def cargar_en_segundo_plano(self):
+        # La base ya está en disco: solo se importa el JSON si cambió
+        self.cargar()
+
+    def esperar_carga(self, timeout=None):
+        return True
+
+    def recargar_si_cambio(self):
+        """Fusiona task_snapshots.json si otro proceso lo reescribió
+
+        Como SnapshotStore: los cambios aún no exportados se aplican encima del archivo,
+        salvo que el archivo traiga una versión más reciente de la tarea (last_edited_time)
+        """
+        if not self.existe_archivo():
+            return
+        mtime = os.path.getmtime(self.ruta)
+        if self._mtime == mtime:
+            return
+
+        conexion = self.base.conexion()
+        # IMMEDIATE: un solo proceso importa cada versión del archivo
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conexion.execute("SELECT valor FROM meta WHERE clave = 'mtime_snapshots'").fetchone()
+            if fila is None or float(fila[0]) != mtime:
+                metadatos, registros = leer_snapshots(self.ruta)
+                # Tarea con cambio local → registro local (None = eliminada)
+                locales = dict(conexion.execute(
+                    "SELECT c.tarea_id, s.registro FROM cambios_snapshots c LEFT JOIN snapshots s USING (tarea_id)"
+                ).fetchall())
+                conexion.execute("DELETE FROM snapshots WHERE tarea_id NOT IN (SELECT tarea_id FROM cambios_snapshots)")
+                for snapshot in registros:
+                    clave = snapshot.tarea_id.hex()
+                    if clave in locales:
+                        if locales[clave] is None:
+                            continue
+                        local = SnapshotTarea.desde_registro(clave, json.loads(locales[clave]))
+                        if (snapshot.last_edited_time or 0) <= (local.last_edited_time or 0):
+                            continue
+                        conexion.execute("DELETE FROM cambios_snapshots WHERE tarea_id = ?", (clave,))
+                    conexion.execute(
+                        "INSERT OR REPLACE INTO snapshots (tarea_id, registro) VALUES (?, ?)",
+                        (clave, json.dumps(snapshot.a_registro(), ensure_ascii=False))
+                    )
+                conexion.execute(
+                    "INSERT OR REPLACE INTO meta (clave, valor) VALUES ('mtime_snapshots', ?)", (repr(mtime),)
+                )
+                conexion.execute(
+                    "INSERT OR REPLACE INTO meta (clave, valor) VALUES ('metadatos_snapshots', ?)",
+                    (json.dumps(metadatos, ensure_ascii=False),)
+                )
+                pendientes = conexion.execute("SELECT COUNT(*) FROM cambios_snapshots").fetchone()[0]
+                if not pendientes:
+                    # La base coincide con el archivo: nada que exportar
+                    conexion.execute(
+                        "INSERT OR REPLACE INTO meta (clave, valor) VALUES ('version_exportada', ?)",
+                        (self._version(conexion),)
+                    )
+                logger.info(f"📸 Snapshots fusionados en estado compartido: {len(self)} tareas, "
+                            f"{pendientes} cambios locales conservados")
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        self._mtime = mtime
+
+    def obtener(self, tarea_id):
+        self.recargar_si_cambio()
+        clave = uuid_a_bytes(tarea_id).hex()
+        fila = self.base.conexion().execute(
+            "SELECT registro FROM snapshots WHERE tarea_id = ?", (clave,)
+        ).fetchone()
+        return None if fila is None else SnapshotTarea.desde_registro(clave, json.loads(fila[0]))
+
+    def _version(self, conexion):
+        fila = conexion.execute("SELECT valor FROM meta WHERE clave = 'version_snapshots'").fetchone()
+        return 0 if fila is None else int(fila[0])
+
+    def _marcar_cambio(self, conexion, clave):
+        # Contador de cambios en la misma transacción: decide si hace falta exportar
+        conexion.execute("""
+            INSERT INTO meta (clave, valor) VALUES ('version_snapshots', 1)
+            ON CONFLICT (clave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1
+        """)
+        # Tarea cambiada desde la última exportación: se conserva al fusionar el archivo
+        conexion.execute("""
+            INSERT OR REPLACE INTO cambios_snapshots (tarea_id, version)
+            SELECT ?, CAST(valor AS INTEGER) FROM meta WHERE clave = 'version_snapshots'
+        """, (clave,))
+
+    def guardar(self, snapshot):
+        conexion = self.base.conexion()
+        clave = snapshot.tarea_id.hex()
+        conexion.execute(
+            "INSERT OR REPLACE INTO snapshots (tarea_id, registro) VALUES (?, ?)",
+            (clave, json.dumps(snapshot.a_registro(), ensure_ascii=False))
+        )
+        self._marcar_cambio(conexion, clave)
+        conexion.commit()
+
+    def actualizar(self, tarea_id, valores, timestamp, last_edited_time):
+        """Actualiza un snapshot existente"""
+        snapshot = self.obtener(tarea_id)
+        if not snapshot:
+            return False
+        snapshot.actualizar(valores, timestamp, last_edited_time)
+        self.guardar(snapshot)
+        return True
+
+    def eliminar(self, tarea_id):
+        conexion = self.base.conexion()
+        clave = uuid_a_bytes(tarea_id).hex()
+        cursor = conexion.execute("DELETE FROM snapshots WHERE tarea_id = ?", (clave,))
+        if cursor.rowcount:
+            self._marcar_cambio(conexion, clave)
+        conexion.commit()
+        return cursor.rowcount > 0
+
+    def __len__(self):
+        return self.base.conexion().execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def __contains__(self, tarea_id):
+        return self.base.conexion().execute(
+            "SELECT 1 FROM snapshots WHERE tarea_id = ?", (uuid_a_bytes(tarea_id).hex(),)
+        ).fetchone() is not None
+
+    def valores(self):
+        filas = self.base.conexion().execute("SELECT tarea_id, registro FROM snapshots").fetchall()
+        return [SnapshotTarea.desde_registro(tarea_id, json.loads(registro)) for tarea_id, registro in filas]
+
+    @property
+    def metadatos(self):
+        fila = self.base.conexion().execute("SELECT valor FROM meta WHERE clave = 'metadatos_snapshots'").fetchone()
+        return {} if fila is None else json.loads(fila[0])
+
+    def persistir(self):
+        """Exporta a task_snapshots.json sin que los procesos lo vuelvan a importar
+
+        Solo el proceso exportador y solo con cambios desde la última exportación;
+        un archivo reescrito por setup_monitoring se fusiona antes en lugar de pisarse
+        Returns: True si escribió
+        """
+        if not self.exportador:
+            return False
+        self.recargar_si_cambio()
+        conexion = self.base.conexion()
+        version = self._version(conexion)
+        fila = conexion.execute("SELECT valor FROM meta WHERE clave = 'version_exportada'").fetchone()
+        if fila is not None and int(fila[0]) == version:
+            return False
+
+        escribir_snapshots(self.valores(), self.ruta, self.metadatos)
+        mtime = os.path.getmtime(self.ruta)
+        conexion.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('mtime_snapshots', ?)", (repr(mtime),))
+        conexion.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('version_exportada', ?)", (version,))
+        # Lo cambiado después de leer la versión sigue pendiente
+        conexion.execute("DELETE FROM cambios_snapshots WHERE version <= ?", (version,))
+        conexion.commit()
+        self._mtime = mtime
+        return True
+
+    def persistir_si_vigente(self):
+        """Apagado: no pisa un task_snapshots.json que otro proceso reescribió sin importarse"""
+        if not self.exportador:
+            return False
+        fila = self.base.conexion().execute("SELECT valor FROM meta WHERE clave = 'mtime_snapshots'").fetchone()
+        if self.existe_archivo() and (fila is None or float(fila[0]) != os.path.getmtime(self.ruta)):
+            logger.warning("📸 Archivo de snapshots reescrito por otro proceso: no se exporta al apagar")
+            return False
+        return self.persistir()
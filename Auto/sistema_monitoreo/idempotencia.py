@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Idempotencia de Webhooks - ÍNDICE DE IDS DE EVENTO NOTION
+LRU acotado en memoria + índice persistido en SQLite de ids recientes:
+las reentregas de Notion (minutos después o tras reinicio) se descartan
+antes de cualquier llamada a la API. Un id que ya salió del LRU se busca
+por clave primaria en una conexión de lectura, fuera del lock
+Modo compartido: varios procesos de ingesta registran ids en la misma base
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from cola_durable import LoteCommit
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_IDEMPOTENCIA = "webhook_idempotencia.db"
+# Ids recientes residentes en memoria (los que salen del LRU se buscan en disco)
+CAPACIDAD_LRU = 10000
+# Segundos que un id se conserva en disco (Notion reintenta durante horas, no días)
+RETENCION_SEGUNDOS = 24 * 3600
+# Escrituras al índice agrupadas por commit
+INTERVALO_ESCRITURA = 1.0
+# Espera máxima del hilo HTTP por el commit de su lote (modo compartido)
+TIMEOUT_COMMIT = 5
+
+
+class LoteAltas(LoteCommit):
+    """Lote del modo compartido: ids que el índice único aceptó en el commit"""
+
+    def __init__(self):
+        super().__init__()
+        self.aceptados = set()
+
+
+class IndiceIdempotencia:
+    """Registro de ids de evento ya aceptados (LRU + SQLite con escritura en segundo plano)
+
+    compartido=True: las altas se deciden contra el índice único en commits agrupados
+    (cada petición espera su lote), así dos procesos que reciben la misma reentrega
+    no la aceptan ambos
+    """
+
+    def __init__(self, ruta=ARCHIVO_IDEMPOTENCIA, capacidad=CAPACIDAD_LRU, retencion=RETENCION_SEGUNDOS,
+                 compartido=False):
+        self.ruta = ruta
+        self.compartido = compartido
+        self.capacidad = capacidad
+        self.retencion = retencion
+        self._recientes = OrderedDict()  # id → hora de registro
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._altas = {}  # id → hora de registro, pendientes de escribir
+        self._bajas = set()
+        self._lote_actual = LoteAltas()
+        self._detener = False
+        self._conexion = None
+        self._escritor = None
+        # Conexión de lectura por hilo HTTP (consultas de ids fuera del LRU)
+        self._lectura = threading.local()
+        self._lectores = []
+        self.reentregas_detectadas = 0
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False, timeout=30)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        conexion.execute("""
+            CREATE TABLE IF NOT EXISTS eventos_vistos (
+                id TEXT PRIMARY KEY,
+                visto REAL NOT NULL
+            )
+        """)
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_vistos_visto ON eventos_vistos (visto)")
+        conexion.commit()
+        return conexion
+
+    def iniciar(self):
+        """Purga ids vencidos, precarga los más recientes en el LRU y arranca el escritor"""
+        if self.ruta:
+            self._conexion = self._conectar()
+            limite = time.time() - self.retencion
+            self._conexion.execute("DELETE FROM eventos_vistos WHERE visto < ?", (limite,))
+            self._conexion.commit()
+            filas = self._conexion.execute(
+                "SELECT id, visto FROM eventos_vistos ORDER BY visto DESC LIMIT ?", (self.capacidad,)
+            ).fetchall()
+            for evento_id, visto in reversed(filas):
+                self._recientes[evento_id] = visto
+
+            self._escritor = threading.Thread(target=self._bucle_escritor, name="idempotencia", daemon=True)
+            self._escritor.start()
+            logger.info(f"🔁 Índice de idempotencia activo: {len(filas)} ids recientes ({self.ruta})")
+        return len(self._recientes)
+
+    def registrar_si_nuevo(self, evento_id):
+        """True si el id no se había visto (y queda registrado); False si es una reentrega"""
+        with self._lock:
+            if self._visto_en_memoria(evento_id):
+                return False
+            if self.compartido and self._conexion is not None:
+                # Ids de otros procesos no están en el LRU propio: decide el índice único
+                self._altas[evento_id] = time.time()
+                lote = self._lote_actual
+                self._cond.notify()
+            else:
+                lote = None
+                consultar = self._conexion is not None and evento_id not in self._bajas
+
+        if lote is not None:
+            return self._esperar_alta(evento_id, lote)
+
+        # Fuera del LRU pero quizá dentro de la retención: consulta indexada por id
+        visto = self._consultar_disco(evento_id) if consultar else None
+        ahora = time.time()
+        with self._lock:
+            # Otro hilo pudo registrarlo durante la consulta
+            if self._visto_en_memoria(evento_id):
+                return False
+            if visto is not None and visto >= ahora - self.retencion:
+                self._recordar(evento_id, visto)
+                self.reentregas_detectadas += 1
+                return False
+
+            self._recordar(evento_id, ahora)
+            if self._conexion is not None:
+                self._altas[evento_id] = ahora
+                self._cond.notify()
+            return True
+
+    def _visto_en_memoria(self, evento_id):
+        # Con el lock tomado: LRU o alta aún sin escribir
+        if evento_id in self._recientes:
+            self._recientes.move_to_end(evento_id)
+        elif evento_id not in self._altas:
+            return False
+        self.reentregas_detectadas += 1
+        return True
+
+    def _consultar_disco(self, evento_id):
+        """Hora de registro del id en el índice, o None (conexión de lectura del hilo)"""
+        conexion = getattr(self._lectura, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, check_same_thread=False, timeout=30)
+            self._lectura.conexion = conexion
+            with self._lock:
+                self._lectores.append(conexion)
+        fila = conexion.execute("SELECT visto FROM eventos_vistos WHERE id = ?", (evento_id,)).fetchone()
+        return None if fila is None else fila[0]
+
+    def _esperar_alta(self, evento_id, lote):
+        # Un error de escritura se propaga: el webhook responde 500 y Notion reintenta
+        if not lote.esperar(TIMEOUT_COMMIT):
+            raise lote.error or TimeoutError("Índice de idempotencia sin commit")
+        if evento_id in lote.aceptados:
+            return True
+        with self._lock:
+            self.reentregas_detectadas += 1
+        return False
+
+    def olvidar(self, evento_id):
+        """Revierte un registro (el evento no se aceptó y Notion lo reintentará)"""
+        with self._lock:
+            self._recientes.pop(evento_id, None)
+            self._altas.pop(evento_id, None)
+            if self._conexion is None:
+                return
+            self._bajas.add(evento_id)
+            lote = self._lote_actual
+            self._cond.notify()
+        if self.compartido:
+            # El reintento puede llegar a otro proceso: la baja debe estar escrita
+            lote.esperar(TIMEOUT_COMMIT)
+
+    def _recordar(self, evento_id, visto):
+        self._recientes[evento_id] = visto
+        if len(self._recientes) > self.capacidad:
+            self._recientes.popitem(last=False)
+
+    def _escribir(self, altas, bajas, lote):
+        try:
+            # Bajas primero: un id olvidado y vuelto a registrar en el mismo lote queda dado de alta
+            self._conexion.executemany("DELETE FROM eventos_vistos WHERE id = ?", [(i,) for i in bajas])
+            if self.compartido:
+                # Un id vencido aún sin purgar se vuelve a aceptar
+                for evento_id, visto in altas.items():
+                    cursor = self._conexion.execute(
+                        "INSERT INTO eventos_vistos (id, visto) VALUES (?, ?) "
+                        "ON CONFLICT (id) DO UPDATE SET visto = excluded.visto WHERE visto < ?",
+                        (evento_id, visto, visto - self.retencion)
+                    )
+                    if cursor.rowcount:
+                        lote.aceptados.add(evento_id)
+            else:
+                self._conexion.executemany(
+                    "INSERT OR REPLACE INTO eventos_vistos (id, visto) VALUES (?, ?)", altas.items()
+                )
+            self._conexion.commit()
+        except Exception as e:
+            logger.error(f"Error escribiendo índice de idempotencia: {e}")
+            lote.error = e
+            lote.aceptados.clear()
+            self._conexion.rollback()
+
+    def _bucle_escritor(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._altas or self._bajas or self._detener)
+                salir = self._detener
+                altas, self._altas = self._altas, {}
+                bajas, self._bajas = self._bajas, set()
+                lote, self._lote_actual = self._lote_actual, LoteAltas()
+                if not self.compartido:
+                    # Dentro del lock: una consulta a disco no ve una baja a medio escribir
+                    self._escribir(altas, bajas, lote)
+
+            if self.compartido:
+                # Fuera del lock: las peticiones siguientes forman el próximo lote
+                self._escribir(altas, bajas, lote)
+                with self._lock:
+                    for evento_id in lote.aceptados:
+                        self._recordar(evento_id, altas[evento_id])
+            lote.escrito.set()
+
+            if salir:
+                return
+            if not self.compartido:
+                # Agrupa las altas de la siguiente ventana en un solo commit (o sale al detener)
+                with self._cond:
+                    self._cond.wait_for(lambda: self._detener, INTERVALO_ESCRITURA)
+
+    def detener(self, timeout=5):
+        """Escribe lo pendiente y cierra el índice"""
+        if self._conexion is None:
+            return
+        if self._escritor:
+            with self._cond:
+                self._detener = True
+                self._cond.notify()
+            self._escritor.join(timeout)
+        with self._lock:
+            lectores, self._lectores = self._lectores, []
+        for conexion in lectores:
+            conexion.close()
+        self._lectura = threading.local()
+        self._conexion.close()
+        self._conexion = None
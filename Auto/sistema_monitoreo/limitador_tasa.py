@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Limitador de Tasa - TOKEN BUCKET PARA LLAMADAS A NOTION
+Notion admite en promedio 3 solicitudes por segundo por integración: las escrituras
+en paralelo piden un token antes de cada llamada
+"""
+
+import time
+import threading
+
+# Límite promedio documentado por Notion (solicitudes/s)
+SOLICITUDES_POR_SEGUNDO_NOTION = 3
+
+
+class LimitadorTasa:
+    """Token bucket thread-safe: 'tasa' tokens por segundo con ráfagas de hasta 'rafaga'"""
+
+    def __init__(self, tasa=SOLICITUDES_POR_SEGUNDO_NOTION, rafaga=None):
+        self.tasa = tasa
+        self.rafaga = rafaga if rafaga is not None else tasa
+        self._tokens = float(self.rafaga)
+        self._actualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _recargar(self, ahora):
+        self._tokens = min(self.rafaga, self._tokens + (ahora - self._actualizado) * self.tasa)
+        self._actualizado = ahora
+
+    def intentar(self):
+        """Consume un token si hay disponible, sin esperar"""
+        with self._lock:
+            self._recargar(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def adquirir(self):
+        """Espera hasta obtener un token"""
+        while True:
+            with self._lock:
+                self._recargar(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.tasa
+            time.sleep(espera)
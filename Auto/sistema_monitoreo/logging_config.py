@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Logging No Bloqueante - QUEUEHANDLER/QUEUELISTENER CON REGISTROS JSON
+Los hilos de request y workers solo encolan el LogRecord; el formateo y la
+escritura a archivo/consola ocurren en el hilo del listener
+"""
+
+import os
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Sufijo de loggers de alto volumen (una línea por propiedad) sujetos a muestreo
+SUFIJO_DETALLE = ".detalle"
+
+FORMATO_TEXTO = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Atributos estándar de LogRecord: el resto son campos de extra={...}
+_ATRIBUTOS_RECORD = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+class FormateadorJSON(logging.Formatter):
+    """Un objeto JSON por línea con los campos de extra={...} al primer nivel"""
+
+    def format(self, record):
+        datos = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "hilo": record.threadName,
+            "mensaje": record.getMessage()
+        }
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD and not clave.startswith("_"):
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar una fracción de los registros de loggers '.detalle' (WARNING+ siempre pasa)"""
+
+    def __init__(self, fraccion):
+        super().__init__()
+        self.fraccion = fraccion
+        self.descartados = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not record.name.endswith(SUFIJO_DETALLE):
+            return True
+        if self.fraccion >= 1 or random.random() < self.fraccion:
+            return True
+        self.descartados += 1
+        return False
+
+
+class ManejadorCola(QueueHandler):
+    """QueueHandler con formateo diferido: JSON, traceback y E/S ocurren en el listener"""
+
+    def prepare(self, record):
+        # Como el QueueHandler estándar, el mensaje se resuelve aquí: los args pueden
+        # ser objetos que el hilo sigue modificando. A diferencia de él no se aplica el
+        # Formatter ni se serializa exc_info (la cola es en proceso); el record se copia
+        # para no alterar el que ven otros handlers
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def configurar_logging(archivo=None, nivel=None, muestreo_detalle=None):
+    """Reemplaza los handlers del root por un pipeline no bloqueante
+
+    - archivo: registros JSON (uno por línea)
+    - consola: formato de texto habitual
+    - muestreo_detalle: fracción de registros INFO/DEBUG de loggers '.detalle' conservados
+    """
+    global _listener
+
+    nivel = nivel or os.getenv("LOG_NIVEL", "INFO")
+    if muestreo_detalle is None:
+        muestreo_detalle = float(os.getenv("LOG_MUESTREO_DETALLE", 0.1))
+
+    handlers = []
+    if archivo:
+        archivo_handler = logging.FileHandler(archivo, encoding='utf-8')
+        archivo_handler.setFormatter(FormateadorJSON())
+        handlers.append(archivo_handler)
+    consola = logging.StreamHandler()
+    consola.setFormatter(logging.Formatter(FORMATO_TEXTO))
+    handlers.append(consola)
+
+    detener_logging()
+
+    cola = queue.SimpleQueue()
+    manejador = ManejadorCola(cola)
+    manejador.addFilter(FiltroMuestreo(muestreo_detalle))
+
+    # force: módulos importados antes (task_monitor) ya llamaron a basicConfig
+    logging.basicConfig(level=nivel, handlers=[manejador], force=True)
+
+    _listener = QueueListener(cola, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def detener_logging():
+    """Vacía la cola y detiene el listener (registrado en atexit)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(detener_logging)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Métricas del Sistema de Monitoreo - FORMATO DE EXPOSICIÓN PROMETHEUS
+Contadores, histogramas e indicadores thread-safe sin dependencias externas
+"""
+
+import time
+import threading
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatear_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monótono con etiquetas"""
+
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores_etiquetas, cantidad=1):
+        with self._lock:
+            self._valores[valores_etiquetas] = self._valores.get(valores_etiquetas, 0) + cantidad
+
+    def valor(self, *valores_etiquetas):
+        return self._valores.get(valores_etiquetas, 0)
+
+    def lineas(self):
+        with self._lock:
+            valores = list(self._valores.items())
+        for etiquetas, valor in valores:
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {_formatear_numero(valor)}"
+
+
+class Histograma:
+    """Histograma acumulativo con etiquetas (buckets en segundos)"""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}  # etiquetas → [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores_etiquetas):
+        with self._lock:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                serie = self._series[valores_etiquetas] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def medir(self, *valores_etiquetas):
+        """Context manager que observa la duración del bloque"""
+        return _Cronometro(self, valores_etiquetas)
+
+    def lineas(self):
+        with self._lock:
+            series = [(etiquetas, list(serie[0]), serie[1], serie[2]) for etiquetas, serie in self._series.items()]
+        for etiquetas, conteos, suma, total in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                le = f'le="{_formatear_numero(limite)}"'
+                yield f"{self.nombre}_bucket{_formatear_etiquetas(self.etiquetas, etiquetas, le)} {acumulado}"
+            yield f"{self.nombre}_sum{_formatear_etiquetas(self.etiquetas, etiquetas)} {_formatear_numero(suma)}"
+            yield f"{self.nombre}_count{_formatear_etiquetas(self.etiquetas, etiquetas)} {total}"
+
+
+class _Cronometro:
+    def __init__(self, histograma, valores_etiquetas):
+        self.histograma = histograma
+        self.valores_etiquetas = valores_etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.valores_etiquetas)
+        return False
+
+
+class Indicador:
+    """Gauge calculado al exponer: funcion() → número o {tupla_etiquetas: número}"""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = tuple(etiquetas)
+
+    def lineas(self):
+        valor = self.funcion()
+        if valor is None:
+            return
+        if not isinstance(valor, dict):
+            valor = {(): valor}
+        for etiquetas, numero in valor.items():
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {_formatear_numero(numero)}"
+
+
+class RegistroMetricas:
+    """Registro de métricas del proceso"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            existente = self._metricas.get(metrica.nombre)
+            if existente is not None:
+                return existente
+            self._metricas[metrica.nombre] = metrica
+            return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def indicador(self, nombre, ayuda, funcion, etiquetas=()):
+        with self._lock:
+            # Un indicador se puede redefinir (p.ej. al recrear el procesador)
+            self._metricas[nombre] = Indicador(nombre, ayuda, funcion, etiquetas)
+            return self._metricas[nombre]
+
+    def exponer(self):
+        """Texto en formato de exposición Prometheus 0.0.4"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+        salida = []
+        for metrica in metricas:
+            salida.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            salida.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            salida.extend(metrica.lineas())
+        return "\n".join(salida) + "\n"
+
+
+REGISTRO = RegistroMetricas()
+
+NOTION_API_SEGUNDOS = REGISTRO.histograma(
+    "notion_api_segundos", "Latencia de llamadas a la API de Notion", ("endpoint",)
+)
+NOTION_API_ERRORES = REGISTRO.contador(
+    "notion_api_errores_total", "Llamadas a la API de Notion que fallaron", ("endpoint",)
+)
+CACHE_CONSULTAS = REGISTRO.contador(
+    "monitor_cache_consultas_total", "Consultas a caches del monitor", ("cache", "resultado")
+)
+
+ENDPOINTS_NOTION = {
+    "pages": ("retrieve", "update", "create"),
+    "databases": ("query", "retrieve")
+}
+
+
+def instrumentar_cliente_notion(cliente):
+    """Envuelve los endpoints usados del cliente Notion para medir latencia por endpoint"""
+    for nombre_grupo, metodos in ENDPOINTS_NOTION.items():
+        grupo = getattr(cliente, nombre_grupo, None)
+        if grupo is None:
+            continue
+        for nombre_metodo in metodos:
+            original = getattr(grupo, nombre_metodo, None)
+            if original is None or getattr(original, "_instrumentado", False):
+                continue
+            setattr(grupo, nombre_metodo, _medir_llamada(f"{nombre_grupo}.{nombre_metodo}", original))
+    return cliente
+
+
+def _medir_llamada(endpoint, funcion):
+    def envoltura(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        except Exception:
+            NOTION_API_ERRORES.incrementar(endpoint)
+            raise
+        finally:
+            NOTION_API_SEGUNDOS.observar(time.perf_counter() - inicio, endpoint)
+
+    envoltura._instrumentado = True
+    return envoltura
+
+
+def registrar_consulta_cache(cache, acierto):
+    CACHE_CONSULTAS.incrementar(cache, "hit" if acierto else "miss")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Planificador por Prioridad - COLA POR SHARD CON NIVELES Y LÍMITE DE INANICIÓN
+Lo que puede requerir reversión se atiende antes que lo que solo se registra;
+los trabajos de fondo (log, persistencia de snapshots) van al final
+"""
+
+import time
+import threading
+from queue import Empty
+from collections import deque
+
+# Niveles de prioridad (menor = se atiende antes)
+PRIORIDAD_ALTA = 0    # Eliminaciones, creaciones y cambios bloqueables en tareas con snapshot
+PRIORIDAD_NORMAL = 1  # Eventos sin clasificar (esquema desconocido, sin snapshot)
+PRIORIDAD_BAJA = 2    # Cambios que solo se registran (Estado, campos no monitoreados)
+PRIORIDAD_FONDO = 3   # Trabajos de fondo: escritura de log, persistencia de snapshots
+
+NOMBRES_PRIORIDAD = ("alta", "normal", "baja", "fondo")
+
+# Límite de inanición: segundos máximos que la cabeza de un nivel espera antes de
+# atenderse por delante de niveles más prioritarios
+ESPERA_MAXIMA_SEGUNDOS = {
+    PRIORIDAD_NORMAL: 5,
+    PRIORIDAD_BAJA: 15,
+    PRIORIDAD_FONDO: 30
+}
+
+
+class TrabajoFondo:
+    """Trabajo diferido que un worker ejecuta en la prioridad más baja"""
+
+    __slots__ = ("funcion", "args", "descripcion")
+
+    def __init__(self, funcion, args=(), descripcion=None):
+        self.funcion = funcion
+        self.args = args
+        self.descripcion = descripcion or getattr(funcion, "__name__", "trabajo")
+
+    def ejecutar(self):
+        return self.funcion(*self.args)
+
+
+class _Entrada:
+    __slots__ = ("item", "nivel", "clave", "encolado_en", "activa")
+
+    def __init__(self, item, nivel, clave, encolado_en):
+        self.item = item
+        self.nivel = nivel
+        self.clave = clave
+        self.encolado_en = encolado_en
+        self.activa = True
+
+
+class ColaPrioridad:
+    """Cola por niveles con orden estricto por clave (página) y límite de inanición
+
+    - Se atiende la cabeza del nivel más prioritario con elementos.
+    - Orden por clave: si llega un elemento más prioritario de una clave con elementos
+      pendientes en niveles inferiores, esos se promueven a su nivel (conservan su orden),
+      así un evento nunca adelanta a uno anterior de la misma página.
+    - Inanición: si la cabeza de un nivel lleva más de ESPERA_MAXIMA_SEGUNDOS[nivel] en
+      cola se atiende primero (o el elemento más antiguo de su clave, si tiene uno previo).
+    """
+
+    def __init__(self, espera_maxima=None):
+        self.espera_maxima = dict(ESPERA_MAXIMA_SEGUNDOS if espera_maxima is None else espera_maxima)
+        self._niveles = [deque() for _ in NOMBRES_PRIORIDAD]
+        self._por_clave = {}  # clave → deque de entradas pendientes en orden de llegada
+        self._pendientes_nivel = [0] * len(NOMBRES_PRIORIDAD)
+        self._tamano = 0
+        self._condicion = threading.Condition()
+        self.atendidos_por_espera = 0
+        self.promovidos_por_orden = 0
+
+    def put(self, item, prioridad=PRIORIDAD_NORMAL, clave=None):
+        with self._condicion:
+            ahora = time.monotonic()
+            if clave is not None:
+                pendientes = self._por_clave.setdefault(clave, deque())
+                for i, anterior in enumerate(pendientes):
+                    if anterior.nivel > prioridad:
+                        pendientes[i] = self._mover(anterior, prioridad)
+                        self.promovidos_por_orden += 1
+
+            entrada = _Entrada(item, prioridad, clave, ahora)
+            self._niveles[prioridad].append(entrada)
+            if clave is not None:
+                self._por_clave[clave].append(entrada)
+            self._pendientes_nivel[prioridad] += 1
+            self._tamano += 1
+            self._condicion.notify()
+
+    def _mover(self, entrada, nivel):
+        """Reemplaza la entrada por una copia en otro nivel (la original queda como lápida)"""
+        entrada.activa = False
+        nueva = _Entrada(entrada.item, nivel, entrada.clave, entrada.encolado_en)
+        self._niveles[nivel].append(nueva)
+        self._pendientes_nivel[entrada.nivel] -= 1
+        self._pendientes_nivel[nivel] += 1
+        return nueva
+
+    def _cabeza(self, nivel):
+        cola = self._niveles[nivel]
+        while cola and not cola[0].activa:
+            cola.popleft()
+        return cola[0] if cola else None
+
+    def _siguiente(self):
+        ahora = time.monotonic()
+
+        vencida = None
+        for nivel, limite in self.espera_maxima.items():
+            cabeza = self._cabeza(nivel)
+            if cabeza and ahora - cabeza.encolado_en > limite:
+                if vencida is None or cabeza.encolado_en < vencida.encolado_en:
+                    vencida = cabeza
+
+        if vencida is not None:
+            self.atendidos_por_espera += 1
+            # El más antiguo de la misma clave va primero (está en un nivel igual o más prioritario)
+            entrada = self._por_clave[vencida.clave][0] if vencida.clave is not None else vencida
+        else:
+            entrada = next(c for c in map(self._cabeza, range(len(self._niveles))) if c is not None)
+
+        entrada.activa = False
+        if entrada.clave is not None:
+            pendientes = self._por_clave[entrada.clave]
+            pendientes.popleft()
+            if not pendientes:
+                del self._por_clave[entrada.clave]
+        self._pendientes_nivel[entrada.nivel] -= 1
+        self._tamano -= 1
+        return entrada.item
+
+    def get(self, timeout=None):
+        with self._condicion:
+            if not self._condicion.wait_for(lambda: self._tamano > 0, timeout):
+                raise Empty
+            return self._siguiente()
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def qsize(self):
+        return self._tamano
+
+    def pendientes(self, prioridad):
+        return self._pendientes_nivel[prioridad]
+
+    def pendientes_por_prioridad(self):
+        return dict(zip(NOMBRES_PRIORIDAD, self._pendientes_nivel))
+
+    def edad_mas_antigua(self):
+        """Segundos que lleva en cola la cabeza más antigua (0 si no hay)"""
+        with self._condicion:
+            cabezas = [c for c in map(self._cabeza, range(len(self._niveles))) if c is not None]
+        if not cabezas:
+            return 0.0
+        return time.monotonic() - min(c.encolado_en for c in cabezas)
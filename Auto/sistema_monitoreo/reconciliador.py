@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Reconciliador - BARRIDO PERIÓDICO PARA CAMBIOS SIN WEBHOOK
+Si Notion pierde un webhook o el servidor estaba caído, el snapshot queda desfasado.
+Cada intervalo consulta las tareas de sprints monitoreados editadas desde el barrido
+anterior y encola en prioridad baja un evento sintético por cada tarea cuyo
+last_edited_time supera al de su snapshot: pasa por el mismo camino que un webhook.
+Usa su propio presupuesto de solicitudes y cede ante eventos de webhook en cola
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+
+import task_monitor
+from limitador_tasa import LimitadorTasa
+from metricas import REGISTRO
+from snapshot_store import iso_a_epoch, marca_agua_utc
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre barridos (0 desactiva el reconciliador)
+INTERVALO_RECONCILIACION = float(os.getenv("WEBHOOK_RECONCILIACION_INTERVALO", 300))
+# Solicitudes/s a Notion del reconciliador (consultas + lectura de cada tarea encolada);
+# el resto del límite de la API queda para el tráfico en vivo
+TASA_RECONCILIACION = float(os.getenv("WEBHOOK_RECONCILIACION_TASA", 1))
+# Pausa mientras hay eventos de webhook esperando
+ESPERA_TRAFICO = 0.5
+
+ORIGEN_RECONCILIACION = "reconciliacion"
+
+TAREAS_RECONCILIADAS = REGISTRO.contador(
+    "monitor_reconciliacion_tareas_total", "Tareas revisadas por el reconciliador por resultado", ("resultado",)
+)
+
+
+class Reconciliador:
+    """Barrido periódico en un thread; barrer() se puede invocar directamente"""
+
+    def __init__(self, monitor, processor, intervalo=INTERVALO_RECONCILIACION, tasa=TASA_RECONCILIACION,
+                 shards=None):
+        self.monitor = monitor
+        self.processor = processor
+        self.intervalo = intervalo
+        # Worker multiproceso: shards propios; las páginas del resto van a la cola compartida
+        # para que las procese su dueño (un solo proceso barre todo el despliegue)
+        self.shards = None if shards is None else set(shards)
+        self.limitador = LimitadorTasa(tasa=tasa, rafaga=1)
+        # Inicio del último barrido completo: el siguiente solo pide lo editado después
+        self.marca_agua = None
+        self.barridos = 0
+        self.eventos_encolados = 0
+        self.ultimo_barrido = None
+        self._detenido = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, name="reconciliador", daemon=True)
+        self._hilo.start()
+        logger.info(f"🔁 Reconciliador activo: cada {self.intervalo:.0f}s, {self.limitador.tasa} solicitudes/s")
+
+    def detener(self):
+        self._detenido.set()
+
+    def _bucle(self):
+        # El primer barrido cubre lo que cambió mientras el servidor estaba caído
+        while not self._detenido.is_set():
+            try:
+                self.barrer()
+            except Exception as e:
+                logger.error(f"Error en barrido de reconciliación: {e}")
+            self._detenido.wait(self.intervalo)
+
+    def ceder(self):
+        """Espera mientras haya eventos de webhook en cola (el tráfico en vivo va primero)"""
+        while not self._detenido.is_set() and self.processor.eventos_en_vivo() > 0:
+            time.sleep(ESPERA_TRAFICO)
+
+    def solicitud(self):
+        """Turno para una llamada a Notion dentro del presupuesto del reconciliador"""
+        self.ceder()
+        self.limitador.adquirir()
+
+    def consultar(self, database_id, filtro):
+        """Resultados de una consulta, página a página (cada página consume presupuesto)"""
+        start_cursor = None
+        while True:
+            query_params = {"database_id": database_id, "filter": filtro, "page_size": 100}
+            if start_cursor:
+                query_params["start_cursor"] = start_cursor
+
+            self.solicitud()
+            response = task_monitor.notion.databases.query(**query_params)
+            yield from response["results"]
+
+            if not response.get("has_more", False):
+                return
+            start_cursor = response.get("next_cursor")
+
+    def filtro_tareas(self, sprint_ids):
+        filtros = [{"property": "Sprint", "relation": {"contains": sprint_id}} for sprint_id in sprint_ids]
+        filtro = filtros[0] if len(filtros) == 1 else {"or": filtros}
+        if self.marca_agua is None:
+            return filtro
+        condicion = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": self.marca_agua}}
+        return {"and": [filtro, condicion]}
+
+    def tipo_evento(self, tarea, base_creacion):
+        """Evento sintético que corresponde a la tarea, o None si el snapshot está al día"""
+        snapshot = self.monitor.snapshots.obtener(tarea["id"])
+        if snapshot is None:
+            # Sin snapshot: solo es una creación perdida si nació después de la última revisión
+            # (las tareas inválidas en setup tampoco tienen snapshot)
+            if base_creacion and tarea.get("created_time", "") >= base_creacion:
+                return "page.created"
+            return None
+        if (iso_a_epoch(tarea.get("last_edited_time")) or 0) > (snapshot.last_edited_time or 0):
+            return "page.properties_updated"
+        return None
+
+    def encolar(self, evento):
+        """Cola local si la página es de un shard propio; si no, la cola compartida del dueño"""
+        shard = self.processor.shard_de(evento["page_id"])
+        if self.shards is None or shard in self.shards:
+            self.processor.encolar_evento(evento)
+        else:
+            self.processor.cola_durable.agregar(evento, shard)
+
+    def barrer(self):
+        """Un barrido: consulta, compara con los snapshots y encola lo desfasado
+
+        Returns: eventos encolados
+        """
+        marca = marca_agua_utc()
+        base_creacion = self.marca_agua or self.monitor.snapshots.metadatos.get("marca_agua")
+
+        sprint_ids = [
+            sprint["id"] for sprint in self.consultar(
+                task_monitor.DB_SPRINTS_ID, {"property": "Monitoreo Activo", "checkbox": {"equals": True}}
+            )
+        ]
+        if not sprint_ids:
+            logger.debug("🔁 Reconciliación: sin sprints monitoreados")
+            return 0
+
+        revisadas = 0
+        encolados = 0
+        for tarea in self.consultar(task_monitor.DB_TAREAS_ID, self.filtro_tareas(sprint_ids)):
+            page_id = tarea["id"]
+            revisadas += 1
+
+            tipo = self.tipo_evento(tarea, base_creacion)
+            if tipo is None:
+                TAREAS_RECONCILIADAS.incrementar("al_dia")
+                continue
+            if self.processor.actualizaciones_en_cola.get(page_id, 0) > 0:
+                # Ya hay un webhook de la página en cola: su diff completo lo cubre
+                TAREAS_RECONCILIADAS.incrementar("en_cola")
+                continue
+
+            # El monitor leerá la tarea: esa llamada también sale del presupuesto
+            self.solicitud()
+            self.encolar({
+                "id": f"{ORIGEN_RECONCILIACION}-{uuid.uuid4()}",
+                "type": tipo,
+                "page_id": page_id,
+                "origen": ORIGEN_RECONCILIACION
+            })
+            TAREAS_RECONCILIADAS.incrementar("encolada")
+            encolados += 1
+
+        self.marca_agua = marca
+        self.barridos += 1
+        self.eventos_encolados += encolados
+        self.ultimo_barrido = time.time()
+        if encolados:
+            logger.warning(f"🔁 Reconciliación: {encolados} tareas desfasadas de {revisadas} revisadas - encoladas")
+        else:
+            logger.info(f"🔁 Reconciliación: {revisadas} tareas revisadas, snapshots al día")
+        return encolados
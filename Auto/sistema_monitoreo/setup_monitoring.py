@@ -6,10 +6,15 @@ Crea snapshots de TODAS las tareas relevantes al configurar monitoreo
 
 import os
 import logging
-import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 from notion_client import Client
 from dotenv import load_dotenv
+from snapshot_store import (
+    EscritorSnapshots, SnapshotStore, SnapshotTarea, escribir_snapshots, marca_agua_utc, uuid_a_bytes
+)
+from limitador_tasa import LimitadorTasa
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,53 +35,67 @@ PROPIEDADES_MONITOREADAS = [
     "Estado"       # Estado (siempre permitido pero se registra)
 ]
 
+# Sprints anteriores al actual que siguen monitoreados
+SPRINTS_ANTERIORES = int(os.getenv("MONITOREO_SPRINTS_ANTERIORES", 2))
+# Llamadas simultáneas a Notion (consultas por sprint, escrituras de "Monitoreo Activo")
+MAX_CONSULTAS_PARALELAS = 4
+
 class MonitoringSetupInteligente:
     """Configurador de monitoreo inteligente con SNAPSHOT GLOBAL"""
     
-    def __init__(self):
+    def __init__(self, sprints_anteriores=SPRINTS_ANTERIORES):
         self.zona_horaria = timezone(timedelta(hours=-5))
+        self.sprints_anteriores = sprints_anteriores
+        # Escrituras concurrentes sin superar el límite de la API
+        self.limitador = LimitadorTasa()
+    
+    def consultar_paginado(self, database_id, limite=None, **params):
+        """Itera resultados de una consulta página a página; con limite deja de pedir al alcanzarlo"""
+        entregados = 0
+        start_cursor = None
+        while True:
+            query_params = {
+                "database_id": database_id,
+                "page_size": 100 if limite is None else min(100, limite - entregados),
+                **params
+            }
+            if start_cursor:
+                query_params["start_cursor"] = start_cursor
+            
+            response = notion.databases.query(**query_params)
+            for resultado in response["results"]:
+                yield resultado
+                entregados += 1
+                if limite is not None and entregados >= limite:
+                    return
+            
+            if not response.get("has_more", False):
+                return
+            start_cursor = response.get("next_cursor")
     
     def obtener_sprints_relevantes(self):
-        """Obtiene sprints que deben monitorearse: actual + hasta 2 anteriores"""
+        """Obtiene sprints que deben monitorearse: actual + hasta N anteriores
+        
+        Dos consultas filtradas en Notion (sprint actual; anteriores por Fecha Fin)
+        que se cortan al tener lo necesario, sin recorrer todos los sprints
+        """
+        orden_fecha_fin = [{"property": "Fecha Fin", "direction": "descending"}]
         try:
-            # Obtener todos los sprints ordenados por fecha fin (descendente)
-            response = notion.databases.query(
-                database_id=DB_SPRINTS_ID,
-                sorts=[
-                    {
-                        "property": "Fecha Fin",
-                        "direction": "descending"
-                    }
-                ]
-            )
-            
-            sprints = response["results"]
-            logger.info(f"Total de sprints encontrados: {len(sprints)}")
-            
-            sprints_relevantes = []
-            
-            # BUSCAR SPRINT ACTUAL
-            sprint_actual = None
-            for sprint in sprints:
-                nombre_sprint = sprint["properties"]["Nombre"]["title"][0]["text"]["content"]
-                es_actual_prop = sprint["properties"].get("Es Actual", {})
-                
-                es_actual_value = False
-                if "formula" in es_actual_prop and es_actual_prop["formula"]:
-                    if "boolean" in es_actual_prop["formula"]:
-                        es_actual_value = es_actual_prop["formula"]["boolean"]
-                
-                if es_actual_value:
-                    sprint_actual = sprint
-                    logger.info(f"✅ Sprint actual encontrado: {nombre_sprint}")
-                    break
+            # BUSCAR SPRINT ACTUAL (el de Fecha Fin más reciente si hubiera varios)
+            sprint_actual = next(self.consultar_paginado(
+                DB_SPRINTS_ID,
+                limite=1,
+                filter={"property": "Es Actual", "formula": {"checkbox": {"equals": True}}},
+                sorts=orden_fecha_fin
+            ), None)
             
             if not sprint_actual:
                 logger.error("❌ No se encontró sprint actual")
                 return []
             
-            # Agregar sprint actual
-            sprints_relevantes.append(sprint_actual)
+            nombre_sprint = sprint_actual["properties"]["Nombre"]["title"][0]["text"]["content"]
+            logger.info(f"✅ Sprint actual encontrado: {nombre_sprint}")
+            sprints_relevantes = [sprint_actual]
             
             # Obtener fecha fin para comparación
             fecha_fin_actual_prop = sprint_actual["properties"].get("Fecha Fin", {})
@@ -84,38 +103,18 @@ class MonitoringSetupInteligente:
                 logger.warning("⚠️ Sprint actual sin fecha fin - solo monitoreando sprint actual")
                 return sprints_relevantes
             
-            fecha_fin_actual_str = fecha_fin_actual_prop["date"]["start"]
-            fecha_fin_actual = datetime.fromisoformat(fecha_fin_actual_str)
-            
-            # BUSCAR SPRINTS ANTERIORES (hasta 2 adicionales)
-            sprints_anteriores_candidatos = []
-            
-            for sprint in sprints:
-                if sprint["id"] == sprint_actual["id"]:
-                    continue
-                
-                fecha_fin_prop = sprint["properties"].get("Fecha Fin", {})
-                
-                if "date" in fecha_fin_prop and fecha_fin_prop["date"]:
-                    fecha_fin_str = fecha_fin_prop["date"]["start"]
-                    fecha_fin = datetime.fromisoformat(fecha_fin_str)
-                    
-                    if fecha_fin < fecha_fin_actual:
-                        nombre_sprint = sprint["properties"]["Nombre"]["title"][0]["text"]["content"]
-                        sprints_anteriores_candidatos.append({
-                            "sprint": sprint,
-                            "nombre": nombre_sprint,
-                            "fecha_fin": fecha_fin
-                        })
-            
-            # Ordenar por fecha más reciente y tomar hasta 2
-            sprints_anteriores_candidatos.sort(key=lambda x: x["fecha_fin"], reverse=True)
-            max_anteriores = min(2, len(sprints_anteriores_candidatos))
-            
-            for i in range(max_anteriores):
-                candidato = sprints_anteriores_candidatos[i]
-                sprints_relevantes.append(candidato["sprint"])
-                logger.info(f"✅ Sprint anterior encontrado: {candidato['nombre']}")
+            # BUSCAR SPRINTS ANTERIORES: Fecha Fin estrictamente anterior, más recientes primero
+            if self.sprints_anteriores > 0:
+                anteriores = self.consultar_paginado(
+                    DB_SPRINTS_ID,
+                    limite=self.sprints_anteriores,
+                    filter={"property": "Fecha Fin", "date": {"before": fecha_fin_actual_prop["date"]["start"]}},
+                    sorts=orden_fecha_fin
+                )
+                for sprint in anteriores:
+                    sprints_relevantes.append(sprint)
+                    nombre_sprint = sprint["properties"]["Nombre"]["title"][0]["text"]["content"]
+                    logger.info(f"✅ Sprint anterior encontrado: {nombre_sprint}")
             
             logger.info(f"📊 Total sprints relevantes: {len(sprints_relevantes)}")
             return sprints_relevantes
@@ -124,126 +123,164 @@ class MonitoringSetupInteligente:
             logger.error(f"Error obteniendo sprints relevantes: {e}")
             return []
     
-    def obtener_tareas_sprints_monitoreados(self, sprints_relevantes):
-        """Obtiene todas las tareas válidas de los sprints monitoreados CON FILTRADO INTELIGENTE"""
-        try:
-            tareas_todas = []
-            estadisticas_filtrado = {
-                "total_consultadas": 0,
-                "tareas_validas": 0,
-                "excluidas_sin_nombre": 0,
-                "excluidas_sin_personas": 0,
-                "excluidas_sin_sprint": 0,
-                "excluidas_multiples_razones": 0
+    def filtro_sprint(self, sprint_id):
+        return {"property": "Sprint", "relation": {"contains": sprint_id}}
+    
+    def consultar_tareas(self, filtro, **params):
+        """Itera páginas de resultados de DB_TAREAS (paginación de 100)"""
+        start_cursor = None
+        while True:
+            query_params = {
+                "database_id": DB_TAREAS_ID,
+                "filter": filtro,
+                "page_size": 100,
+                **params
             }
             
-            for sprint in sprints_relevantes:
-                sprint_id = sprint["id"]
-                nombre_sprint = sprint["properties"]["Nombre"]["title"][0]["text"]["content"]
-                
-                logger.info(f"🔍 Obteniendo tareas del {nombre_sprint}...")
-                
-                # Implementar paginación
-                has_more = True
-                start_cursor = None
-                tareas_sprint_bruto = []
+            if start_cursor:
+                query_params["start_cursor"] = start_cursor
+            
+            response = notion.databases.query(**query_params)
+            logger.debug(f"   📄 Página obtenida: {len(response['results'])} tareas")
+            yield response["results"]
+            
+            if not response.get("has_more", False):
+                return
+            start_cursor = response.get("next_cursor")
+    
+    def iterar_tareas_sprints(self, sprints_relevantes, condicion=None, **params):
+        """Tareas de los sprints relevantes con una sola consulta (or de filtros de relación)
+        
+        condicion: filtro adicional combinado con "and" (p.ej. last_edited_time).
+        Si la consulta compuesta falla, consulta cada sprint en paralelo; una tarea
+        que pertenece a varios sprints se entrega una sola vez
+        """
+        sprint_ids = [sprint["id"] for sprint in sprints_relevantes]
+        vistas = set()
+        
+        def con_condicion(filtro):
+            return filtro if condicion is None else {"and": [filtro, condicion]}
+        
+        try:
+            filtros = [self.filtro_sprint(sprint_id) for sprint_id in sprint_ids]
+            filtro = filtros[0] if len(filtros) == 1 else {"or": filtros}
+            logger.info(f"🔍 Obteniendo tareas de {len(sprint_ids)} sprints en una consulta...")
+            for pagina in self.consultar_tareas(con_condicion(filtro), **params):
+                for tarea in pagina:
+                    vistas.add(tarea["id"])
+                    yield tarea
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Consulta compuesta falló ({e}) - consultando sprints en paralelo")
+        
+        def tareas_de(sprint_id):
+            filtro = con_condicion(self.filtro_sprint(sprint_id))
+            return [tarea for pagina in self.consultar_tareas(filtro, **params) for tarea in pagina]
+        
+        with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_PARALELAS, len(sprint_ids))) as executor:
+            futuros = [executor.submit(tareas_de, sprint_id) for sprint_id in sprint_ids]
+            for futuro in as_completed(futuros):
+                for tarea in futuro.result():
+                    if tarea["id"] not in vistas:
+                        vistas.add(tarea["id"])
+                        yield tarea
+    
+    def obtener_tareas_sprints_monitoreados(self, sprints_relevantes):
+        """Itera las tareas válidas de los sprints monitoreados CON FILTRADO INTELIGENTE
+        
+        Cada tarea se valida al llegar su página; las estadísticas se registran al agotar
+        el iterador. Un error de consulta se propaga para no escribir snapshots parciales
+        """
+        estadisticas_filtrado = {
+            "total_consultadas": 0,
+            "tareas_validas": 0,
+            "excluidas_sin_nombre": 0,
+            "excluidas_sin_personas": 0,
+            "excluidas_sin_sprint": 0,
+            "excluidas_multiples_razones": 0
+        }
+        estadisticas_sprints = {
+            sprint["id"]: {
+                "nombre": sprint["properties"]["Nombre"]["title"][0]["text"]["content"],
+                "consultadas": 0,
+                "validas": 0,
+                "excluidas": 0,
+                "detalles_exclusion": []
+            }
+            for sprint in sprints_relevantes
+        }
+        
+        try:
+            for tarea in self.iterar_tareas_sprints(sprints_relevantes):
+                estadisticas_filtrado["total_consultadas"] += 1
                 
-                while has_more:
-                    query_params = {
-                        "database_id": DB_TAREAS_ID,
-                        "filter": {
-                            "property": "Sprint",
-                            "relation": {
-                                "contains": sprint_id
-                            }
-                        },
-                        "page_size": 100
-                    }
-                    
-                    if start_cursor:
-                        query_params["start_cursor"] = start_cursor
-                    
-                    response = notion.databases.query(**query_params)
-                    tareas_pagina = response["results"]
-                    tareas_sprint_bruto.extend(tareas_pagina)
-                    
-                    has_more = response.get("has_more", False)
-                    start_cursor = response.get("next_cursor")
-                    
-                    logger.debug(f"   📄 Página obtenida: {len(tareas_pagina)} tareas")
+                # Sprints relevantes a los que pertenece (puede ser más de uno)
+                sprints_tarea = [
+                    estadisticas_sprints[sprint_id]
+                    for sprint_id in self.get_property_value(tarea, "Sprint") or []
+                    if sprint_id in estadisticas_sprints
+                ]
+                for estadisticas_sprint in sprints_tarea:
+                    estadisticas_sprint["consultadas"] += 1
                 
-                # ✅ FILTRAR TAREAS VÁLIDAS
-                tareas_sprint_validas = []
-                estadisticas_sprint = {
-                    "consultadas": len(tareas_sprint_bruto),
-                    "validas": 0,
-                    "excluidas": 0,
-                    "detalles_exclusion": []
-                }
+                # Verificar validez de la tarea
+                resultado_validacion = self.validar_tarea_para_monitoreo(tarea)
                 
-                for tarea in tareas_sprint_bruto:
-                    estadisticas_filtrado["total_consultadas"] += 1
-                    
-                    # Verificar validez de la tarea
-                    resultado_validacion = self.validar_tarea_para_monitoreo(tarea)
-                    
-                    if resultado_validacion["es_valida"]:
-                        tareas_sprint_validas.append(tarea)
-                        estadisticas_filtrado["tareas_validas"] += 1
+                if resultado_validacion["es_valida"]:
+                    estadisticas_filtrado["tareas_validas"] += 1
+                    for estadisticas_sprint in sprints_tarea:
                         estadisticas_sprint["validas"] += 1
-                    else:
+                    yield tarea
+                else:
+                    for estadisticas_sprint in sprints_tarea:
                         estadisticas_sprint["excluidas"] += 1
                         estadisticas_sprint["detalles_exclusion"].append(resultado_validacion["razon"])
-                        
-                        # Contabilizar razones específicas
-                        if "sin nombre" in resultado_validacion["razon"].lower():
-                            estadisticas_filtrado["excluidas_sin_nombre"] += 1
-                        if "sin personas" in resultado_validacion["razon"].lower():
-                            estadisticas_filtrado["excluidas_sin_personas"] += 1
-                        if "sin sprint" in resultado_validacion["razon"].lower():
-                            estadisticas_filtrado["excluidas_sin_sprint"] += 1
-                        if "múltiples" in resultado_validacion["razon"].lower():
-                            estadisticas_filtrado["excluidas_multiples_razones"] += 1
-                
-                # Agregar tareas válidas al total
-                tareas_todas.extend(tareas_sprint_validas)
-                
-                # Log detallado por sprint
-                logger.info(f"   📋 Sprint {nombre_sprint}:")
-                logger.info(f"      📥 Consultadas: {estadisticas_sprint['consultadas']}")
-                logger.info(f"      ✅ Válidas: {estadisticas_sprint['validas']}")
-                logger.info(f"      ❌ Excluidas: {estadisticas_sprint['excluidas']}")
-                
-                if estadisticas_sprint["excluidas"] > 0:
-                    razones_agrupadas = {}
-                    for razon in estadisticas_sprint["detalles_exclusion"]:
-                        razones_agrupadas[razon] = razones_agrupadas.get(razon, 0) + 1
                     
-                    for razon, cantidad in razones_agrupadas.items():
-                        logger.info(f"         • {razon}: {cantidad}")
-            
-            # ✅ LOG CONSOLIDADO FINAL
-            logger.info("=" * 50)
-            logger.info("📊 ESTADÍSTICAS DE FILTRADO CONSOLIDADAS")
-            logger.info("=" * 50)
-            logger.info(f"📥 Total tareas consultadas: {estadisticas_filtrado['total_consultadas']}")
-            logger.info(f"✅ Tareas válidas para monitoreo: {estadisticas_filtrado['tareas_validas']}")
-            logger.info(f"❌ Total excluidas: {estadisticas_filtrado['total_consultadas'] - estadisticas_filtrado['tareas_validas']}")
-            logger.info("")
-            logger.info("🔍 DETALLES DE EXCLUSIONES:")
-            logger.info(f"   • Sin nombre: {estadisticas_filtrado['excluidas_sin_nombre']}")
-            logger.info(f"   • Sin personas: {estadisticas_filtrado['excluidas_sin_personas']}")
-            logger.info(f"   • Sin sprint: {estadisticas_filtrado['excluidas_sin_sprint']}")
-            logger.info(f"   • Múltiples razones: {estadisticas_filtrado['excluidas_multiples_razones']}")
-            logger.info("=" * 50)
-            
-            return tareas_todas
-            
+                    # Contabilizar razones específicas
+                    if "sin nombre" in resultado_validacion["razon"].lower():
+                        estadisticas_filtrado["excluidas_sin_nombre"] += 1
+                    if "sin personas" in resultado_validacion["razon"].lower():
+                        estadisticas_filtrado["excluidas_sin_personas"] += 1
+                    if "sin sprint" in resultado_validacion["razon"].lower():
+                        estadisticas_filtrado["excluidas_sin_sprint"] += 1
+                    if "múltiples" in resultado_validacion["razon"].lower():
+                        estadisticas_filtrado["excluidas_multiples_razones"] += 1
+        
         except Exception as e:
             logger.error(f"Error obteniendo tareas: {e}")
             import traceback
             logger.error(traceback.format_exc())
-            return []
+            raise
+        
+        # Log detallado por sprint
+        for estadisticas_sprint in estadisticas_sprints.values():
+            logger.info(f"   📋 Sprint {estadisticas_sprint['nombre']}:")
+            logger.info(f"      📥 Consultadas: {estadisticas_sprint['consultadas']}")
+            logger.info(f"      ✅ Válidas: {estadisticas_sprint['validas']}")
+            logger.info(f"      ❌ Excluidas: {estadisticas_sprint['excluidas']}")
+            
+            if estadisticas_sprint["excluidas"] > 0:
+                razones_agrupadas = {}
+                for razon in estadisticas_sprint["detalles_exclusion"]:
+                    razones_agrupadas[razon] = razones_agrupadas.get(razon, 0) + 1
+                
+                for razon, cantidad in razones_agrupadas.items():
+                    logger.info(f"         • {razon}: {cantidad}")
+        
+        # ✅ LOG CONSOLIDADO FINAL
+        logger.info("=" * 50)
+        logger.info("📊 ESTADÍSTICAS DE FILTRADO CONSOLIDADAS")
+        logger.info("=" * 50)
+        logger.info(f"📥 Total tareas consultadas: {estadisticas_filtrado['total_consultadas']}")
+        logger.info(f"✅ Tareas válidas para monitoreo: {estadisticas_filtrado['tareas_validas']}")
+        logger.info(f"❌ Total excluidas: {estadisticas_filtrado['total_consultadas'] - estadisticas_filtrado['tareas_validas']}")
+        logger.info("")
+        logger.info("🔍 DETALLES DE EXCLUSIONES:")
+        logger.info(f"   • Sin nombre: {estadisticas_filtrado['excluidas_sin_nombre']}")
+        logger.info(f"   • Sin personas: {estadisticas_filtrado['excluidas_sin_personas']}")
+        logger.info(f"   • Sin sprint: {estadisticas_filtrado['excluidas_sin_sprint']}")
+        logger.info(f"   • Múltiples razones: {estadisticas_filtrado['excluidas_multiples_razones']}")
+        logger.info("=" * 50)
 
     def validar_tarea_para_monitoreo(self, tarea):
         """Valida si una tarea debe ser incluida en el monitoreo"""
@@ -317,40 +354,42 @@ class MonitoringSetupInteligente:
         fecha_utc = fecha_colombia.astimezone(timezone.utc)
         return fecha_utc.isoformat().replace('+00:00', 'Z')
     
-    def crear_snapshot_global(self, tareas_monitoreadas):
-        """Crea snapshot global de TODAS las tareas que serán monitoreadas"""
+    def get_marca_agua(self):
+        """Marca de agua UTC para la próxima actualización incremental"""
+        return marca_agua_utc()
+    
+    def crear_snapshot(self, tarea, timestamp):
+        """Snapshot compacto con todas las propiedades monitoreadas"""
+        valores = {propiedad: self.get_property_value(tarea, propiedad) for propiedad in PROPIEDADES_MONITOREADAS}
+        return SnapshotTarea.desde_valores(tarea["id"], valores, timestamp, tarea.get("last_edited_time"))
+    
+    def crear_snapshot_global(self, tareas_monitoreadas, metadatos=None):
+        """Crea snapshot global de TODAS las tareas que serán monitoreadas (iterable, se consume una vez)
+        
+        Cada snapshot se escribe al llegar su página (memoria por página, no por workspace);
+        el archivo anterior solo se reemplaza si la consulta termina sin errores.
+        metadatos: marca de agua y sprints para el modo incremental
+        """
         try:
             logger.info("📸 Creando snapshot global de todas las tareas monitoreadas...")
             
-            snapshots_globales = {}
             timestamp_global = self.get_fecha_actual_gmt5()
             
-            for tarea in tareas_monitoreadas:
-                tarea_id = tarea["id"]
-                nombre_tarea = self.get_property_value(tarea, "Nombre") or "Sin nombre"
+            with EscritorSnapshots(metadatos=metadatos) as escritor:
+                for tarea in tareas_monitoreadas:
+                    snapshot = self.crear_snapshot(tarea, timestamp_global)
+                    escritor.agregar(snapshot)
+                    logger.debug(f"   📸 Snapshot creado: {snapshot.get('nombre_tarea')}")
                 
-                # Crear snapshot completo
-                snapshot = {
-                    "timestamp": timestamp_global,
-                    "last_edited_time": tarea.get("last_edited_time"),
-                    "nombre_tarea": nombre_tarea
-                }
-                
-                # Agregar todas las propiedades monitoreadas
-                for propiedad in PROPIEDADES_MONITOREADAS:
-                    snapshot[propiedad] = self.get_property_value(tarea, propiedad)
-                
-                snapshots_globales[tarea_id] = snapshot
-                logger.debug(f"   📸 Snapshot creado: {nombre_tarea}")
-            
-            # Guardar snapshots globales
-            with open("task_snapshots.json", "w", encoding="utf-8") as f:
-                json.dump(snapshots_globales, f, ensure_ascii=False, indent=2)
+                if escritor.total == 0:
+                    escritor.descartar()
+                    logger.warning("⚠️ No se encontraron tareas para monitorear")
+                    return 0
             
-            logger.info(f"✅ Snapshot global creado: {len(snapshots_globales)} tareas")
+            logger.info(f"✅ Snapshot global creado: {escritor.total} tareas")
             logger.info(f"🕒 Timestamp global: {timestamp_global}")
             
-            return len(snapshots_globales)
+            return escritor.total
             
         except Exception as e:
             logger.error(f"Error creando snapshot global: {e}")
@@ -358,11 +397,114 @@ class MonitoringSetupInteligente:
             logger.error(traceback.format_exc())
             return 0
     
-    def configurar_monitoreo_inteligente(self):
-        """Configura monitoreo completo con snapshot global"""
+    def actualizar_snapshots_incremental(self, sprints_relevantes):
+        """Refresca el snapshot global solo con las tareas editadas desde la marca de agua
+        
+        1. Consulta tareas con last_edited_time >= marca y reemplaza sus snapshots
+        2. Reconciliación de ids (respuesta solo con el título) para detectar tareas
+           eliminadas o movidas fuera de los sprints monitoreados
+        
+        Returns: número de snapshots, o None si hace falta la reconstrucción completa
+        """
+        store = SnapshotStore()
+        if not store.existe_archivo():
+            logger.info("📸 Sin snapshot global previo - reconstrucción completa")
+            return None
+        store.cargar()
+        
+        marca_anterior = store.metadatos.get("marca_agua")
+        sprint_ids = sorted(sprint["id"] for sprint in sprints_relevantes)
+        if not marca_anterior or sorted(store.metadatos.get("sprints", [])) != sprint_ids:
+            logger.info("📸 Snapshot sin marca de agua o sprints monitoreados distintos - reconstrucción completa")
+            return None
+        
+        marca_agua = self.get_marca_agua()
+        timestamp_global = self.get_fecha_actual_gmt5()
+        actualizadas = 0
+        eliminadas = 0
+        
+        logger.info(f"🔄 Actualización incremental desde {marca_anterior}...")
+        condicion = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": marca_anterior}}
+        for tarea in self.iterar_tareas_sprints(sprints_relevantes, condicion):
+            if self.validar_tarea_para_monitoreo(tarea)["es_valida"]:
+                store.guardar(self.crear_snapshot(tarea, timestamp_global))
+                actualizadas += 1
+            elif store.eliminar(tarea["id"]):
+                eliminadas += 1
+        
+        # Ids vigentes: "title" es el id de la propiedad título en toda base de Notion
+        vigentes = {
+            uuid_a_bytes(tarea["id"])
+            for tarea in self.iterar_tareas_sprints(sprints_relevantes, filter_properties=["title"])
+        }
+        for snapshot in list(store.valores()):
+            if snapshot.tarea_id not in vigentes:
+                store.eliminar(snapshot.id_texto)
+                eliminadas += 1
+        
+        escribir_snapshots(store.valores(), metadatos={"marca_agua": marca_agua, "sprints": sprint_ids})
+        
+        logger.info(f"✅ Snapshot incremental: {actualizadas} actualizadas, {eliminadas} eliminadas, "
+                    f"{len(store)} en total")
+        return len(store)
+    
+    def sprints_con_monitoreo_activo(self):
+        """Sprints que hoy tienen "Monitoreo Activo" marcado"""
+        return list(self.consultar_paginado(
+            DB_SPRINTS_ID,
+            filter={"property": "Monitoreo Activo", "checkbox": {"equals": True}}
+        ))
+    
+    def sincronizar_monitoreo_activo(self, sprints_relevantes):
+        """Marca "Monitoreo Activo" solo en los sprints relevantes, escribiendo únicamente los que cambian
+        
+        Returns: número de sprints actualizados
+        """
+        activos = {sprint["id"] for sprint in self.sprints_con_monitoreo_activo()}
+        relevantes = {sprint["id"] for sprint in sprints_relevantes}
+        
+        cambios = [(sprint_id, False) for sprint_id in activos - relevantes]
+        cambios += [(sprint["id"], True) for sprint in sprints_relevantes if sprint["id"] not in activos]
+        
+        logger.info(f"🔄 Monitoreo Activo: {len(cambios)} sprints a actualizar "
+                    f"({len(activos)} activos, {len(relevantes)} relevantes)")
+        
+        def escribir(sprint_id, valor):
+            self.limitador.adquirir()
+            notion.pages.update(
+                page_id=sprint_id,
+                properties={
+                    "Monitoreo Activo": {"checkbox": valor}
+                }
+            )
+        
+        if not cambios:
+            return 0
+        
+        with ThreadPoolExecutor(max_workers=min(MAX_CONSULTAS_PARALELAS, len(cambios))) as executor:
+            futuros = {executor.submit(escribir, sprint_id, valor): valor for sprint_id, valor in cambios}
+            for futuro in as_completed(futuros):
+                try:
+                    futuro.result()
+                except Exception as e:
+                    if futuros[futuro]:
+                        logger.error(f"Error activando monitoreo: {e}")
+                    else:
+                        logger.warning(f"Error desactivando monitoreo: {e}")
+        
+        return len(cambios)
+    
+    def configurar_monitoreo_inteligente(self, incremental=False):
+        """Configura monitoreo completo con snapshot global
+        
+        incremental: refresca solo las tareas editadas desde la última ejecución
+        """
         logger.info("🧠 Configurando monitoreo inteligente con snapshot global...")
         
         try:
+            # Tomada antes de consultar: lo editado durante el setup entra en la próxima ejecución
+            marca_agua = self.get_marca_agua()
+            
             # 1. Obtener sprints relevantes
             sprints_relevantes = self.obtener_sprints_relevantes()
             
@@ -370,63 +512,32 @@ class MonitoringSetupInteligente:
                 logger.error("❌ No se encontraron sprints relevantes")
                 return False
             
-            # 2. Desactivar monitoreo en TODOS los sprints
-            response = notion.databases.query(database_id=DB_SPRINTS_ID)
-            todos_sprints = response["results"]
-            
-            logger.info(f"🔄 Desactivando monitoreo en {len(todos_sprints)} sprints...")
-            
-            for sprint in todos_sprints:
-                try:
-                    notion.pages.update(
-                        page_id=sprint["id"],
-                        properties={
-                            "Monitoreo Activo": {"checkbox": False}
-                        }
-                    )
-                except Exception as e:
-                    logger.warning(f"Error desactivando monitoreo: {e}")
-            
-            # 3. Activar monitoreo solo en sprints relevantes
-            logger.info(f"✅ Activando monitoreo en {len(sprints_relevantes)} sprints relevantes...")
+            # 2-3. "Monitoreo Activo" solo en los sprints relevantes (escribe únicamente diferencias)
+            self.sincronizar_monitoreo_activo(sprints_relevantes)
             
             for sprint in sprints_relevantes:
-                try:
-                    notion.pages.update(
-                        page_id=sprint["id"],
-                        properties={
-                            "Monitoreo Activo": {"checkbox": True}
-                        }
-                    )
-                    
-                    nombre = sprint["properties"]["Nombre"]["title"][0]["text"]["content"]
-                    
-                    # Determinar tipo
-                    es_actual_prop = sprint["properties"].get("Es Actual", {})
-                    es_actual_value = False
-                    
-                    if "formula" in es_actual_prop and es_actual_prop["formula"]:
-                        if "boolean" in es_actual_prop["formula"]:
-                            es_actual_value = es_actual_prop["formula"]["boolean"]
-                    
-                    tipo = "ACTUAL" if es_actual_value else "ANTERIOR"
-                    logger.info(f"  ✅ {nombre} ({tipo})")
-                    
-                except Exception as e:
-                    logger.error(f"Error activando monitoreo: {e}")
-            
-            # 4. ✅ NUEVO: Obtener todas las tareas de sprints monitoreados
-            tareas_monitoreadas = self.obtener_tareas_sprints_monitoreados(sprints_relevantes)
-            
-            if not tareas_monitoreadas:
-                logger.warning("⚠️ No se encontraron tareas para monitorear")
-                return False
+                nombre = sprint["properties"]["Nombre"]["title"][0]["text"]["content"]
+                
+                # Determinar tipo
+                es_actual_prop = sprint["properties"].get("Es Actual", {})
+                es_actual_value = False
+                
+                if "formula" in es_actual_prop and es_actual_prop["formula"]:
+                    if "boolean" in es_actual_prop["formula"]:
+                        es_actual_value = es_actual_prop["formula"]["boolean"]
+                
+                tipo = "ACTUAL" if es_actual_value else "ANTERIOR"
+                logger.info(f"  ✅ {nombre} ({tipo})")
             
-            # 5. ✅ NUEVO: Crear snapshot global
-            total_snapshots = self.crear_snapshot_global(tareas_monitoreadas)
+            # 4-5. Tareas de sprints monitoreados → validación → snapshot global, página a página
+            total_snapshots = self.actualizar_snapshots_incremental(sprints_relevantes) if incremental else None
+            if total_snapshots is None:
+                tareas_monitoreadas = self.obtener_tareas_sprints_monitoreados(sprints_relevantes)
+                metadatos = {"marca_agua": marca_agua, "sprints": sorted(sprint["id"] for sprint in sprints_relevantes)}
+                total_snapshots = self.crear_snapshot_global(tareas_monitoreadas, metadatos)
             
             if total_snapshots == 0:
-                logger.error("❌ Error creando snapshots globales")
+                logger.error("❌ No se crearon snapshots globales")
                 return False
             
             logger.info("=" * 60)
@@ -447,9 +558,16 @@ class MonitoringSetupInteligente:
 
 def main():
     """Función principal"""
-    setup = MonitoringSetupInteligente()
+    parser = argparse.ArgumentParser(description="Configura sprints monitoreados y snapshot global")
+    parser.add_argument("--sprints-anteriores", type=int, default=SPRINTS_ANTERIORES,
+                        help="Sprints anteriores al actual que se monitorean")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Actualiza solo las tareas editadas desde la última ejecución")
+    args = parser.parse_args()
+    
+    setup = MonitoringSetupInteligente(sprints_anteriores=args.sprints_anteriores)
     
-    if setup.configurar_monitoreo_inteligente():
+    if setup.configurar_monitoreo_inteligente(incremental=args.incremental):
         logger.info("🎉 Sistema configurado exitosamente")
         exit(0)
     else:
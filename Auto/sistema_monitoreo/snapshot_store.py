@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+Snapshot Store - REGISTROS COMPACTOS DE TAREAS MONITOREADAS
+Registros con __slots__, valores enum internados y UUIDs de 16 bytes.
+En disco (v3): línea de cabecera + una línea JSON por tarea, escrita en streaming
+a un temporal que reemplaza al archivo; se puede leer una tarea sin parsear el resto
+"""
+
+import os
+import sys
+import json
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone, timedelta
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_SNAPSHOTS = "task_snapshots.json"
+# v3: una línea por tarea [id_hex, *registro]; v2: documento único {"tareas": {id_hex: registro}}
+VERSION_FORMATO = 3
+VERSION_DOCUMENTO = 2
+
+# Orden posicional de cada registro serializado
+CAMPOS_REGISTRO = [
+    "timestamp",
+    "last_edited_time",
+    "Nombre",
+    "Personas",
+    "Prioridad",
+    "Tamaño",
+    "Estado"
+]
+
+
+def uuid_a_bytes(valor):
+    """Convierte UUID de Notion (con o sin guiones) a 16 bytes"""
+    return uuid.UUID(valor).bytes
+
+
+def bytes_a_uuid(valor):
+    """Convierte 16 bytes al formato con guiones que usa Notion"""
+    return str(uuid.UUID(bytes=valor))
+
+
+def iso_a_epoch(valor):
+    """Convierte timestamp ISO (sufijo Z) a segundos epoch"""
+    if not valor:
+        return None
+    return datetime.fromisoformat(valor.replace('Z', '+00:00')).timestamp()
+
+
+def epoch_a_iso(valor):
+    """Convierte segundos epoch al formato ISO UTC que usa Notion"""
+    if valor is None:
+        return None
+    fecha = datetime.fromtimestamp(valor, timezone.utc)
+    return fecha.isoformat(timespec="milliseconds").replace('+00:00', 'Z')
+
+
+def marca_agua_utc():
+    """Marca de agua para consultas por last_edited_time (formato ISO de Notion)
+
+    last_edited_time de Notion se redondea al minuto: se retrocede un minuto para
+    no perder ediciones hechas durante la misma consulta. historico_sprints.py
+    (sistema_analitica) tiene una copia: cambiar ambas
+    """
+    marca = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=1)
+    return marca.isoformat(timespec="milliseconds").replace('+00:00', 'Z')
+
+
+def _internar(valor):
+    """Interna valores enum (Estado, Prioridad, Tamaño): una sola copia por valor"""
+    return sys.intern(valor) if isinstance(valor, str) else valor
+
+
+class SnapshotTarea:
+    """Snapshot compacto de una tarea - acceso compatible con el dict anterior"""
+
+    __slots__ = (
+        "tarea_id",
+        "timestamp",
+        "last_edited_time",
+        "nombre",
+        "personas",
+        "prioridad",
+        "tamano",
+        "estado"
+    )
+
+    def __init__(self, tarea_id, timestamp=None, last_edited_time=None, nombre=None,
+                 personas=None, prioridad=None, tamano=None, estado=None):
+        self.tarea_id = tarea_id            # 16 bytes
+        self.timestamp = timestamp          # epoch float
+        self.last_edited_time = last_edited_time  # epoch float
+        self.nombre = nombre
+        self.personas = personas            # bytes concatenados (16 por persona) o None
+        self.prioridad = _internar(prioridad)
+        self.tamano = _internar(tamano)
+        self.estado = _internar(estado)
+
+    @classmethod
+    def desde_valores(cls, tarea_id, valores, timestamp, last_edited_time):
+        """Crea snapshot desde los valores de PROPIEDADES_MONITOREADAS"""
+        snapshot = cls(uuid_a_bytes(tarea_id))
+        snapshot.actualizar(valores, timestamp, last_edited_time)
+        return snapshot
+
+    def actualizar(self, valores, timestamp, last_edited_time):
+        """Reemplaza valores monitoreados y metadatos"""
+        personas = valores.get("Personas")
+        self.timestamp = iso_a_epoch(timestamp)
+        self.last_edited_time = iso_a_epoch(last_edited_time)
+        self.nombre = valores.get("Nombre")
+        self.personas = None if personas is None else b"".join(uuid_a_bytes(p) for p in personas)
+        self.prioridad = _internar(valores.get("Prioridad"))
+        self.tamano = _internar(valores.get("Tamaño"))
+        self.estado = _internar(valores.get("Estado"))
+
+    @property
+    def id_texto(self):
+        return bytes_a_uuid(self.tarea_id)
+
+    def lista_personas(self):
+        """Personas como lista de UUIDs en texto (igual que get_property_value)"""
+        if self.personas is None:
+            return None
+        return [bytes_a_uuid(self.personas[i:i + 16]) for i in range(0, len(self.personas), 16)]
+
+    def get(self, clave, default=None):
+        """Acceso por clave con los mismos nombres del snapshot en dict"""
+        if clave == "timestamp":
+            valor = epoch_a_iso(self.timestamp)
+        elif clave == "last_edited_time":
+            valor = epoch_a_iso(self.last_edited_time)
+        elif clave == "nombre_tarea":
+            valor = self.nombre or "Sin nombre"
+        elif clave == "Nombre":
+            valor = self.nombre
+        elif clave == "Personas":
+            valor = self.lista_personas()
+        elif clave == "Prioridad":
+            valor = self.prioridad
+        elif clave == "Tamaño":
+            valor = self.tamano
+        elif clave == "Estado":
+            valor = self.estado
+        else:
+            return default
+        return default if valor is None else valor
+
+    def __getitem__(self, clave):
+        return self.get(clave)
+
+    def a_registro(self):
+        """Serializa a lista posicional (ver CAMPOS_REGISTRO)"""
+        return [
+            self.timestamp,
+            self.last_edited_time,
+            self.nombre,
+            None if self.personas is None else self.personas.hex(),
+            self.prioridad,
+            self.tamano,
+            self.estado
+        ]
+
+    @classmethod
+    def desde_registro(cls, tarea_id_hex, registro):
+        """Reconstruye snapshot desde registro posicional"""
+        timestamp, last_edited_time, nombre, personas, prioridad, tamano, estado = registro
+        return cls(
+            bytes.fromhex(tarea_id_hex),
+            timestamp,
+            last_edited_time,
+            nombre,
+            None if personas is None else bytes.fromhex(personas),
+            prioridad,
+            tamano,
+            estado
+        )
+
+    @classmethod
+    def desde_dict(cls, tarea_id, snapshot):
+        """Reconstruye snapshot desde el formato dict anterior (v1)"""
+        return cls.desde_valores(
+            tarea_id,
+            snapshot,
+            snapshot.get("timestamp"),
+            snapshot.get("last_edited_time")
+        )
+
+
+class SnapshotStore:
+    """Almacén en memoria de snapshots con persistencia compacta en disco"""
+
+    def __init__(self, ruta=ARCHIVO_SNAPSHOTS):
+        self.ruta = ruta
+        self._snapshots = {}
+        # (mtime_ns, tamaño) del archivo cuando se leyó o escribió por última vez
+        self._firma = None
+        # Cambios locales aún no escritos: tarea_id → snapshot (None = eliminado)
+        self._cambios = {}
+        # Datos de setup_monitoring (marca de agua, sprints) que se conservan al persistir
+        self.metadatos = {}
+        # Los workers por shard comparten el almacén
+        self._lock = threading.RLock()
+        # Limpio mientras una carga en segundo plano está en curso
+        self._cargado = threading.Event()
+        self._cargado.set()
+
+    def existe_archivo(self):
+        return os.path.exists(self.ruta)
+
+    def cargar(self):
+        """Carga snapshots desde disco (acepta formato v1, v2 y v3)"""
+        with self._lock:
+            return self._cargar()
+
+    def cargar_en_segundo_plano(self):
+        """Carga en un thread; las operaciones esperan a que termine (arranque en caliente)"""
+        self._cargado.clear()
+
+        def cargar():
+            try:
+                total = self.cargar()
+                logger.info(f"📸 Snapshots globales cargados en segundo plano: {total} tareas")
+            except Exception as e:
+                logger.error(f"Error cargando snapshots: {e}")
+            finally:
+                self._cargado.set()
+
+        threading.Thread(target=cargar, name="carga-snapshots", daemon=True).start()
+
+    @property
+    def listo(self):
+        return self._cargado.is_set()
+
+    def esperar_carga(self, timeout=None):
+        return self._cargado.wait(timeout)
+
+    def _firma_archivo(self):
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return estado.st_mtime_ns, estado.st_size
+
+    def _cargar(self):
+        """Lee el archivo y vuelve a aplicar encima los cambios locales pendientes"""
+        firma = self._firma_archivo()
+        if firma is None:
+            self._snapshots = {}
+            self.metadatos = {}
+        else:
+            metadatos, registros = leer_snapshots(self.ruta)
+            self._snapshots = {snapshot.tarea_id: snapshot for snapshot in registros}
+            self.metadatos = metadatos
+        self._firma = firma
+        self._aplicar_cambios()
+        return len(self._snapshots)
+
+    def _aplicar_cambios(self):
+        """Cambios locales sobre lo leído; si el archivo trae una versión más reciente
+        de la tarea (p.ej. setup_monitoring), gana la del archivo
+        """
+        for tarea_id, snapshot in list(self._cambios.items()):
+            en_disco = self._snapshots.get(tarea_id)
+            if snapshot is None:
+                self._snapshots.pop(tarea_id, None)
+            elif en_disco is not None and (en_disco.last_edited_time or 0) > (snapshot.last_edited_time or 0):
+                del self._cambios[tarea_id]
+            else:
+                self._snapshots[tarea_id] = snapshot
+
+    @property
+    def modificado(self):
+        """Hay cambios locales sin escribir"""
+        return bool(self._cambios)
+
+    def archivo_cambio(self):
+        """Otro proceso (p.ej. setup_monitoring) reescribió el archivo desde la última lectura"""
+        return self._firma_archivo() != self._firma
+
+    def recargar_si_cambio(self):
+        """Recarga si otro proceso (p.ej. setup_monitoring) reescribió el archivo"""
+        with self._lock:
+            if self.existe_archivo() and self.archivo_cambio():
+                total = self._cargar()
+                logger.info(f"📸 Snapshots recargados desde disco: {total} tareas")
+
+    def obtener(self, tarea_id):
+        self._cargado.wait()
+        self.recargar_si_cambio()
+        return self._snapshots.get(uuid_a_bytes(tarea_id))
+
+    def guardar(self, snapshot):
+        self._cargado.wait()
+        with self._lock:
+            self._snapshots[snapshot.tarea_id] = snapshot
+            self._cambios[snapshot.tarea_id] = snapshot
+
+    def actualizar(self, tarea_id, valores, timestamp, last_edited_time):
+        """Actualiza un snapshot existente (sin exponer registros a medio escribir)"""
+        self._cargado.wait()
+        with self._lock:
+            snapshot = self._snapshots.get(uuid_a_bytes(tarea_id))
+            if not snapshot:
+                return False
+            snapshot.actualizar(valores, timestamp, last_edited_time)
+            self._cambios[snapshot.tarea_id] = snapshot
+            return True
+
+    def eliminar(self, tarea_id):
+        self._cargado.wait()
+        with self._lock:
+            clave = uuid_a_bytes(tarea_id)
+            if self._snapshots.pop(clave, None) is None:
+                return False
+            self._cambios[clave] = None
+            return True
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def __contains__(self, tarea_id):
+        return uuid_a_bytes(tarea_id) in self._snapshots
+
+    def valores(self):
+        return self._snapshots.values()
+
+    def persistir(self):
+        """Escribe los snapshots en disco solo si hay cambios locales
+
+        Si el archivo cambió desde la última lectura, primero se recarga (conserva las
+        tareas y los metadatos nuevos) y se aplican encima solo los cambios locales.
+        Returns: True si escribió
+        """
+        self._cargado.wait()
+        with self._lock:
+            if not self._cambios:
+                return False
+            if self.archivo_cambio():
+                self._cargar()
+                logger.info("📸 Archivo de snapshots reescrito por otro proceso: se fusionan los cambios locales")
+            escribir_snapshots(self._snapshots.values(), self.ruta, self.metadatos)
+            self._firma = self._firma_archivo()
+            self._cambios.clear()
+            return True
+
+    def persistir_si_vigente(self):
+        """Apagado: escribe solo si hay cambios locales y el archivo sigue siendo el que se leyó
+
+        Si setup_monitoring lo reescribió mientras el servidor corría, sus snapshots y su
+        marca de agua quedan intactos; lo editado después lo recupera el reconciliador
+        Returns: True si escribió
+        """
+        self._cargado.wait()
+        with self._lock:
+            if not self._cambios:
+                return False
+            if self.archivo_cambio():
+                logger.warning(f"📸 Archivo de snapshots reescrito por otro proceso: se descartan "
+                               f"{len(self._cambios)} cambios locales al apagar")
+                return False
+            return self.persistir()
+
+
+def extraer_metadatos(datos):
+    """Claves de la cabecera que no son parte del formato (p.ej. marca_agua, sprints)"""
+    return {clave: valor for clave, valor in datos.items() if clave not in ("version", "campos", "tareas")}
+
+
+def _linea(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class EscritorSnapshots:
+    """Escritura en streaming (memoria constante): un registro por línea en un temporal
+    que reemplaza al archivo al confirmar; los lectores ven el anterior o el nuevo completo
+    """
+
+    def __init__(self, ruta=ARCHIVO_SNAPSHOTS, metadatos=None):
+        self.ruta = ruta
+        self.temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.total = 0
+        self._archivo = open(self.temporal, "w", encoding="utf-8")
+        self._archivo.write(_linea({"version": VERSION_FORMATO, "campos": CAMPOS_REGISTRO, **(metadatos or {})}))
+
+    def agregar(self, snapshot):
+        self._archivo.write(_linea([snapshot.tarea_id.hex(), *snapshot.a_registro()]))
+        self.total += 1
+
+    def confirmar(self):
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        os.replace(self.temporal, self.ruta)
+
+    def descartar(self):
+        if not self._archivo.closed:
+            self._archivo.close()
+        if os.path.exists(self.temporal):
+            os.remove(self.temporal)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        # Un error a mitad de escritura deja intacto el archivo anterior
+        if not self._archivo.closed:
+            if tipo is None:
+                self.confirmar()
+            else:
+                self.descartar()
+        return False
+
+
+class LectorSnapshots:
+    """Lectura perezosa de un archivo v3
+    
+    El índice id → offset se arma leyendo solo el prefijo de cada línea (sin parsear
+    JSON); obtener() parsea únicamente la línea pedida
+    """
+
+    def __init__(self, ruta=ARCHIVO_SNAPSHOTS):
+        self.ruta = ruta
+        self._indice = None
+        with open(ruta, "rb") as f:
+            cabecera = json.loads(f.readline())
+            self._inicio = f.tell()
+        if cabecera.get("version") != VERSION_FORMATO:
+            raise ValueError(f"{ruta} no está en formato v{VERSION_FORMATO}")
+        self.metadatos = extraer_metadatos(cabecera)
+
+    def _indexar(self):
+        if self._indice is None:
+            indice = {}
+            with open(self.ruta, "rb") as f:
+                f.seek(self._inicio)
+                offset = self._inicio
+                for linea in f:
+                    # Cada línea empieza con ["<32 hex>",
+                    indice[bytes.fromhex(linea[2:34].decode("ascii"))] = offset
+                    offset += len(linea)
+            self._indice = indice
+        return self._indice
+
+    def obtener(self, tarea_id):
+        offset = self._indexar().get(uuid_a_bytes(tarea_id))
+        if offset is None:
+            return None
+        with open(self.ruta, "rb") as f:
+            f.seek(offset)
+            tarea_id_hex, *registro = json.loads(f.readline())
+        return SnapshotTarea.desde_registro(tarea_id_hex, registro)
+
+    def __contains__(self, tarea_id):
+        return uuid_a_bytes(tarea_id) in self._indexar()
+
+    def __len__(self):
+        return len(self._indexar())
+
+    def __iter__(self):
+        """Recorre todos los registros en streaming"""
+        with open(self.ruta, "r", encoding="utf-8") as f:
+            f.readline()
+            for linea in f:
+                tarea_id_hex, *registro = json.loads(linea)
+                yield SnapshotTarea.desde_registro(tarea_id_hex, registro)
+
+
+def leer_snapshots(ruta=ARCHIVO_SNAPSHOTS):
+    """(metadatos, iterador de SnapshotTarea) para cualquier versión del archivo"""
+    with open(ruta, "r", encoding="utf-8") as f:
+        primera = f.readline()
+    try:
+        datos = json.loads(primera)
+    except ValueError:
+        # v1 con indentación: la primera línea no es un documento completo
+        with open(ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+
+    if datos.get("version") == VERSION_FORMATO:
+        lector = LectorSnapshots(ruta)
+        return lector.metadatos, iter(lector)
+    if datos.get("version") == VERSION_DOCUMENTO:
+        registros = (SnapshotTarea.desde_registro(h, registro) for h, registro in datos["tareas"].items())
+        return extraer_metadatos(datos), registros
+    # Formato v1: {tarea_id: {propiedad: valor}}
+    return {}, (SnapshotTarea.desde_dict(tarea_id, valores) for tarea_id, valores in datos.items())
+
+
+def escribir_snapshots(snapshots, ruta=ARCHIVO_SNAPSHOTS, metadatos=None):
+    """Serializa snapshots (iterable, se consume una vez) en formato v3 con reemplazo atómico"""
+    with EscritorSnapshots(ruta, metadatos) as escritor:
+        for snapshot in snapshots:
+            escritor.agregar(snapshot)
+    return escritor.total
@@ -11,9 +11,16 @@ from notion_client import Client
 from dotenv import load_dotenv
 import json
 import time
+import threading
+from snapshot_store import SnapshotStore, SnapshotTarea, iso_a_epoch
+from estado_compartido import BaseCompartida, MapaCompartido, SnapshotStoreCompartido
+from metricas import instrumentar_cliente_notion, registrar_consulta_cache
+from trazas import trazar
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Líneas por propiedad (alto volumen): muestreadas por logging_config en el servidor
+logger_detalle = logging.getLogger(__name__ + ".detalle")
 
 load_dotenv()
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
@@ -22,9 +29,14 @@ DB_SPRINTS_ID = os.getenv("DB_SPRINTS_ID")
 DB_LOG_MODIFICACIONES_ID = os.getenv("DB_LOG_MODIFICACIONES_ID")
 DB_PERSONAS_ID = os.getenv("DB_PERSONAS_ID")
 
-notion = Client(auth=NOTION_TOKEN)
+notion = instrumentar_cliente_notion(Client(auth=NOTION_TOKEN))
 
 DIAS_BLOQUEO = 4
+# Segundos en los que un segundo webhook de la misma tarea se considera duplicado
+VENTANA_DUPLICADOS = 2
+# Archivo de arranque en caliente (caches guardados al apagar) y antigüedad máxima aceptada
+ARCHIVO_ESTADO_ARRANQUE = "monitor_estado.json"
+MAX_EDAD_ESTADO_ARRANQUE = 24 * 3600
 
 # Campos monitoreados optimizados
 PROPIEDADES_MONITOREADAS = [
@@ -35,36 +47,122 @@ PROPIEDADES_MONITOREADAS = [
     "Estado"       # Estado (siempre permitido pero se registra)
 ]
 
+# Campos cuyo cambio puede revertirse en período bloqueado (Estado solo se registra)
+PROPIEDADES_BLOQUEABLES = ["Nombre", "Personas", "Prioridad", "Tamaño"]
+
 class TaskMonitorReactivo:
     """Monitor reactivo de tareas - VERSIÓN 100% FUNCIONAL"""
     
     def __init__(self):
         self.cache_usuarios = {}
         self.cache_nombres_personas = {}
+        # Esquema de DB_TAREAS: id de propiedad (como llega en updated_properties) → nombre
+        self.esquema_propiedades = {}
         self.zona_horaria = timezone(timedelta(hours=-5))
         # Sistema anti-bucle mejorado
         self.cambios_sistema_timestamps = {}
         self.webhooks_en_espera = {}
+        self.ventana_duplicados = VENTANA_DUPLICADOS
         # ✅ NUEVO: Cache de última actividad por usuario para eliminaciones
         self.ultima_actividad_usuarios = {}
+        self.lock_actividad = threading.Lock()
+        # Snapshots compactos residentes en memoria
+        self.snapshots = SnapshotStore()
+        # Hook del servidor para diferir trabajo de fondo: callable(funcion, *args); None = síncrono
+        self.ejecutar_en_fondo = None
+        self.persistencia_programada = False
+        self.lock_persistencia = threading.Lock()
+    
+    def usar_estado_compartido(self, ruta):
+        """Despliegue multiproceso: snapshots y marcas anti-bucle en una base SQLite compartida"""
+        base = BaseCompartida(ruta)
+        self.snapshots = SnapshotStoreCompartido(base)
+        self.cambios_sistema_timestamps = MapaCompartido(base, "cambios_sistema")
+        self.webhooks_en_espera = MapaCompartido(base, "webhooks_en_espera")
+        self.ultima_actividad_usuarios = MapaCompartido(base, "actividad_usuarios")
+        logger.info(f"🗄️ Estado compartido entre procesos: {ruta}")
         
-    def inicializar(self):
-        """Inicializa el monitor"""
+    def inicializar(self, ruta_estado=None):
+        """Inicializa el monitor
+        
+        Con ruta_estado válida (arranque en caliente): caches desde archivo, revalidación
+        en segundo plano y snapshots cargados en paralelo al arranque del servidor
+        """
         logger.info("🔧 Inicializando monitor reactivo...")
-        self.cargar_cache_usuarios()
-        self.cargar_cache_nombres_personas()
+        en_caliente = bool(ruta_estado) and self.cargar_estado_arranque(ruta_estado)
+        
+        if en_caliente:
+            threading.Thread(target=self.revalidar_caches, name="revalidar-caches", daemon=True).start()
+        else:
+            self.cargar_cache_usuarios()
+            self.cargar_cache_nombres_personas()
+            self.cargar_esquema_propiedades()
         
         # Verificar snapshots globales
-        if not os.path.exists("task_snapshots.json"):
+        if not self.snapshots.existe_archivo():
             logger.warning("⚠️ No se encontraron snapshots globales")
             logger.warning("   Ejecuta 'python setup_monitoring.py' primero")
+        elif en_caliente:
+            self.snapshots.cargar_en_segundo_plano()
         else:
-            with open("task_snapshots.json", "r", encoding="utf-8") as f:
-                snapshots = json.load(f)
-                logger.info(f"📸 Snapshots globales cargados: {len(snapshots)} tareas")
+            total = self.snapshots.cargar()
+            logger.info(f"📸 Snapshots globales cargados: {total} tareas")
         
         logger.info("✅ Monitor reactivo inicializado")
     
+    def guardar_estado_arranque(self, ruta=ARCHIVO_ESTADO_ARRANQUE):
+        """Guarda caches (usuarios, personas, esquema) para el próximo arranque"""
+        try:
+            estado = {
+                "version": 1,
+                "guardado_en": time.time(),
+                "usuarios": self.cache_usuarios,
+                "personas": self.cache_nombres_personas,
+                "esquema": self.esquema_propiedades
+            }
+            # Con varios procesos worker cada uno escribe su temporal
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(estado, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temporal, ruta)
+            logger.info(f"💾 Estado de arranque guardado: {ruta}")
+            
+        except Exception as e:
+            logger.error(f"Error guardando estado de arranque: {e}")
+    
+    def cargar_estado_arranque(self, ruta=ARCHIVO_ESTADO_ARRANQUE):
+        """Carga caches del último apagado; False si no existe, es viejo o inválido"""
+        try:
+            if not os.path.exists(ruta):
+                return False
+            
+            with open(ruta, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+            
+            edad = time.time() - estado.get("guardado_en", 0)
+            if estado.get("version") != 1 or edad > MAX_EDAD_ESTADO_ARRANQUE:
+                logger.info(f"⏭️ Estado de arranque descartado (antigüedad: {edad:.0f}s)")
+                return False
+            
+            self.cache_usuarios.update(estado["usuarios"])
+            self.cache_nombres_personas.update(estado["personas"])
+            self.esquema_propiedades.update(estado["esquema"])
+            
+            logger.info(f"⚡ Arranque en caliente: {len(self.cache_usuarios)} usuarios, "
+                        f"{len(self.cache_nombres_personas)} personas (guardado hace {edad:.0f}s)")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error cargando estado de arranque: {e}")
+            return False
+    
+    def revalidar_caches(self):
+        """Refresca en segundo plano los caches cargados del estado de arranque"""
+        self.cargar_cache_usuarios()
+        self.cargar_cache_nombres_personas()
+        self.cargar_esquema_propiedades()
+        logger.info("🔄 Caches revalidados contra Notion")
+    
     def cargar_cache_usuarios(self):
         """Carga cache de usuarios reales desde base de Personas"""
         try:
@@ -105,6 +203,94 @@ class TaskMonitorReactivo:
         except Exception as e:
             logger.error(f"Error cargando cache nombres personas: {e}")
     
+    def cargar_esquema_propiedades(self):
+        """Carga mapa id → nombre de las propiedades de la base de Tareas"""
+        try:
+            database = notion.databases.retrieve(database_id=DB_TAREAS_ID)
+            
+            for nombre, propiedad in database.get("properties", {}).items():
+                self.esquema_propiedades[propiedad["id"]] = nombre
+            
+            logger.info(f"Esquema de tareas cargado: {len(self.esquema_propiedades)} propiedades")
+            
+        except Exception as e:
+            logger.error(f"Error cargando esquema de propiedades: {e}")
+    
+    def nombres_propiedades(self, ids_propiedades):
+        """Nombres de las propiedades cambiadas; None si alguna no está en el esquema"""
+        if not ids_propiedades or not self.esquema_propiedades:
+            return None
+        
+        nombres = [self.esquema_propiedades.get(id_propiedad) for id_propiedad in ids_propiedades]
+        if None in nombres:
+            return None  # Propiedad desconocida (esquema desactualizado): tratar como relevante
+        
+        return nombres
+    
+    def toca_propiedades_monitoreadas(self, ids_propiedades):
+        """True/False si los ids cambiados incluyen campos monitoreados; None si no se puede saber"""
+        nombres = self.nombres_propiedades(ids_propiedades)
+        if nombres is None:
+            return None
+        
+        return any(nombre in PROPIEDADES_MONITOREADAS for nombre in nombres)
+    
+    def puede_requerir_reversion(self, page_id, ids_propiedades):
+        """Estimación sin llamadas a Notion de si el cambio podría revertirse
+        
+        True: toca campos bloqueables de una tarea con snapshot (sprint monitoreado) no imprevista
+        False: solo Estado o campos no monitoreados, o tarea imprevista (todo permitido)
+        None: no se puede saber (esquema desconocido o tarea sin snapshot)
+        """
+        nombres = self.nombres_propiedades(ids_propiedades)
+        if nombres is None:
+            return None
+        
+        if not any(nombre in PROPIEDADES_BLOQUEABLES for nombre in nombres):
+            return False
+        
+        if not self.snapshots.listo:
+            return None  # Carga en segundo plano: no bloquear el hilo del request
+        
+        snapshot = self.snapshots.obtener(page_id)
+        if snapshot is None:
+            return None
+        
+        # Cambiar Prioridad de una imprevista también puede ser un intento de evasión
+        if "Prioridad" not in nombres and (snapshot.get("Prioridad", "") or "").lower() == "imprevista":
+            return False
+        
+        return True
+    
+    def en_segundo_plano(self, funcion, *args):
+        """Ejecuta en la prioridad de fondo del servidor, o en línea si no hay planificador"""
+        if self.ejecutar_en_fondo is None:
+            return funcion(*args)
+        self.ejecutar_en_fondo(funcion, *args)
+    
+    def programar_persistencia_snapshots(self):
+        """Agenda una sola escritura de snapshots para todos los cambios acumulados"""
+        if self.ejecutar_en_fondo is None:
+            self.snapshots.persistir()
+            return
+        
+        with self.lock_persistencia:
+            if self.persistencia_programada:
+                return
+            self.persistencia_programada = True
+        self.ejecutar_en_fondo(self.persistir_snapshots)
+    
+    def persistir_snapshots(self):
+        """Escribe los snapshots en disco (trabajo de fondo)"""
+        with self.lock_persistencia:
+            self.persistencia_programada = False
+        try:
+            self.snapshots.persistir()
+            logger.debug(f"💾 Snapshots persistidos: {len(self.snapshots)} tareas")
+        except Exception as e:
+            logger.error(f"Error persistiendo snapshots: {e}")
+    
+    @trazar("obtener_tarea_actual")
     def obtener_tarea_actual(self, page_id):
         """Obtiene datos actuales de una tarea específica"""
         try:
@@ -114,6 +300,7 @@ class TaskMonitorReactivo:
             logger.error(f"Error obteniendo tarea {page_id}: {e}")
             return None
     
+    @trazar("verificar_si_sprint_monitoreable")
     def verificar_si_sprint_monitoreable(self, tarea):
         """Verifica si la tarea pertenece a un sprint monitoreable"""
         try:
@@ -170,12 +357,15 @@ class TaskMonitorReactivo:
         logger.debug(f"🏷️ Marcado cambio del sistema: {tarea_id[:8]} @ {timestamp_actual}")
     
     def detectar_webhook_duplicado(self, tarea_id):
-        """Detecta webhooks duplicados/agrupados"""
+        """Detecta webhooks duplicados/agrupados (desactivado si ventana_duplicados = 0)"""
+        if self.ventana_duplicados <= 0:
+            return False
+        
         timestamp_actual = time.time()
         
         if tarea_id in self.webhooks_en_espera:
             diferencia = timestamp_actual - self.webhooks_en_espera[tarea_id]
-            if diferencia < 2:
+            if diferencia < self.ventana_duplicados:
                 logger.debug(f"⏭️ Webhook posiblemente duplicado ignorado (diferencia: {diferencia:.2f}s)")
                 return True
         
@@ -185,19 +375,20 @@ class TaskMonitorReactivo:
     def registrar_actividad_usuario(self, usuario_id, usuario_nombre):
         """✅ NUEVO: Registra última actividad de usuario para eliminaciones"""
         timestamp_actual = time.time()
-        self.ultima_actividad_usuarios[usuario_id] = {
-            "timestamp": timestamp_actual,
-            "nombre": usuario_nombre
-        }
-        
-        # Limpiar registros antiguos (más de 5 minutos)
-        usuarios_a_eliminar = []
-        for uid, data in self.ultima_actividad_usuarios.items():
-            if timestamp_actual - data["timestamp"] > 300:  # 5 minutos
-                usuarios_a_eliminar.append(uid)
-        
-        for uid in usuarios_a_eliminar:
-            del self.ultima_actividad_usuarios[uid]
+        with self.lock_actividad:
+            self.ultima_actividad_usuarios[usuario_id] = {
+                "timestamp": timestamp_actual,
+                "nombre": usuario_nombre
+            }
+            
+            # Limpiar registros antiguos (más de 5 minutos)
+            usuarios_a_eliminar = []
+            for uid, data in self.ultima_actividad_usuarios.items():
+                if timestamp_actual - data["timestamp"] > 300:  # 5 minutos
+                    usuarios_a_eliminar.append(uid)
+            
+            for uid in usuarios_a_eliminar:
+                del self.ultima_actividad_usuarios[uid]
     
     def obtener_usuario_probable_eliminacion(self):
         """✅ NUEVO: Intenta obtener usuario que probablemente eliminó la tarea"""
@@ -210,7 +401,10 @@ class TaskMonitorReactivo:
             usuario_mas_reciente = None
             timestamp_mas_reciente = 0
             
-            for user_id, data in self.ultima_actividad_usuarios.items():
+            with self.lock_actividad:
+                actividad = list(self.ultima_actividad_usuarios.values())
+            
+            for data in actividad:
                 diferencia = timestamp_actual - data["timestamp"]
                 if diferencia < 30 and data["timestamp"] > timestamp_mas_reciente:  # Últimos 30 segundos
                     timestamp_mas_reciente = data["timestamp"]
@@ -225,7 +419,7 @@ class TaskMonitorReactivo:
     def procesar_tarea_modificada(self, page_id, evento):
         """Procesa una tarea que fue modificada - DETECCIÓN SECUENCIAL CORREGIDA"""
         try:
-            logger.info(f"🔍 Analizando tarea modificada: {page_id[:8]}...")
+            logger.info("🔍 Analizando tarea modificada: %.8s...", page_id)
             
             # Filtrar webhooks duplicados/agrupados
             if self.detectar_webhook_duplicado(page_id):
@@ -269,22 +463,26 @@ class TaskMonitorReactivo:
                 valor_anterior = snapshot_anterior.get(propiedad)
                 
                 if valor_actual != valor_anterior:
-                    logger.info(f"🔄 Cambio detectado en {propiedad}: {valor_anterior} → {valor_actual}")
+                    logger_detalle.info("🔄 Cambio detectado en %s: %s → %s", propiedad, valor_anterior, valor_actual,
+                                        extra={"page_id": page_id, "propiedad": propiedad})
                     cambios_detectados.append(propiedad)
                     
                     # EVALUAR CAMBIO INMEDIATAMENTE
                     resultado = self.procesar_cambio_propiedad(tarea, propiedad, valor_anterior, valor_actual)
                     cambios_procesados[propiedad] = resultado
-                    logger.info(f"   ✅ Resultado: {resultado}")
+                    logger_detalle.info("   ✅ Resultado: %s", resultado,
+                                        extra={"page_id": page_id, "propiedad": propiedad, "resultado": resultado})
             
             if not cambios_detectados:
                 logger.debug("No hay cambios en propiedades monitoreadas")
+                self.avanzar_snapshot(page_id, tarea)
                 return "sin_cambios_monitoreados"
             
             # 5. ACTUALIZAR SNAPSHOT INMEDIATO Y CORRECTAMENTE
             self.actualizar_snapshot_inmediato(page_id, cambios_procesados)
             
-            logger.info(f"✅ Procesamiento completado. Cambios en: {cambios_detectados}")
+            logger.info("✅ Procesamiento completado. Cambios en: %s", cambios_detectados,
+                        extra={"page_id": page_id, "cambios": cambios_procesados})
             return f"procesado_{len(cambios_detectados)}_cambios"
             
         except Exception as e:
@@ -296,7 +494,7 @@ class TaskMonitorReactivo:
     def procesar_tarea_nueva(self, page_id, evento):
         """Procesa una tarea nueva creada"""
         try:
-            logger.info(f"🆕 Analizando tarea nueva: {page_id[:8]}...")
+            logger.info("🆕 Analizando tarea nueva: %.8s...", page_id)
             
             # 1. Obtener tarea
             tarea = self.obtener_tarea_actual(page_id)
@@ -313,9 +511,8 @@ class TaskMonitorReactivo:
             prioridad = self.get_property_value(tarea, "Prioridad") or ""
             nombre_tarea = self.get_property_value(tarea, "Nombre") or "Sin nombre"
             
-            logger.info(f"📋 Tarea nueva: {nombre_tarea}")
-            logger.info(f"   Días transcurridos: {dias_transcurridos}")
-            logger.info(f"   Prioridad inicial: {prioridad}")
+            logger.info("📋 Tarea nueva: %s | Días transcurridos: %s | Prioridad inicial: %s",
+                        nombre_tarea, dias_transcurridos, prioridad, extra={"page_id": page_id})
             
             if dias_transcurridos > DIAS_BLOQUEO and prioridad.lower() != "imprevista":
                 logger.warning(f"⚠️ Tarea nueva post-bloqueo detectada - convirtiendo a imprevista")
@@ -419,6 +616,7 @@ class TaskMonitorReactivo:
             logger.error(f"Error procesando tarea eliminada: {e}")
             return "error_procesamiento_eliminacion"
     
+    @trazar("procesar_cambio_propiedad")
     def procesar_cambio_propiedad(self, tarea, propiedad, valor_anterior, valor_actual):
         """Procesa cambio en una propiedad específica - FIX BUG IMPREVISTA"""
         try:
@@ -428,12 +626,11 @@ class TaskMonitorReactivo:
             prioridad_actual = self.get_property_value(tarea, "Prioridad") or ""
             prioridad_anterior = valor_anterior if propiedad == "Prioridad" else prioridad_actual
             
-            logger.info(f"📋 Analizando cambio:")
-            logger.info(f"   Tarea: {nombre_tarea}")
-            logger.info(f"   Propiedad: {propiedad}")
-            logger.info(f"   Valor: {valor_anterior} → {valor_actual}")
-            logger.info(f"   Días transcurridos: {dias_transcurridos}")
-            logger.info(f"   Prioridad actual: {prioridad_actual}")
+            logger_detalle.info(
+                "📋 Analizando cambio: %s | %s: %s → %s | Días transcurridos: %s | Prioridad actual: %s",
+                nombre_tarea, propiedad, valor_anterior, valor_actual, dias_transcurridos, prioridad_actual,
+                extra={"page_id": tarea_id, "propiedad": propiedad, "dias_transcurridos": dias_transcurridos}
+            )
             
             # Valores mejorados para logs (especialmente Personas)
             valor_anterior_log = self.formatear_valor_para_log(propiedad, valor_anterior)
@@ -470,7 +667,7 @@ class TaskMonitorReactivo:
                     cambio["registrar_log"] = True
                 elif valor_anterior and valor_anterior.lower() == "imprevista":
                     # Tarea que YA ERA imprevista - permitir cambios normales  
-                    logger.info("   ✅ PERMITIDO: Tarea que ya era imprevista")
+                    logger_detalle.info("   ✅ PERMITIDO: Tarea que ya era imprevista")
                     cambio["accion"] = "PERMITIDO_IMPREVISTA_ANTERIOR"
                     cambio["registrar_log"] = True
                 else:
@@ -489,7 +686,7 @@ class TaskMonitorReactivo:
                     cambio["accion"] = "REVERTIR"
                     cambio["registrar_log"] = True
                 else:
-                    logger.info("   ✅ PERMITIDO: Cambio normal en responsables")
+                    logger_detalle.info("   ✅ PERMITIDO: Cambio normal en responsables")
                     cambio["accion"] = "PERMITIDO_PERSONAS"
                     cambio["registrar_log"] = True
                     
@@ -497,19 +694,19 @@ class TaskMonitorReactivo:
                 # Tarea con prioridad imprevista actual: TODO permitido
                 cambio["accion"] = "PERMITIDO_IMPREVISTA"
                 cambio["registrar_log"] = dias_bloqueados
-                logger.info("   ✅ PERMITIDO: Tarea imprevista")
+                logger_detalle.info("   ✅ PERMITIDO: Tarea imprevista")
                 
             elif es_estado:
                 # Estado: SIEMPRE permitido
                 cambio["accion"] = "PERMITIDO_ESTADO"
                 cambio["registrar_log"] = dias_bloqueados
-                logger.info("   ✅ PERMITIDO: Cambio de estado")
+                logger_detalle.info("   ✅ PERMITIDO: Cambio de estado")
                 
             elif not dias_bloqueados:
                 # Dentro del período libre
                 cambio["accion"] = "PERMITIDO_DIAS"
                 cambio["registrar_log"] = False
-                logger.info("   ✅ PERMITIDO: Dentro de período libre")
+                logger_detalle.info("   ✅ PERMITIDO: Dentro de período libre")
                 
             else:
                 # BLOQUEAR: Fuera de período + no es excepción
@@ -536,11 +733,11 @@ class TaskMonitorReactivo:
                     return "error_reversion"
                     
             elif cambio["registrar_log"]:
-                logger.info("📝 Registrando cambio permitido en log...")
+                logger_detalle.info("📝 Registrando cambio permitido en log...")
                 self.registrar_en_log(cambio, "Permitido")
                 return "permitido_y_registrado"
             else:
-                logger.info("   ✅ Cambio permitido (no requiere log)")
+                logger_detalle.info("   ✅ Cambio permitido (no requiere log)")
                 return "permitido"
             
         except Exception as e:
@@ -556,7 +753,9 @@ class TaskMonitorReactivo:
                 
                 nombres = []
                 for persona_id in valor:
-                    if persona_id in self.cache_nombres_personas:
+                    acierto = persona_id in self.cache_nombres_personas
+                    registrar_consulta_cache("personas", acierto)
+                    if acierto:
                         nombres.append(self.cache_nombres_personas[persona_id])
                     else:
                         nombres.append(f"ID:{persona_id[:8]}")
@@ -612,7 +811,9 @@ class TaskMonitorReactivo:
                 user_info = tarea["last_edited_by"]
                 user_id = user_info.get("id")
                 
-                if user_id in self.cache_usuarios:
+                acierto = user_id in self.cache_usuarios
+                registrar_consulta_cache("usuarios", acierto)
+                if acierto:
                     return self.cache_usuarios[user_id]
                 
                 if "name" in user_info and user_info["name"]:
@@ -639,27 +840,24 @@ class TaskMonitorReactivo:
         fecha_utc = fecha_colombia.astimezone(timezone.utc)
         return fecha_utc.isoformat().replace('+00:00', 'Z')
     
+    @trazar("cargar_snapshot_anterior")
     def cargar_snapshot_anterior(self, tarea_id):
         """Carga snapshot anterior de una tarea desde snapshot global"""
         try:
-            if os.path.exists("task_snapshots.json"):
-                with open("task_snapshots.json", "r", encoding="utf-8") as f:
-                    snapshots = json.load(f)
-                return snapshots.get(tarea_id)
-            return None
+            return self.snapshots.obtener(tarea_id)
         except Exception:
             return None
     
+    def valores_monitoreados(self, tarea):
+        """Extrae valores actuales de PROPIEDADES_MONITOREADAS"""
+        return {propiedad: self.get_property_value(tarea, propiedad) for propiedad in PROPIEDADES_MONITOREADAS}
+    
+    @trazar("actualizar_snapshot_inmediato")
     def actualizar_snapshot_inmediato(self, tarea_id, cambios_procesados):
         """Actualiza snapshot inmediatamente y correctamente"""
         try:
-            if not os.path.exists("task_snapshots.json"):
-                return
-            
-            with open("task_snapshots.json", "r", encoding="utf-8") as f:
-                snapshots = json.load(f)
-            
-            if tarea_id not in snapshots:
+            snapshot = self.snapshots.obtener(tarea_id)
+            if not snapshot:
                 return
             
             # Obtener tarea actual después del procesamiento
@@ -668,69 +866,68 @@ class TaskMonitorReactivo:
                 return
             
             # Actualizar snapshot con estado real actual
-            for propiedad in PROPIEDADES_MONITOREADAS:
-                valor_real_actual = self.get_property_value(tarea_actual, propiedad)
-                snapshots[tarea_id][propiedad] = valor_real_actual
-            
-            # Actualizar timestamp y metadatos
-            snapshots[tarea_id]["timestamp"] = self.get_fecha_actual_gmt5()
-            snapshots[tarea_id]["last_edited_time"] = tarea_actual.get("last_edited_time")
-            snapshots[tarea_id]["nombre_tarea"] = self.get_property_value(tarea_actual, "Nombre") or "Sin nombre"
-            
-            with open("task_snapshots.json", "w", encoding="utf-8") as f:
-                json.dump(snapshots, f, ensure_ascii=False, indent=2)
+            self.snapshots.actualizar(
+                tarea_id,
+                self.valores_monitoreados(tarea_actual),
+                self.get_fecha_actual_gmt5(),
+                tarea_actual.get("last_edited_time")
+            )
+            self.programar_persistencia_snapshots()
                 
             logger.debug(f"📸 Snapshot actualizado inmediatamente para {tarea_id[:8]}")
                 
         except Exception as e:
             logger.error(f"Error actualizando snapshot inmediato: {e}")
     
+    def avanzar_snapshot(self, tarea_id, tarea):
+        """Sin cambios monitoreados: el snapshot alcanza el last_edited_time de la página
+
+        Si no, el reconciliador la vería desfasada en cada barrido (y tras cada reinicio)
+        """
+        try:
+            snapshot = self.snapshots.obtener(tarea_id)
+            if not snapshot or (iso_a_epoch(tarea.get("last_edited_time")) or 0) <= (snapshot.last_edited_time or 0):
+                return
+            self.snapshots.actualizar(
+                tarea_id,
+                self.valores_monitoreados(tarea),
+                self.get_fecha_actual_gmt5(),
+                tarea.get("last_edited_time")
+            )
+            self.programar_persistencia_snapshots()
+        except Exception as e:
+            logger.error(f"Error avanzando snapshot: {e}")
+    
+    @trazar("crear_snapshot_tarea_nueva")
     def crear_snapshot_tarea_nueva(self, tarea_id, tarea):
         """Crea snapshot para tarea nueva"""
         try:
-            if not os.path.exists("task_snapshots.json"):
-                snapshots = {}
-            else:
-                with open("task_snapshots.json", "r", encoding="utf-8") as f:
-                    snapshots = json.load(f)
-            
-            snapshot = {
-                "timestamp": self.get_fecha_actual_gmt5(),
-                "last_edited_time": tarea.get("last_edited_time"),
-                "nombre_tarea": self.get_property_value(tarea, "Nombre") or "Sin nombre"
-            }
-            
-            for propiedad in PROPIEDADES_MONITOREADAS:
-                snapshot[propiedad] = self.get_property_value(tarea, propiedad)
-            
-            snapshots[tarea_id] = snapshot
-            
-            with open("task_snapshots.json", "w", encoding="utf-8") as f:
-                json.dump(snapshots, f, ensure_ascii=False, indent=2)
+            snapshot = SnapshotTarea.desde_valores(
+                tarea_id,
+                self.valores_monitoreados(tarea),
+                self.get_fecha_actual_gmt5(),
+                tarea.get("last_edited_time")
+            )
+            self.snapshots.recargar_si_cambio()
+            self.snapshots.guardar(snapshot)
+            self.programar_persistencia_snapshots()
                 
         except Exception as e:
             logger.error(f"Error creando snapshot tarea nueva: {e}")
     
+    @trazar("eliminar_snapshot")
     def eliminar_snapshot(self, tarea_id):
         """Elimina snapshot de tarea eliminada"""
         try:
-            if not os.path.exists("task_snapshots.json"):
-                return
-            
-            with open("task_snapshots.json", "r", encoding="utf-8") as f:
-                snapshots = json.load(f)
-            
-            if tarea_id in snapshots:
-                del snapshots[tarea_id]
-                
-                with open("task_snapshots.json", "w", encoding="utf-8") as f:
-                    json.dump(snapshots, f, ensure_ascii=False, indent=2)
-                
+            self.snapshots.recargar_si_cambio()
+            if self.snapshots.eliminar(tarea_id):
+                self.programar_persistencia_snapshots()
                 logger.debug(f"🗑️ Snapshot eliminado para {tarea_id[:8]}")
                 
         except Exception as e:
             logger.error(f"Error eliminando snapshot: {e}")
     
+    @trazar("revertir_cambio_directo")
     def revertir_cambio_directo(self, tarea_id, propiedad, valor_anterior):
         """Revierte cambio sin webhooks adicionales"""
         try:
@@ -776,6 +973,7 @@ class TaskMonitorReactivo:
             logger.error(f"Error revirtiendo: {e}")
             return False
     
+    @trazar("incrementar_contador_violaciones_directo")
     def incrementar_contador_violaciones_directo(self, tarea_id):
         """Incrementa contador de violaciones directamente"""
         try:
@@ -796,6 +994,7 @@ class TaskMonitorReactivo:
         except Exception as e:
             logger.error(f"Error incrementando contador: {e}")
     
+    @trazar("registrar_en_log")
     def registrar_en_log(self, cambio, accion_tomada):
         """Registra en tabla Log Modificaciones"""
         try:
@@ -830,6 +1029,15 @@ class TaskMonitorReactivo:
                 "Detalle": {"rich_text": [{"text": {"content": f"Tarea: {cambio['tarea_nombre']} | Campo: {cambio['propiedad']} | Días: {cambio['dias_transcurridos']} | Usuario: {cambio['usuario']} | Prioridad: {cambio['prioridad']}"}}]}
             }
             
+            # La fecha queda fijada ahora; la escritura en Notion va en prioridad de fondo
+            self.en_segundo_plano(self.crear_entrada_log, properties, tipo_modificacion, accion_tomada)
+            
+        except Exception as e:
+            logger.error(f"Error registrando en log: {e}")
+    
+    def crear_entrada_log(self, properties, tipo_modificacion, accion_tomada):
+        """Crea la página en Log Modificaciones"""
+        try:
             notion.pages.create(
                 parent={"database_id": DB_LOG_MODIFICACIONES_ID},
                 properties=properties
@@ -840,6 +1048,7 @@ class TaskMonitorReactivo:
         except Exception as e:
             logger.error(f"Error registrando en log: {e}")
     
+    @trazar("convertir_a_imprevista")
     def convertir_a_imprevista(self, tarea):
         """Convierte tarea nueva a prioridad Imprevista"""
         try:
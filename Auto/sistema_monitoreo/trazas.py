@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Trazas por Etapa - DÓNDE SE VA EL TIEMPO DE CADA EVENTO
+Una traza por evento procesado (thread-local en el worker) con un span por etapa:
+cola, lectura de la tarea, sprint, snapshot, reversión, contador y log.
+Se conservan las N más lentas (/debug/traces) y opcionalmente se exportan en JSONL
+"""
+
+import json
+import time
+import heapq
+import queue
+import logging
+import threading
+import functools
+import itertools
+
+from metricas import REGISTRO
+
+logger = logging.getLogger(__name__)
+
+# Trazas más lentas conservadas en memoria
+CAPACIDAD_TRAZAS = 50
+
+ETAPA_SEGUNDOS = REGISTRO.histograma(
+    "monitor_etapa_segundos", "Duración de cada etapa del procesamiento de un evento", ("etapa",)
+)
+
+_actual = threading.local()
+
+
+class Traza:
+    """Spans de un evento: (etapa, inicio relativo, duración, profundidad) en milisegundos"""
+
+    __slots__ = ("page_id", "evento_id", "tipo", "inicio", "_inicio_perf", "_profundidad", "spans", "total_ms",
+                 "resultado")
+
+    def __init__(self, page_id, evento_id=None, tipo=None):
+        self.page_id = page_id
+        self.evento_id = evento_id
+        self.tipo = tipo
+        self.inicio = time.time()
+        self._inicio_perf = time.perf_counter()
+        self._profundidad = 0
+        self.spans = []
+        self.total_ms = None
+        self.resultado = None
+
+    def agregar(self, etapa, inicio_perf, duracion, profundidad=0):
+        self.spans.append((etapa, round((inicio_perf - self._inicio_perf) * 1000, 3),
+                           round(duracion * 1000, 3), profundidad))
+        ETAPA_SEGUNDOS.observar(duracion, etapa)
+
+    def a_dict(self):
+        return {
+            "page_id": self.page_id,
+            "evento_id": self.evento_id,
+            "tipo": self.tipo,
+            "inicio": self.inicio,
+            "total_ms": self.total_ms,
+            "resultado": self.resultado,
+            "etapas": [
+                {"etapa": etapa, "inicio_ms": inicio, "duracion_ms": duracion, "profundidad": profundidad}
+                for etapa, inicio, duracion, profundidad in self.spans
+            ]
+        }
+
+
+class RegistroTrazas:
+    """Las N trazas más lentas (min-heap por duración) + exportación JSONL en segundo plano"""
+
+    def __init__(self, capacidad=CAPACIDAD_TRAZAS):
+        self.capacidad = capacidad
+        self._lentas = []  # (total_ms, desempate, traza)
+        self._desempate = itertools.count()
+        self._lock = threading.Lock()
+        self._cola_exportacion = None
+        self.trazas_registradas = 0
+
+    def exportar_a(self, ruta):
+        """Agrega cada traza terminada a un archivo JSONL (escritura en un hilo aparte)"""
+        archivo = open(ruta, "a", encoding="utf-8")
+        self._cola_exportacion = queue.SimpleQueue()
+        threading.Thread(target=self._bucle_exportacion, args=(archivo,), name="exportar-trazas", daemon=True).start()
+        logger.info(f"🧵 Exportación de trazas activa: {ruta}")
+
+    def _bucle_exportacion(self, archivo):
+        while True:
+            traza = self._cola_exportacion.get()
+            archivo.write(json.dumps(traza.a_dict(), ensure_ascii=False, separators=(",", ":")) + "\n")
+            # Ráfaga: un solo flush cuando la cola queda vacía
+            if self._cola_exportacion.empty():
+                archivo.flush()
+
+    def registrar(self, traza):
+        with self._lock:
+            self.trazas_registradas += 1
+            entrada = (traza.total_ms, next(self._desempate), traza)
+            if len(self._lentas) < self.capacidad:
+                heapq.heappush(self._lentas, entrada)
+            elif traza.total_ms > self._lentas[0][0]:
+                heapq.heapreplace(self._lentas, entrada)
+        if self._cola_exportacion is not None:
+            self._cola_exportacion.put(traza)
+
+    def mas_lentas(self, limite=None):
+        with self._lock:
+            trazas = [traza for _, _, traza in sorted(self._lentas, reverse=True)]
+        return [traza.a_dict() for traza in trazas[:limite]]
+
+
+REGISTRO_TRAZAS = RegistroTrazas()
+
+
+def iniciar_traza(page_id, evento_id=None, tipo=None, espera_cola=None):
+    """Abre la traza del evento en el hilo actual (espera_cola: segundos en la queue)"""
+    traza = Traza(page_id, evento_id, tipo)
+    if espera_cola is not None:
+        # La traza empieza al encolar: el total incluye la espera
+        traza.inicio -= espera_cola
+        traza._inicio_perf -= espera_cola
+        traza.agregar("cola", traza._inicio_perf, espera_cola)
+    _actual.traza = traza
+    return traza
+
+
+def finalizar_traza(resultado=None):
+    """Cierra la traza del hilo actual y la registra"""
+    traza = getattr(_actual, "traza", None)
+    if traza is None:
+        return None
+    _actual.traza = None
+    traza.total_ms = round((time.perf_counter() - traza._inicio_perf) * 1000, 3)
+    traza.resultado = resultado
+    REGISTRO_TRAZAS.registrar(traza)
+    return traza
+
+
+class _Span:
+    __slots__ = ("etapa", "traza", "inicio")
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.traza = getattr(_actual, "traza", None)
+        if self.traza is not None:
+            self.traza._profundidad += 1
+            self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.traza is not None:
+            self.traza._profundidad -= 1
+            self.traza.agregar(self.etapa, self.inicio, time.perf_counter() - self.inicio, self.traza._profundidad)
+        return False
+
+
+def etapa(nombre):
+    """Span de una etapa; sin traza activa (p.ej. setup o trabajo de fondo) no registra nada"""
+    return _Span(nombre)
+
+
+def trazar(nombre):
+    """Decorador: la función completa es un span de la traza activa"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if getattr(_actual, "traza", None) is None:
+                return funcion(*args, **kwargs)
+            with _Span(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
@@ -5,47 +5,334 @@ Includes: Detección de eliminación + Logging mejorado + Anti-duplicados
 """
 
 import os
+import sys
+import atexit
+import signal
 import logging
 import json
 import hmac
 import hashlib
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from dotenv import load_dotenv
 from task_monitor import TaskMonitorReactivo
+from cola_durable import ColaDurable
+from idempotencia import IndiceIdempotencia
+from metricas import REGISTRO
+from captura_webhooks import CapturaWebhooks, HEADER_FIRMA
+from logging_config import configurar_logging, detener_logging
+from trazas import REGISTRO_TRAZAS, iniciar_traza, finalizar_traza
+from reconciliador import Reconciliador, INTERVALO_RECONCILIACION, ORIGEN_RECONCILIACION
+from planificador import (
+    ColaPrioridad, TrabajoFondo, NOMBRES_PRIORIDAD,
+    PRIORIDAD_ALTA, PRIORIDAD_NORMAL, PRIORIDAD_BAJA, PRIORIDAD_FONDO
+)
 import threading
-from queue import Queue
+import itertools
+from queue import Empty
+from collections import deque, OrderedDict
 import time
+import zlib
 
-# Configuración de logging mejorada
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("webhook_server.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Logging no bloqueante: JSON a archivo + texto a consola desde un hilo listener
+configurar_logging("webhook_server.log")
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
 NOTION_TOKEN = os.getenv("NOTION_TOKEN")
 DB_TAREAS_ID = os.getenv("DB_TAREAS_ID")
+# Número de shards (= workers): eventos de una misma página siempre van al mismo shard
+WEBHOOK_SHARDS = int(os.getenv("WEBHOOK_SHARDS", 4))
+# Muestras de latencia encolado→desencolado conservadas para percentiles
+MUESTRAS_LATENCIA = 10000
+# Ventana (s) para fusionar page.properties_updated de una misma página (0 = desactivado)
+VENTANA_COALESCENCIA = float(os.getenv("WEBHOOK_VENTANA_COALESCENCIA", 1.0))
+# Cola durable en disco (vacío = solo memoria, eventos se pierden al reiniciar)
+WEBHOOK_COLA_DURABLE = os.getenv("WEBHOOK_COLA_DURABLE", "webhook_eventos.db")
+# Máximo que el endpoint espera al commit agrupado antes de pedir reintento
+TIMEOUT_PERSISTENCIA = 5
+# Eventos en cola a partir de los cuales se descarta/rechaza (0 = sin límite)
+WEBHOOK_MAX_COLA = int(os.getenv("WEBHOOK_MAX_COLA", 1000))
+# Segundos sugeridos a Notion en Retry-After cuando la cola está saturada
+WEBHOOK_RETRY_AFTER = int(os.getenv("WEBHOOK_RETRY_AFTER", 30))
+# Índice persistido de ids de evento ya aceptados (vacío = solo LRU en memoria)
+WEBHOOK_IDEMPOTENCIA = os.getenv("WEBHOOK_IDEMPOTENCIA", "webhook_idempotencia.db")
+# Caches del monitor guardados al apagar para el próximo arranque (vacío = arranque en frío)
+WEBHOOK_ESTADO_ARRANQUE = os.getenv("WEBHOOK_ESTADO_ARRANQUE", "monitor_estado.json")
+# Segundos máximos para drenar la cola al recibir SIGTERM (lo que quede se reproduce al arrancar)
+WEBHOOK_TIMEOUT_DRENADO = float(os.getenv("WEBHOOK_TIMEOUT_DRENADO", 25))
+# Despliegue: "unico" (ingesta + workers en un proceso), "ingesta" (procesos gunicorn que solo
+# persisten en la cola compartida) o "worker" (procesos worker_shards.py dueños de shards)
+WEBHOOK_MODO = os.getenv("WEBHOOK_MODO", "unico")
+# Base SQLite con snapshots y marcas anti-bucle compartidas entre procesos (modos ingesta/worker)
+WEBHOOK_ESTADO_COMPARTIDO = os.getenv("WEBHOOK_ESTADO_COMPARTIDO", "monitor_compartido.db")
+# Segundos entre lecturas de la cola compartida cuando un worker no encontró eventos nuevos
+INTERVALO_SONDEO = 0.2
+# Segundos que la ingesta reutiliza el conteo de pendientes de la cola compartida
+TTL_CONTEO_COMPARTIDO = 1.0
+# Archivo JSONL donde exportar cada traza por etapa (vacío = solo las más lentas en /debug/traces)
+WEBHOOK_TRAZAS = os.getenv("WEBHOOK_TRAZAS", "")
+# Archivo .jsonl.gz donde capturar cada payload recibido para replay (vacío = sin captura)
+WEBHOOK_CAPTURA = os.getenv("WEBHOOK_CAPTURA", "")
+
+# Sentinel de apagado: un worker que lo recibe termina limpiamente
+FIN_WORKER = object()
 
 app = Flask(__name__)
 
-# Queue para procesar eventos de forma asíncrona
-event_queue = Queue()
 monitor = TaskMonitorReactivo()
+captura = None
+reconciliador = None
+MULTIPROCESO = WEBHOOK_MODO != "unico"
+if MULTIPROCESO:
+    monitor.usar_estado_compartido(WEBHOOK_ESTADO_COMPARTIDO)
+idempotencia = IndiceIdempotencia(WEBHOOK_IDEMPOTENCIA, compartido=MULTIPROCESO)
+
+# Métricas expuestas en /metrics
+INGESTA = REGISTRO.contador(
+    "webhook_ingesta_total", "Webhooks recibidos por tipo de evento y código HTTP", ("tipo", "codigo")
+)
+PROCESAMIENTO_SEGUNDOS = REGISTRO.histograma(
+    "webhook_procesamiento_segundos", "Tiempo de procesamiento por tipo de evento", ("tipo",)
+)
+RESULTADOS_MONITOR = REGISTRO.contador(
+    "monitor_resultados_total", "Resultados devueltos por el monitor", ("tipo", "resultado")
+)
 
 class WebhookProcessor:
-    """Procesador de eventos de webhook - CON SOPORTE CASO 4"""
+    """Procesador de eventos de webhook - CON SOPORTE CASO 4 + SHARDS POR PÁGINA"""
     
-    def __init__(self):
+    def __init__(self, num_shards=WEBHOOK_SHARDS, ventana_coalescencia=VENTANA_COALESCENCIA, max_cola=WEBHOOK_MAX_COLA,
+                 modo=WEBHOOK_MODO):
+        self.modo = modo
         self.processing = True
+        self.aceptando = True  # False durante el apagado: la ingesta responde 503
         self.eventos_procesados = 0
         self.eventos_ignorados = 0
         self.eventos_duplicados = 0  # ✅ NUEVO: Tracking de duplicados
+        self.eventos_coalescidos = 0
+        self.eventos_reentregados = 0  # Reentregas de Notion (mismo id de evento)
+        self.ventana_coalescencia = ventana_coalescencia
+        # Ingesta acotada: descartes por motivo y rechazos 503
+        self.max_cola = max_cola
+        self.eventos_descartados = {"no_monitoreado": 0, "duplicado": 0}
+        self.eventos_rechazados = 0
+        self.actualizaciones_en_cola = {}  # page_id → properties_updated encolados
+        self.reconciliaciones_en_cola = 0  # eventos sintéticos del reconciliador en cola
+        # Una cola por shard: orden estricto por página, paralelismo entre páginas;
+        # dentro del shard, lo que puede requerir reversión va antes que lo que solo se registra
+        self.num_shards = max(1, num_shards)
+        self.colas_shard = [ColaPrioridad() for _ in range(self.num_shards)]
+        self.turno_trabajos = itertools.count()
+        self.workers = []
+        self.cola_durable = None
+        # Modo worker: lector de la cola compartida y último id leído de sus shards
+        self.consumidor = None
+        self.ultimo_id_leido = 0
+        self.conteo_compartido = (0, 0.0)  # (pendientes, monotonic de la consulta)
+        self.lock_contadores = threading.Lock()
+        # Latencia de cola por evento (segundos), ventana deslizante
+        self.latencias_cola = deque(maxlen=MUESTRAS_LATENCIA)
+    
+    def incrementar(self, contador):
+        """Incrementa contador de estadísticas de forma thread-safe"""
+        with self.lock_contadores:
+            setattr(self, contador, getattr(self, contador) + 1)
+    
+    def shard_de(self, page_id):
+        """Shard estable para una página (crc32, igual entre procesos)"""
+        return zlib.crc32(page_id.replace("-", "").encode()) % self.num_shards
+    
+    def iniciar_cola_durable(self, ruta=WEBHOOK_COLA_DURABLE):
+        """Abre la cola durable y reencola los eventos que quedaron sin procesar"""
+        if not ruta:
+            logger.warning("⚠️ Cola durable desactivada: eventos en memoria se pierden al reiniciar")
+            return 0
+        
+        # Multiproceso: la ingesta no reproduce, los workers leen sus shards con consumir_cola_compartida
+        self.cola_durable = ColaDurable(ruta, compartida=self.modo != "unico")
+        pendientes = self.cola_durable.iniciar(reproducir=self.modo == "unico")
+        for evento in pendientes:
+            self.encolar_evento(evento)
+        
+        logger.info(f"💾 Cola durable activa: {ruta}")
+        return len(pendientes)
+    
+    def admitir_evento(self, evento):
+        """Decide si un evento entra cuando la cola está llena (descarta lo de menor valor primero)"""
+        if self.max_cola <= 0 or self.eventos_pendientes() < self.max_cola:
+            return "admitido"
+        
+        if evento.get("type") == "page.properties_updated":
+            # Solo cambian campos no monitoreados: no hay nada que revertir ni registrar
+            if monitor.toca_propiedades_monitoreadas(evento.get("properties")) is False:
+                return "no_monitoreado"
+            
+            # Ya hay una actualización encolada de la página: su diff completo cubrirá este cambio.
+            # Solo en modo único: en la cola compartida una fila sigue hasta el ack, también
+            # cuando el worker ya leyó la página, y descartar perdería el cambio
+            if self.modo == "unico" and self.actualizaciones_en_cola.get(evento["page_id"], 0) > 0:
+                return "duplicado"
+        
+        return "saturado"
+    
+    def aceptar_evento(self, evento):
+        """Admite, persiste (commit agrupado) y encola el evento
+        
+        Returns: "encolado", "descartado", "saturado" o "error_persistencia"
+        """
+        decision = self.admitir_evento(evento)
+        
+        if decision == "saturado":
+            self.incrementar("eventos_rechazados")
+            logger.warning(f"🚦 Cola saturada ({self.eventos_pendientes()} eventos) - respondiendo 503")
+            return "saturado"
+        
+        if decision != "admitido":
+            with self.lock_contadores:
+                self.eventos_descartados[decision] += 1
+            logger.debug(f"🚦 Evento descartado por saturación: {decision}")
+            return "descartado"
+        
+        if self.cola_durable:
+            lote = self.cola_durable.agregar(evento, self.shard_de(evento["page_id"]))
+            if not lote.esperar(TIMEOUT_PERSISTENCIA):
+                logger.error("❌ Evento no persistido en cola durable")
+                return "error_persistencia"
+        
+        # Proceso de ingesta: el worker dueño del shard lo leerá de la cola compartida
+        if self.modo == "ingesta":
+            return "encolado"
+        
+        self.encolar_evento(evento)
+        return "encolado"
+    
+    def confirmar_evento(self, evento):
+        """Ack en la cola durable (incluye eventos fusionados)"""
+        if self.cola_durable:
+            self.cola_durable.confirmar(evento.get("_ids_durables", []))
+    
+    def prioridad_evento(self, evento):
+        """Nivel de prioridad según la probabilidad de que el evento requiera reversión"""
+        event_type = evento.get("type")
+        
+        # Eliminación de planificada y creación post-bloqueo: la ventana de reacción importa
+        if event_type in ("page.deleted", "page.created"):
+            return PRIORIDAD_ALTA if evento.get("origen") != ORIGEN_RECONCILIACION else PRIORIDAD_BAJA
+        
+        # Reconciliación: nunca por delante del tráfico en vivo
+        if evento.get("origen") == ORIGEN_RECONCILIACION:
+            return PRIORIDAD_BAJA
+        
+        requiere = monitor.puede_requerir_reversion(evento["page_id"], evento.get("properties"))
+        if requiere is None:
+            return PRIORIDAD_NORMAL
+        return PRIORIDAD_ALTA if requiere else PRIORIDAD_BAJA
+    
+    def encolar_evento(self, evento):
+        """Dispatcher: envía el evento a la cola del shard de su página con su prioridad"""
+        evento["_encolado_en"] = time.monotonic()
+        page_id = evento["page_id"]
+        if evento.get("type") == "page.properties_updated":
+            with self.lock_contadores:
+                self.actualizaciones_en_cola[page_id] = self.actualizaciones_en_cola.get(page_id, 0) + 1
+        if evento.get("origen") == ORIGEN_RECONCILIACION:
+            with self.lock_contadores:
+                self.reconciliaciones_en_cola += 1
+        self.colas_shard[self.shard_de(page_id)].put(evento, self.prioridad_evento(evento), clave=page_id)
+    
+    def encolar_trabajo(self, funcion, *args):
+        """Encola trabajo de fondo (log, persistencia) en la prioridad más baja, repartido entre shards"""
+        shard = next(self.turno_trabajos) % self.num_shards
+        self.colas_shard[shard].put(TrabajoFondo(funcion, args), PRIORIDAD_FONDO)
+    
+    def marcar_desencolado(self, evento):
+        """Descuenta la actualización de la página al salir de la queue"""
+        if evento.get("origen") == ORIGEN_RECONCILIACION:
+            with self.lock_contadores:
+                self.reconciliaciones_en_cola -= 1
+        if evento.get("type") == "page.properties_updated":
+            with self.lock_contadores:
+                page_id = evento["page_id"]
+                restantes = self.actualizaciones_en_cola.get(page_id, 0) - 1
+                if restantes > 0:
+                    self.actualizaciones_en_cola[page_id] = restantes
+                else:
+                    self.actualizaciones_en_cola.pop(page_id, None)
+    
+    def eventos_pendientes(self):
+        """Eventos de webhook en cola (sin contar trabajos de fondo)"""
+        if self.modo == "ingesta" and self.cola_durable:
+            return self.pendientes_compartidos()
+        return sum(cola.qsize() - cola.pendientes(PRIORIDAD_FONDO) for cola in self.colas_shard)
+    
+    def eventos_en_vivo(self):
+        """Eventos de webhook en cola, sin los sintéticos del reconciliador"""
+        return self.eventos_pendientes() - self.reconciliaciones_en_cola
+    
+    def pendientes_compartidos(self):
+        """Pendientes en la cola compartida (todos los procesos), consultado como máximo cada TTL"""
+        pendientes, consultado_en = self.conteo_compartido
+        if time.monotonic() - consultado_en > TTL_CONTEO_COMPARTIDO:
+            pendientes = self.cola_durable.contar_pendientes()
+            self.conteo_compartido = (pendientes, time.monotonic())
+        return pendientes
+    
+    def consumir_cola_compartida(self, shards):
+        """Modo worker: pasa a las queues locales los eventos nuevos de sus shards (en orden de id)"""
+        logger.info(f"📥 Leyendo cola compartida para shards {shards}")
+        while self.aceptando:
+            # Contrapresión: con las queues locales llenas los eventos esperan en disco
+            disponibles = self.max_cola - self.eventos_pendientes() if self.max_cola > 0 else 500
+            if disponibles <= 0:
+                time.sleep(INTERVALO_SONDEO)
+                continue
+            
+            try:
+                eventos = self.cola_durable.leer_pendientes(shards, self.ultimo_id_leido, disponibles)
+            except Exception as e:
+                logger.error(f"Error leyendo cola compartida: {e}")
+                eventos = []
+            
+            for evento in eventos:
+                self.ultimo_id_leido = evento["_ids_durables"][0]
+                self.encolar_evento(evento)
+            if not eventos:
+                time.sleep(INTERVALO_SONDEO)
+        logger.info("🛑 Lectura de cola compartida detenida")
+    
+    def pendientes_por_prioridad(self):
+        total = dict.fromkeys(NOMBRES_PRIORIDAD, 0)
+        for cola in self.colas_shard:
+            for nombre, cantidad in cola.pendientes_por_prioridad().items():
+                total[nombre] += cantidad
+        return total
+    
+    def registrar_latencia_cola(self, evento):
+        """Registra cuánto esperó el evento entre encolado y desencolado"""
+        encolado_en = evento.get("_encolado_en")
+        if encolado_en is not None:
+            with self.lock_contadores:
+                self.latencias_cola.append(time.monotonic() - encolado_en)
+    
+    def percentiles_latencia_cola(self):
+        """p50/p95/p99/max de latencia de cola en milisegundos"""
+        with self.lock_contadores:
+            muestras = sorted(self.latencias_cola)
+        
+        if not muestras:
+            return {"muestras": 0}
+        
+        def percentil(p):
+            return round(muestras[min(len(muestras) - 1, int(p * len(muestras)))] * 1000, 2)
+        
+        return {
+            "muestras": len(muestras),
+            "p50": percentil(0.50),
+            "p95": percentil(0.95),
+            "p99": percentil(0.99),
+            "max": round(muestras[-1] * 1000, 2)
+        }
         
     def verificar_webhook_signature(self, request_body, signature):
         """Verifica la autenticidad del webhook"""
@@ -64,65 +351,237 @@ class WebhookProcessor:
             logger.error(f"Error verificando signature: {e}")
             return False
     
+    def edad_evento_mas_antiguo(self):
+        """Segundos que lleva en cola el evento más antiguo (0 si no hay)"""
+        return max((cola.edad_mas_antigua() for cola in self.colas_shard), default=0.0)
+    
     def procesar_evento_tarea(self, evento):
         """Procesa evento específico de tarea - CON SOPORTE ELIMINACIÓN"""
+        inicio = time.perf_counter()
+        event_type = evento.get("type")
+        resultado = "sin_resultado"
+        encolado_en = evento.get("_encolado_en")
+        iniciar_traza(
+            evento.get("page_id"), evento.get("id"), event_type,
+            None if encolado_en is None else time.monotonic() - encolado_en
+        )
         try:
-            event_type = evento.get("type")
             page_id = evento.get("page_id")
             
             if not page_id:
                 logger.error(f"❌ No se pudo obtener page_id del evento")
                 return
             
-            logger.info(f"📝 Procesando evento: {event_type} | Página: {page_id[:8]}...")
+            logger.info("📝 Procesando evento: %s | Página: %.8s...", event_type, page_id,
+                        extra={"page_id": page_id, "evento": event_type})
             
             if event_type == "page.properties_updated":
                 # Tarea modificada
                 resultado = monitor.procesar_tarea_modificada(page_id, evento)
                 
                 if resultado == "webhook_duplicado_ignorado":
-                    self.eventos_duplicados += 1
-                    logger.debug(f"⏭️ Webhook duplicado ignorado")
+                    self.incrementar("eventos_duplicados")
+                    logger.debug("⏭️ Webhook duplicado ignorado")
                 else:
-                    self.eventos_procesados += 1
-                    logger.info(f"✅ Resultado modificación: {resultado}")
+                    self.incrementar("eventos_procesados")
+                    logger.info("✅ Resultado modificación: %s", resultado, extra={"page_id": page_id, "resultado": resultado})
                 
             elif event_type == "page.created":
                 # Tarea nueva
                 resultado = monitor.procesar_tarea_nueva(page_id, evento)
-                self.eventos_procesados += 1
-                logger.info(f"✅ Resultado nueva tarea: {resultado}")
+                self.incrementar("eventos_procesados")
+                logger.info("✅ Resultado nueva tarea: %s", resultado, extra={"page_id": page_id, "resultado": resultado})
                 
             elif event_type == "page.deleted":
                 # ✅ NUEVO: Tarea eliminada (Caso 4)
                 resultado = monitor.procesar_tarea_eliminada(page_id, evento)
-                self.eventos_procesados += 1
-                logger.warning(f"🗑️ Resultado eliminación: {resultado}")
+                self.incrementar("eventos_procesados")
+                logger.warning("🗑️ Resultado eliminación: %s", resultado, extra={"page_id": page_id, "resultado": resultado})
                 
         except Exception as e:
+            resultado = "excepcion"
             logger.error(f"❌ Error procesando evento: {e}")
             import traceback
             logger.error(traceback.format_exc())
+        finally:
+            PROCESAMIENTO_SEGUNDOS.observar(time.perf_counter() - inicio, event_type)
+            RESULTADOS_MONITOR.incrementar(event_type, resultado)
+            finalizar_traza(resultado)
+            # Ack también en error: un evento que falla siempre no debe reproducirse sin fin
+            self.confirmar_evento(evento)
+    
+    def fusionar_eventos(self, evento_base, evento_nuevo):
+        """Fusiona un properties_updated en otro de la misma página (unión de propiedades)"""
+        propiedades = list(evento_base.get("properties", []))
+        for propiedad in evento_nuevo.get("properties", []):
+            if propiedad not in propiedades:
+                propiedades.append(propiedad)
+        
+        evento_base["properties"] = propiedades
+        evento_base.setdefault("data", {})["updated_properties"] = propiedades
+        evento_base["_eventos_fusionados"] = evento_base.get("_eventos_fusionados", 1) + 1
+        evento_base.setdefault("_ids_durables", []).extend(evento_nuevo.get("_ids_durables", []))
+        self.incrementar("eventos_coalescidos")
     
-    def worker_eventos(self):
-        """Worker que procesa eventos de la queue - MEJORADO"""
-        logger.info("🔄 Worker de eventos iniciado")
+    def coalescer_o_procesar(self, evento, pendientes):
+        """Retiene properties_updated durante la ventana; el resto se procesa en orden"""
+        page_id = evento["page_id"]
         
-        while self.processing:
+        if self.ventana_coalescencia <= 0:
+            self.procesar_evento_tarea(evento)
+            return
+        
+        if evento.get("type") == "page.properties_updated":
+            if page_id in pendientes:
+                self.fusionar_eventos(pendientes[page_id], evento)
+            else:
+                evento["_vence_en"] = time.monotonic() + self.ventana_coalescencia
+                pendientes[page_id] = evento
+            return
+        
+        # Creación/eliminación: primero lo retenido de esa página para conservar el orden
+        if page_id in pendientes:
+            self.procesar_evento_tarea(pendientes.pop(page_id))
+        self.procesar_evento_tarea(evento)
+    
+    def procesar_vencidos(self, pendientes, todos=False):
+        """Procesa eventos retenidos cuya ventana expiró (orden de llegada = orden de vencimiento)"""
+        ahora = time.monotonic()
+        while pendientes:
+            page_id, evento = next(iter(pendientes.items()))
+            if not todos and evento["_vence_en"] > ahora:
+                break
+            del pendientes[page_id]
             try:
-                if not event_queue.empty():
-                    evento = event_queue.get(timeout=1)
-                    self.procesar_evento_tarea(evento)
-                    event_queue.task_done()
-                else:
-                    time.sleep(0.1)  # Esperar si no hay eventos
+                self.procesar_evento_tarea(evento)
+            except Exception as e:
+                logger.error(f"Error en worker: {e}")
+    
+    def worker_eventos(self, shard=0):
+        """Worker que procesa eventos de la queue de su shard - MEJORADO"""
+        cola = self.colas_shard[shard]
+        pendientes = OrderedDict()  # page_id → evento retenido en ventana de coalescencia
+        logger.info(f"🔄 Worker de eventos iniciado (shard {shard})")
+        
+        while True:
+            # Bloquea hasta el próximo evento o hasta que venza la ventana más antigua
+            timeout = None
+            if pendientes:
+                primero = next(iter(pendientes.values()))
+                timeout = max(0, primero["_vence_en"] - time.monotonic())
+            
+            try:
+                evento = cola.get(timeout=timeout)
+            except Empty:
+                self.procesar_vencidos(pendientes)
+                continue
+            
+            try:
+                if evento is FIN_WORKER:
+                    self.procesar_vencidos(pendientes, todos=True)
+                    # Lo que siga en cola (p.ej. trabajos de fondo generados al vaciar) se completa
+                    self.vaciar_cola(cola)
+                    logger.info(f"🛑 Worker de eventos detenido (shard {shard})")
+                    return
+                
+                self.atender(evento, pendientes)
+                self.procesar_vencidos(pendientes)
                     
             except Exception as e:
                 logger.error(f"Error en worker: {e}")
-                time.sleep(1)
+    
+    def atender(self, item, pendientes):
+        """Ejecuta un trabajo de fondo o pasa el evento por la coalescencia"""
+        if isinstance(item, TrabajoFondo):
+            try:
+                item.ejecutar()
+            except Exception as e:
+                logger.error(f"Error en trabajo de fondo {item.descripcion}: {e}")
+            return
+        
+        self.registrar_latencia_cola(item)
+        self.marcar_desencolado(item)
+        self.coalescer_o_procesar(item, pendientes)
+    
+    def vaciar_cola(self, cola):
+        """Procesa todo lo pendiente sin esperar ventanas (apagado)"""
+        pendientes = OrderedDict()
+        while True:
+            try:
+                item = cola.get_nowait()
+            except Empty:
+                break
+            if item is not FIN_WORKER:
+                self.atender(item, pendientes)
+        self.procesar_vencidos(pendientes, todos=True)
+    
+    def detener_workers(self, timeout=None):
+        """Envía sentinel a cada shard; los workers terminan tras vaciar su cola
+        
+        Returns: True si todos terminaron dentro del timeout (total, no por worker)
+        """
+        self.processing = False
+        for cola in self.colas_shard:
+            cola.put(FIN_WORKER, PRIORIDAD_FONDO)
+        
+        limite = None if timeout is None else time.monotonic() + timeout
+        for worker in self.workers:
+            worker.join(None if limite is None else max(0, limite - time.monotonic()))
+        
+        if any(worker.is_alive() for worker in self.workers):
+            return False
+        
+        # Trabajos de fondo que otro shard encoló después de que este terminara
+        for cola in self.colas_shard:
+            self.vaciar_cola(cola)
+        return True
 
 # Instancia global del procesador
 processor = WebhookProcessor()
+# Escritura de log y persistencia de snapshots del monitor van en prioridad de fondo
+monitor.ejecutar_en_fondo = processor.encolar_trabajo
+
+REGISTRO.indicador(
+    "webhook_cola_profundidad", "Eventos esperando en las queues de shard",
+    lambda: {(str(shard),): cola.qsize() for shard, cola in enumerate(processor.colas_shard)},
+    ("shard",)
+)
+REGISTRO.indicador(
+    "webhook_cola_prioridad_profundidad", "Elementos en cola por nivel de prioridad",
+    lambda: {(nombre,): cantidad for nombre, cantidad in processor.pendientes_por_prioridad().items()},
+    ("prioridad",)
+)
+REGISTRO.indicador(
+    "webhook_cola_atendidos_por_espera", "Elementos atendidos antes por superar su espera máxima",
+    lambda: sum(cola.atendidos_por_espera for cola in processor.colas_shard)
+)
+REGISTRO.indicador(
+    "webhook_reentregas_ignoradas", "Webhooks con id de evento ya aceptado (reentregas de Notion)",
+    lambda: processor.eventos_reentregados
+)
+REGISTRO.indicador(
+    "webhook_cola_evento_mas_antiguo_segundos", "Edad del evento más antiguo en cola",
+    processor.edad_evento_mas_antiguo
+)
+REGISTRO.indicador(
+    "webhook_cola_durable_pendientes", "Eventos sin confirmar en la cola durable",
+    lambda: processor.cola_durable.pendientes_en_disco if processor.cola_durable else None
+)
+REGISTRO.indicador(
+    "monitor_cache_entradas", "Entradas en caches del monitor",
+    lambda: {
+        ("usuarios",): len(monitor.cache_usuarios),
+        ("personas",): len(monitor.cache_nombres_personas)
+    },
+    ("cache",)
+)
+
+@app.after_request
+def contar_ingesta(response):
+    """Cuenta cada webhook recibido por tipo y código de respuesta"""
+    if request.path == '/webhook' and request.method == 'POST':
+        INGESTA.incrementar(g.get("tipo_evento", "unknown"), str(response.status_code))
+    return response
 
 @app.route('/webhook', methods=['POST', 'GET'])
 def webhook_endpoint():
@@ -142,6 +601,18 @@ def webhook_endpoint():
                 logger.warning("❌ Datos de webhook vacíos")
                 return jsonify({"error": "No data"}), 400
             
+            g.tipo_evento = evento_data.get('type', 'unknown')
+            
+            # Apagado en curso: Notion reintentará contra la nueva instancia
+            if not processor.aceptando:
+                respuesta = jsonify({"error": "Shutting down"})
+                respuesta.headers["Retry-After"] = str(WEBHOOK_RETRY_AFTER)
+                return respuesta, 503
+            
+            # Captura del payload crudo para replay (escritura en segundo plano)
+            if captura:
+                captura.registrar(request.get_data(), request.headers.get(HEADER_FIRMA))
+            
             # 🚨 FILTRAR WEBHOOKS DEL PROPIO SISTEMA (ANTI-BUCLE)
             authors = evento_data.get("authors", [])
             integration_id = evento_data.get("integration_id")
@@ -157,8 +628,8 @@ def webhook_endpoint():
             eventos_relevantes = ['page.properties_updated', 'page.created', 'page.deleted']
             
             if event_type not in eventos_relevantes:
-                logger.debug(f"⏭️ Evento ignorado (irrelevante): {event_type}")
-                processor.eventos_ignorados += 1
+                logger.debug("⏭️ Evento ignorado (irrelevante): %s", event_type)
+                processor.incrementar("eventos_ignorados")
                 return jsonify({"status": "ignored_irrelevant"}), 200
             
             # OBTENER INFORMACIÓN DE LA ESTRUCTURA NOTION
@@ -179,25 +650,47 @@ def webhook_endpoint():
             if event_type == "page.deleted":
                 # Para eventos de eliminación, asumimos que es relevante si llegó hasta aquí
                 # Ya que el filtro anti-bucle ya funcionó
-                logger.debug(f"🗑️ Evento de eliminación procesado sin verificar DB (limitación de Notion)")
+                logger.debug("🗑️ Evento de eliminación procesado sin verificar DB (limitación de Notion)")
             elif database_id != DB_TAREAS_ID:
-                logger.debug(f"⏭️ Database no relevante ignorada: {database_id[:8] if database_id else 'unknown'}...")
-                processor.eventos_ignorados += 1
+                logger.debug("⏭️ Database no relevante ignorada: %.8s...", database_id or "unknown")
+                processor.incrementar("eventos_ignorados")
                 return jsonify({"status": "different_database"}), 200
             
             # ✅ SI LLEGAMOS AQUÍ: Es evento relevante
-            logger.info(f"🎯 Evento VÁLIDO: {event_type} | Página: {page_id[:8]}...")
+            logger.info("🎯 Evento VÁLIDO: %s | Página: %.8s...", event_type, page_id,
+                        extra={"page_id": page_id, "evento": event_type})
             
             # Agregar propiedades cambiadas si están disponibles
             if "updated_properties" in data:
                 evento_data["properties"] = data["updated_properties"]
-                logger.debug(f"📝 Propiedades cambiadas: {len(data['updated_properties'])}")
+                logger.debug("📝 Propiedades cambiadas: %d", len(data['updated_properties']))
             
             # Agregar page_id para compatibilidad
             evento_data["page_id"] = page_id
             
-            # Agregar a queue para procesamiento
-            event_queue.put(evento_data)
+            # 🔁 IDEMPOTENCIA: Notion reentrega con el mismo id si no respondimos a tiempo
+            evento_id = evento_data.get("id")
+            if evento_id and not idempotencia.registrar_si_nuevo(evento_id):
+                logger.info("🔁 Reentrega ignorada (id ya aceptado): %s", evento_id, extra={"page_id": page_id})
+                processor.incrementar("eventos_reentregados")
+                return jsonify({"status": "duplicate_delivery"}), 200
+            
+            # Admitir, persistir y agregar a queue del shard para procesamiento
+            resultado = processor.aceptar_evento(evento_data)
+            
+            if resultado in ("saturado", "error_persistencia") and evento_id:
+                # No aceptado: el reintento de Notion debe procesarse
+                idempotencia.olvidar(evento_id)
+            
+            if resultado == "descartado":
+                return jsonify({"status": "shed"}), 200
+            if resultado == "saturado":
+                respuesta = jsonify({"error": "Queue full"})
+                respuesta.headers["Retry-After"] = str(WEBHOOK_RETRY_AFTER)
+                return respuesta, 503
+            if resultado == "error_persistencia":
+                return jsonify({"error": "Queue unavailable"}), 503
+            
             logger.info("✅ Evento agregado a queue para procesamiento")
         
         return jsonify({"status": "received"}), 200
@@ -228,15 +721,34 @@ def status_endpoint():
     return jsonify({
         "status": "running",
         "version": "v2.0",
-        "eventos_pendientes": event_queue.qsize(),
+        "eventos_pendientes": processor.eventos_pendientes(),
+        "eventos_pendientes_por_shard": [cola.qsize() for cola in processor.colas_shard],
+        "eventos_pendientes_por_prioridad": processor.pendientes_por_prioridad(),
+        "atendidos_por_espera_maxima": sum(cola.atendidos_por_espera for cola in processor.colas_shard),
+        "eventos_pendientes_en_disco": processor.cola_durable.pendientes_en_disco if processor.cola_durable else None,
         "monitor_activo": processor.processing,
+        "latencia_cola_ms": processor.percentiles_latencia_cola(),
+        "ingesta": {
+            "profundidad_cola": processor.eventos_pendientes(),
+            "max_cola": processor.max_cola,
+            "eventos_descartados": dict(processor.eventos_descartados),
+            "eventos_rechazados_503": processor.eventos_rechazados
+        },
         "estadisticas": {
             "eventos_procesados": processor.eventos_procesados,
             "eventos_ignorados": processor.eventos_ignorados,
             "eventos_duplicados": processor.eventos_duplicados,
+            "eventos_coalescidos": processor.eventos_coalescidos,
+            "eventos_reentregados": processor.eventos_reentregados,
             "cache_usuarios": len(monitor.cache_usuarios),
             "cache_nombres_personas": len(monitor.cache_nombres_personas)
         },
+        "reconciliacion": {
+            "activa": reconciliador is not None,
+            "barridos": reconciliador.barridos if reconciliador else 0,
+            "eventos_encolados": reconciliador.eventos_encolados if reconciliador else 0,
+            "ultimo_barrido": reconciliador.ultimo_barrido if reconciliador else None
+        },
         "configuracion": {
             "db_tareas_id": DB_TAREAS_ID[:8] + "..." if DB_TAREAS_ID else "No configurada",
             "zona_horaria": "GMT-5 (Colombia)",
@@ -244,6 +756,21 @@ def status_endpoint():
         }
     }), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas en formato de exposición Prometheus"""
+    return Response(REGISTRO.exponer(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route('/debug/traces', methods=['GET'])
+def traces_endpoint():
+    """Trazas por etapa de los eventos más lentos (de mayor a menor duración)"""
+    limite = request.args.get("limite", type=int)
+    return jsonify({
+        "capacidad": REGISTRO_TRAZAS.capacidad,
+        "trazas_registradas": REGISTRO_TRAZAS.trazas_registradas,
+        "trazas": REGISTRO_TRAZAS.mas_lentas(limite)
+    }), 200
+
 @app.route('/debug', methods=['POST'])
 def debug_endpoint():
     """Endpoint para debug de webhooks - MEJORADO"""
@@ -272,11 +799,118 @@ def debug_endpoint():
         logger.error(f"Error en debug: {e}")
         return jsonify({"error": str(e)}), 500
 
-def iniciar_worker():
-    """Inicia el worker de procesamiento en thread separado"""
-    worker_thread = threading.Thread(target=processor.worker_eventos, daemon=True)
-    worker_thread.start()
-    logger.info("🚀 Worker de eventos iniciado en thread separado")
+def apagar_servidor(signum=None, frame=None):
+    """Apagado ordenado: corta la ingesta, drena la cola y guarda el estado de arranque"""
+    if not processor.aceptando:
+        return
+    processor.aceptando = False
+    if reconciliador:
+        reconciliador.detener()
+    if processor.consumidor:
+        processor.consumidor.join(TIMEOUT_PERSISTENCIA)
+    logger.info("🛑 Señal %s recibida - ingesta detenida, drenando %d eventos...",
+                signum, processor.eventos_pendientes())
+    
+    if not processor.detener_workers(WEBHOOK_TIMEOUT_DRENADO):
+        pendientes = processor.eventos_pendientes()
+        if processor.cola_durable:
+            logger.warning(f"⏱️ Drenado incompleto: {pendientes} eventos quedan en la cola durable para el próximo arranque")
+        else:
+            logger.error(f"❌ Drenado incompleto sin cola durable: {pendientes} eventos se pierden")
+    
+    if processor.cola_durable:
+        processor.cola_durable.detener()
+    
+    # Solo cambios propios sobre el mismo archivo que se cargó (no pisa un setup reciente)
+    monitor.snapshots.persistir_si_vigente()
+    if WEBHOOK_ESTADO_ARRANQUE:
+        monitor.guardar_estado_arranque(WEBHOOK_ESTADO_ARRANQUE)
+    idempotencia.detener()
+    if captura:
+        captura.cerrar()
+    
+    logger.info("✅ Servidor detenido ordenadamente")
+    detener_logging()
+    sys.exit(0)
+
+def iniciar_worker(shards=None):
+    """Inicia un worker de procesamiento por shard en threads separados"""
+    shards = list(range(processor.num_shards)) if shards is None else shards
+    for shard in shards:
+        worker_thread = threading.Thread(
+            target=processor.worker_eventos,
+            args=(shard,),
+            name=f"worker-shard-{shard}",
+            daemon=True
+        )
+        worker_thread.start()
+        processor.workers.append(worker_thread)
+    logger.info(f"🚀 {len(shards)} workers de eventos iniciados (1 por shard)")
+
+def configurar_coalescencia():
+    # Con coalescencia activa ya no se descartan eventos por cercanía en el tiempo
+    if processor.ventana_coalescencia > 0:
+        monitor.ventana_duplicados = 0
+        logger.info(f"🧩 Coalescencia por página: ventana de {processor.ventana_coalescencia}s")
+
+def iniciar_reconciliador(shards=None):
+    """Barrido periódico de tareas desfasadas (WEBHOOK_RECONCILIACION_INTERVALO=0 lo desactiva)"""
+    global reconciliador
+    if INTERVALO_RECONCILIACION <= 0:
+        return
+    reconciliador = Reconciliador(monitor, processor, shards=shards)
+    reconciliador.iniciar()
+
+def iniciar_ingesta():
+    """Proceso de ingesta (WEBHOOK_MODO=ingesta, p.ej. un worker de gunicorn)
+
+    Solo admite y persiste: necesita el esquema para el descarte por saturación,
+    no caches de usuarios ni workers
+    """
+    if not WEBHOOK_COLA_DURABLE:
+        raise RuntimeError("WEBHOOK_MODO=ingesta requiere WEBHOOK_COLA_DURABLE")
+    if not monitor.cargar_estado_arranque(WEBHOOK_ESTADO_ARRANQUE):
+        monitor.cargar_esquema_propiedades()
+    if WEBHOOK_IDEMPOTENCIA:
+        idempotencia.iniciar()
+    processor.iniciar_cola_durable()
+    atexit.register(detener_ingesta)
+    logger.info(f"📨 Proceso de ingesta {os.getpid()} listo (cola compartida: {WEBHOOK_COLA_DURABLE})")
+
+def detener_ingesta():
+    processor.aceptando = False
+    if processor.cola_durable:
+        processor.cola_durable.detener()
+    idempotencia.detener()
+
+def iniciar_worker_compartido(shards):
+    """Proceso worker (WEBHOOK_MODO=worker): procesa solo los shards indicados"""
+    if not WEBHOOK_COLA_DURABLE:
+        raise RuntimeError("WEBHOOK_MODO=worker requiere WEBHOOK_COLA_DURABLE")
+    monitor.inicializar(WEBHOOK_ESTADO_ARRANQUE)
+    configurar_coalescencia()
+    if WEBHOOK_TRAZAS:
+        REGISTRO_TRAZAS.exportar_a(WEBHOOK_TRAZAS)
+    processor.iniciar_cola_durable()
+    iniciar_worker(shards)
+    processor.consumidor = threading.Thread(
+        target=processor.consumir_cola_compartida,
+        args=(shards,),
+        name="consumidor-cola",
+        daemon=True
+    )
+    processor.consumidor.start()
+    # Un solo barrido para todo el despliegue: el dueño del shard 0 revisa todas las
+    # páginas y deja las de otros shards en la cola compartida. También es el único
+    # que exporta task_snapshots.json
+    if 0 in shards:
+        monitor.snapshots.exportador = True
+        iniciar_reconciliador(shards)
+
+# Bajo gunicorn el bloque __main__ no corre: cada proceso de ingesta se inicia al importar
+# (sin --preload, así los threads de escritura nacen en el proceso que los usa)
+if WEBHOOK_MODO == "ingesta":
+    iniciar_ingesta()
 
 if __name__ == '__main__':
     logger.info("🌐 Iniciando servidor de webhooks v2.0...")
@@ -293,11 +927,31 @@ if __name__ == '__main__':
     logger.info(f"📋 Monitoreando DB de Tareas: {DB_TAREAS_ID[:8]}...")
     logger.info("🗑️ Soporte para eliminación de tareas: ACTIVADO")
     
-    # Inicializar monitor
-    monitor.inicializar()
+    if MULTIPROCESO:
+        logger.error(f"❌ WEBHOOK_MODO={WEBHOOK_MODO}: usa gunicorn (ingesta) o worker_shards.py (worker)")
+        exit(1)
+    
+    # Inicializar monitor (en caliente si hay estado del último apagado)
+    monitor.inicializar(WEBHOOK_ESTADO_ARRANQUE)
+    configurar_coalescencia()
     
-    # Iniciar worker de procesamiento
+    if WEBHOOK_CAPTURA:
+        captura = CapturaWebhooks(WEBHOOK_CAPTURA)
+    if WEBHOOK_TRAZAS:
+        REGISTRO_TRAZAS.exportar_a(WEBHOOK_TRAZAS)
+    
+    # Índice de ids ya aceptados: reentregas tras minutos o reinicios no llegan a Notion
+    if WEBHOOK_IDEMPOTENCIA:
+        idempotencia.iniciar()
+    
+    # Abrir cola durable (reproduce eventos no procesados) e iniciar workers
+    processor.iniciar_cola_durable()
     iniciar_worker()
+    iniciar_reconciliador()
+    
+    # SIGTERM (deploy) / Ctrl+C: drenar en vez de matar workers a mitad de evento
+    signal.signal(signal.SIGTERM, apagar_servidor)
+    signal.signal(signal.SIGINT, apagar_servidor)
     
     # Iniciar servidor Flask
     port = int(os.getenv("WEBHOOK_PORT", 5000))
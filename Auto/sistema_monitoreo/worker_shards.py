@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Worker de Shards - PROCESO DE PROCESAMIENTO EN DESPLIEGUE MULTIPROCESO
+Lee de la cola durable compartida los eventos de los shards que le tocan
+(los escriben los procesos de ingesta) y los procesa con el monitor
+
+Uso (4 shards repartidos en 2 procesos):
+    python worker_shards.py --proceso 0 --procesos 2
+    python worker_shards.py --proceso 1 --procesos 2
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+
+
+def shards_del_proceso(proceso, procesos, num_shards):
+    """Shards asignados a un proceso: shard % procesos == proceso"""
+    return [shard for shard in range(num_shards) if shard % procesos == proceso]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesa los eventos de un subconjunto de shards")
+    parser.add_argument("--proceso", type=int, default=0, help="Índice de este proceso (0..procesos-1)")
+    parser.add_argument("--procesos", type=int, default=1, help="Total de procesos worker")
+    parser.add_argument("--shards", help="Lista explícita de shards (p.ej. 0,2); reemplaza --proceso/--procesos")
+    args = parser.parse_args()
+
+    # Antes de importar el servidor: el modo decide cola, idempotencia y estado compartidos
+    os.environ["WEBHOOK_MODO"] = "worker"
+    import webhook_server as servidor
+
+    if args.shards:
+        shards = [int(shard) for shard in args.shards.split(",")]
+    else:
+        shards = shards_del_proceso(args.proceso, args.procesos, servidor.processor.num_shards)
+
+    if not shards or any(not 0 <= shard < servidor.processor.num_shards for shard in shards):
+        servidor.logger.error(f"❌ Shards inválidos {shards} (WEBHOOK_SHARDS={servidor.processor.num_shards})")
+        sys.exit(1)
+
+    servidor.logger.info(f"⚙️ Worker {os.getpid()} dueño de shards {shards}")
+    servidor.iniciar_worker_compartido(shards)
+
+    # SIGTERM: deja de leer la cola compartida, drena lo local y guarda estado
+    signal.signal(signal.SIGTERM, servidor.apagar_servidor)
+    signal.signal(signal.SIGINT, servidor.apagar_servidor)
+
+    while True:
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Test de Agregados de Sprints
+============================
+
+Verifica las métricas precalculadas por persona y área (cumplimiento, violaciones,
+proporción de imprevistas) y que solo se recalculan los sprints cuyo histórico
+cambió, contra Notion simulado en memoria.
+
+EJECUCIÓN:
+python Test/sistema_analitica/test_agregados_sprints.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_analitica'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../sistema_monitoreo'))
+
+import historico_sprints
+from historico_sprints import exportar
+from agregados_sprints import SIN_AREA, TABLA_POR_PERSONA, actualizar_agregados, leer_agregados
+from notion_simulado import NotionSimulado, WorkspaceSimulado, DB_SPRINTS, DB_TAREAS
+
+DB_PERFORMANCE = "db-performance"
+ANTES = "2025-01-01T00:00:00.000Z"
+
+
+def preparar():
+    """Sprint cerrado (con Performance) y sprint abierto (solo tareas)"""
+    ws = WorkspaceSimulado()
+    cliente = NotionSimulado(workspace=ws)
+    ana, _ = ws.crear_persona("Ana")
+    luis, _ = ws.crear_persona("Luis")
+    cerrado = ws.crear_sprint("Sprint 1", es_actual=False, fecha_fin="2025-06-15")
+    abierto = ws.crear_sprint("Sprint 2", fecha_fin="2025-06-30")
+
+    ws.crear_tarea("a1", cerrado, [ana], estado="Listo")
+    ws.crear_tarea("a2", cerrado, [ana], prioridad="Imprevista", estado="Listo")
+    compartida = ws.crear_tarea("compartida", cerrado, [ana, luis], prioridad="Imprevista")
+    ws.editar(compartida, {"Violaciones Detectadas": {"number": 2}}, "usuario")
+    ws.crear_tarea("l1", abierto, [luis])
+
+    for persona, nombre, area, asignada, completada in ((ana, "Ana", "Tecnología", 8, 6),
+                                                          (luis, "Luis", "Comercial", 4, 1)):
+        cliente.pages.create(parent={"database_id": DB_PERFORMANCE}, properties={
+            "Nombre": {"title": [{"text": {"content": f"{nombre} - Sprint 1"}}]},
+            "Persona": {"relation": [{"id": persona}]},
+            "Sprint": {"relation": [{"id": cerrado}]},
+            "Área": {"rich_text": [{"text": {"content": area}}]},
+            "Carga Asignada": {"number": asignada},
+            "Carga Completada": {"number": completada}
+        })
+    for pagina in ws.paginas.values():
+        pagina["last_edited_time"] = ANTES
+
+    historico_sprints.notion = cliente
+    historico_sprints.DB_SPRINTS_ID = DB_SPRINTS
+    historico_sprints.DB_TAREAS_ID = DB_TAREAS
+    historico_sprints.DB_PERFORMANCE_ID = DB_PERFORMANCE
+    return ws, cerrado, abierto, ana, luis
+
+
+def test_metricas_por_persona_y_area():
+    with tempfile.TemporaryDirectory() as directorio:
+        _, cerrado, abierto, ana, luis = preparar()
+        exportar(directorio=directorio)
+        assert actualizar_agregados(directorio) == 2
+
+        por_persona, por_area = leer_agregados([cerrado], directorio)
+        filas = {fila["persona_id"]: fila for fila in por_persona.to_dict("records")}
+        assert filas[ana]["persona"] == "Ana" and filas[ana]["sprint"] == "Sprint 1"
+        assert filas[ana]["tareas"] == 3 and filas[ana]["imprevistas"] == 2
+        assert filas[ana]["imprevistas_completadas"] == 1 and filas[ana]["violaciones"] == 2
+        assert abs(filas[ana]["ratio_imprevistas"] - 2 / 3) < 1e-9
+        assert filas[ana]["cumplimiento"] == 0.75
+        assert filas[luis]["area"] == "Comercial" and filas[luis]["ratio_imprevistas"] == 1.0
+
+        areas = por_area.set_index("area")
+        assert areas.loc["Tecnología", "personas"] == 1 and areas.loc["Comercial", "cumplimiento"] == 0.25
+
+        # Sprint abierto: sin Performance todavía
+        por_persona, _ = leer_agregados([abierto], directorio)
+        assert por_persona["area"].tolist() == [SIN_AREA]
+        assert por_persona["cumplimiento"].isna().all()
+
+
+def test_solo_recalcula_sprints_con_cambios():
+    with tempfile.TemporaryDirectory() as directorio:
+        ws, cerrado, abierto, _, luis = preparar()
+        exportar(directorio=directorio)
+        actualizar_agregados(directorio)
+        ruta_cerrado = os.path.join(directorio, TABLA_POR_PERSONA, f"sprint_id={cerrado}")
+        escrito = os.stat(os.path.join(ruta_cerrado, "parte.parquet")).st_mtime_ns
+
+        assert actualizar_agregados(directorio) == 0
+
+        ws.crear_tarea("l2", abierto, [luis], prioridad="Imprevista")
+        exportar(directorio=directorio)
+        assert actualizar_agregados(directorio) == 1
+        assert os.stat(os.path.join(ruta_cerrado, "parte.parquet")).st_mtime_ns == escrito
+        por_persona, _ = leer_agregados([abierto], directorio)
+        assert por_persona["tareas"].tolist() == [2] and por_persona["imprevistas"].tolist() == [1]
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
@@ -0,0 +1,132 @@
+"""
+Test del Histórico de Sprints
+=============================
+
+Verifica que la exportación a Parquet particionado por sprint es incremental
+(solo reescribe las particiones tocadas, mueve las tareas que cambian de sprint)
+y que la lectura local filtra por partición, contra Notion simulado en memoria.
+
+EJECUCIÓN:
+python Test/sistema_analitica/test_historico_sprints.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_analitica'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../sistema_monitoreo'))
+
+import pyarrow.dataset as ds
+
+import historico_sprints
+from historico_sprints import exportar, leer_tabla, leer_estado, ruta_particion
+from notion_simulado import NotionSimulado, WorkspaceSimulado, DB_SPRINTS, DB_TAREAS
+
+DB_PERFORMANCE = "db-performance"
+ANTES = "2025-01-01T00:00:00.000Z"
+
+
+def preparar():
+    """Dos sprints con tareas y un registro de Performance por persona en el primero"""
+    ws = WorkspaceSimulado()
+    cliente = NotionSimulado(workspace=ws)
+    ana, _ = ws.crear_persona("Ana")
+    luis, _ = ws.crear_persona("Luis")
+    sprint_1 = ws.crear_sprint("Sprint 1", es_actual=False)
+    sprint_2 = ws.crear_sprint("Sprint 2")
+    tareas = {
+        "planificada": ws.crear_tarea("planificada", sprint_1, [ana], estado="Listo"),
+        "imprevista": ws.crear_tarea("imprevista", sprint_1, [ana, luis], prioridad="Imprevista"),
+        "siguiente": ws.crear_tarea("siguiente", sprint_2, [luis])
+    }
+    ws.editar(tareas["planificada"], {"Carga": {"formula": {"number": 3}}}, "usuario")
+    for persona in (ana, luis):
+        cliente.pages.create(parent={"database_id": DB_PERFORMANCE}, properties={
+            "Nombre": {"title": [{"text": {"content": "Performance"}}]},
+            "Persona": {"relation": [{"id": persona}]},
+            "Sprint": {"relation": [{"id": sprint_1}]},
+            "Área": {"rich_text": [{"text": {"content": "Tecnología"}}]},
+            "Carga Asignada": {"number": 3},
+            "Tareas Totales": {"number": 1},
+            "Estado": {"select": {"name": "Cerrado"}}
+        })
+    for pagina in ws.paginas.values():
+        pagina["last_edited_time"] = ANTES
+
+    historico_sprints.notion = cliente
+    historico_sprints.DB_SPRINTS_ID = DB_SPRINTS
+    historico_sprints.DB_TAREAS_ID = DB_TAREAS
+    historico_sprints.DB_PERFORMANCE_ID = DB_PERFORMANCE
+    return ws, sprint_1, sprint_2, tareas
+
+
+def test_exportacion_inicial_particionada():
+    with tempfile.TemporaryDirectory() as directorio:
+        _, sprint_1, sprint_2, tareas = preparar()
+        resumen = exportar(directorio=directorio)
+
+        assert resumen == {"performance": (2, 1), "sprints": (2, 2), "tareas": (3, 2)}
+        assert set(leer_estado(directorio)) == {"performance", "sprints", "tareas"}
+        assert os.path.exists(ruta_particion("tareas", sprint_1, directorio))
+
+        # Solo la partición pedida: las columnas vienen de los archivos y sprint_id de la ruta
+        del_sprint = leer_tabla("tareas", columnas=["id", "carga", "personas", "sprint_id"],
+                                sprints=[sprint_1], directorio=directorio).to_pylist()
+        assert {fila["id"] for fila in del_sprint} == {tareas["planificada"], tareas["imprevista"]}
+        assert {fila["sprint_id"] for fila in del_sprint} == {sprint_1}
+        planificada = next(fila for fila in del_sprint if fila["id"] == tareas["planificada"])
+        assert planificada["carga"] == 3.0 and len(planificada["personas"]) == 1
+
+        imprevistas = leer_tabla("tareas", filtro=ds.field("prioridad") == "Imprevista", directorio=directorio)
+        assert imprevistas.column("id").to_pylist() == [tareas["imprevista"]]
+
+        performance = leer_tabla("performance", sprints=[sprint_1], directorio=directorio)
+        assert performance.num_rows == 2 and set(performance.column("area").to_pylist()) == {"Tecnología"}
+        assert leer_tabla("performance", sprints=[sprint_2], directorio=directorio).num_rows == 0
+
+
+def test_incremental_reescribe_solo_lo_tocado():
+    with tempfile.TemporaryDirectory() as directorio:
+        ws, sprint_1, sprint_2, tareas = preparar()
+        exportar(directorio=directorio)
+        ruta_sprint_2 = ruta_particion("tareas", sprint_2, directorio)
+        escrito = os.stat(ruta_sprint_2).st_mtime_ns
+
+        # Sin cambios desde la marca (las páginas son anteriores): nada que reescribir
+        assert exportar(directorio=directorio)["tareas"] == (0, 0)
+
+        ws.editar(tareas["planificada"], {"Estado": {"status": {"name": "En curso"}}}, "usuario")
+        assert exportar(directorio=directorio)["tareas"] == (1, 1)
+        assert os.stat(ruta_sprint_2).st_mtime_ns == escrito
+        estados = leer_tabla("tareas", columnas=["id", "estado"], directorio=directorio).to_pylist()
+        assert {"id": tareas["planificada"], "estado": "En curso"} in estados
+
+        # Cambio de sprint: sale de la partición anterior
+        # (la marca retrocede un minuto: la edición anterior se vuelve a leer si es reciente)
+        ws.paginas[tareas["planificada"]]["last_edited_time"] = ANTES
+        ws.editar(tareas["imprevista"], {"Sprint": {"relation": [{"id": sprint_2}]}}, "usuario")
+        assert exportar(directorio=directorio)["tareas"] == (1, 2)
+        tabla = leer_tabla("tareas", columnas=["id", "sprint_id"], directorio=directorio).to_pylist()
+        assert len(tabla) == 3
+        assert {"id": tareas["imprevista"], "sprint_id": sprint_2} in tabla
+
+
+def test_completo_recoge_eliminadas():
+    with tempfile.TemporaryDirectory() as directorio:
+        ws, sprint_1, _, tareas = preparar()
+        exportar(directorio=directorio)
+
+        ws.eliminar(tareas["planificada"])
+        ws.eliminar(tareas["imprevista"])
+        exportar(completo=True, directorio=directorio)
+        assert not os.path.exists(ruta_particion("tareas", sprint_1, directorio))
+        assert leer_tabla("tareas", directorio=directorio).column("id").to_pylist() == [tareas["siguiente"]]
+        assert not os.path.exists(f"{directorio}.nuevo")
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
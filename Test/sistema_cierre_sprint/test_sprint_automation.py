@@ -39,8 +39,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_cier
 # Importar funciones del script principal
 from sprint_automation import (
     obtener_sprint_actual, 
-    obtener_tareas_del_sprint, 
-    agrupar_tareas_por_persona,
+    iterar_tareas_del_sprint, 
+    resumir_tareas_por_persona,
     filtrar_tareas_para_metricas,
     obtener_info_persona,
     obtener_area_persona,
@@ -132,7 +132,8 @@ def test_3_tareas_sprint(sprint_id):
     logger.info("🔍 TEST 3: Verificando obtención de tareas del sprint...")
     
     try:
-        tareas = obtener_tareas_del_sprint(sprint_id)
+        # Diagnóstico: se materializan para inspeccionarlas (el cierre solo las recorre)
+        tareas = list(iterar_tareas_del_sprint(sprint_id))
         
         logger.info(f"  📊 Total de tareas encontradas: {len(tareas)}")
         
@@ -211,15 +212,18 @@ def test_4_agrupacion_personas(tareas):
     logger.info("🔍 TEST 4: Verificando agrupación de tareas por persona...")
     
     try:
-        personas, tareas_sin_asignar = agrupar_tareas_por_persona(tareas)
+        personas, tareas_sin_asignar = resumir_tareas_por_persona(tareas)
         
         logger.info(f"  👥 Personas con tareas asignadas: {len(personas)}")
-        logger.info(f"  ⚠️ Tareas sin asignar: {len(tareas_sin_asignar)}")
+        logger.info(f"  ⚠️ Tareas sin asignar: {tareas_sin_asignar}")
         
         # Obtener nombres de personas y estadísticas
         estadisticas_personas = {}
+        tareas_por_id = {tarea["id"]: tarea for tarea in tareas}
         
-        for persona_id, tareas_persona in personas.items():
+        for persona_id, resumen in personas.items():
+            # El resumen guarda solo ids: el test 5 filtra las tareas completas
+            tareas_persona = [tareas_por_id[tarea_id] for tarea_id in resumen["tareas_ids"]]
             try:
                 persona_info = obtener_info_persona(persona_id)
                 if persona_info:
@@ -259,7 +263,7 @@ def test_4_agrupacion_personas(tareas):
         return {
             "status": "✅ SUCCESS",
             "total_personas": len(personas),
-            "tareas_sin_asignar": len(tareas_sin_asignar),
+            "tareas_sin_asignar": tareas_sin_asignar,
             "estadisticas": estadisticas_personas
         }
         
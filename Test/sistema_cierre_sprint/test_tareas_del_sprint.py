@@ -0,0 +1,136 @@
+"""
+Test de Tareas del Sprint en Streaming
+======================================
+
+Verifica que el cierre lee las tareas del sprint cursor a cursor, que la
+proyección conserva exactamente las propiedades del cierre y que el resumen por
+persona (ids + totales) da las mismas métricas que agrupar las páginas completas
+en listas, contra Notion simulado en memoria.
+
+EJECUCIÓN:
+python Test/sistema_cierre_sprint/test_tareas_del_sprint.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_cierre_sprint'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../sistema_monitoreo'))
+
+# sprint_automation escribe su log en el directorio actual al importarse
+_directorio_original = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="sprint_automation_"))
+try:
+    import sprint_automation
+finally:
+    os.chdir(_directorio_original)
+
+from sprint_automation import (
+    PROPIEDADES_CIERRE, calcular_metricas_persona, filtrar_tareas_para_metricas,
+    iterar_tareas_del_sprint, proyectar_tarea, resumir_tareas_por_persona
+)
+from notion_simulado import NotionSimulado, WorkspaceSimulado, DB_TAREAS
+
+# Páginas por respuesta de la consulta (la API usa 100)
+TAMANO_PAGINA = 3
+
+
+def preparar():
+    """Sprint con tareas planificadas, imprevistas, compartidas y sin asignar"""
+    ws = WorkspaceSimulado()
+    cliente = NotionSimulado(workspace=ws)
+    ana, _ = ws.crear_persona("Ana")
+    luis, _ = ws.crear_persona("Luis")
+    sprint = ws.crear_sprint("Sprint 1")
+    otro = ws.crear_sprint("Sprint 0", es_actual=False)
+
+    definicion = [
+        ([ana], "Media", "Listo", 3, 3, 1),
+        ([ana], "Alta", "En curso", 5, 0, 0),
+        ([ana, luis], "Imprevista", "Listo", 2, 2, 1),
+        ([luis], "Imprevista", "En curso", 8, 0, 0),
+        ([luis], "Baja", "Listo", 1, 1, 1),
+        ([], "Media", "Sin empezar", 4, 0, 0),
+        ([ana], "Media", "En curso", 2, 1, 0)
+    ]
+    for indice, (personas, prioridad, estado, carga, completada, hecha) in enumerate(definicion):
+        tarea = ws.crear_tarea(f"tarea {indice}", sprint, personas, prioridad=prioridad, estado=estado)
+        ws.editar(tarea, {
+            "Carga": {"formula": {"number": carga}},
+            "Carga Completada": {"formula": {"number": completada}},
+            "Completada": {"formula": {"number": hecha}}
+        }, "usuario")
+    ws.crear_tarea("de otro sprint", otro, [ana])
+
+    cursores = []
+    query = cliente.databases.query
+
+    def consultar(**kwargs):
+        cursores.append(kwargs.get("start_cursor"))
+        return query(**dict(kwargs, page_size=TAMANO_PAGINA))
+
+    cliente.databases.query = consultar
+    sprint_automation.notion = cliente
+    sprint_automation.DB_TAREAS_ID = DB_TAREAS
+    return ws, sprint, cursores, (ana, luis)
+
+
+def paginas_completas(ws, sprint):
+    """Tareas del sprint con todas sus propiedades, en una sola respuesta"""
+    return NotionSimulado(workspace=ws).databases.query(
+        database_id=DB_TAREAS, filter={"property": "Sprint", "relation": {"contains": sprint}}
+    )["results"]
+
+
+def test_pagina_por_cursores():
+    _, sprint, cursores, _ = preparar()
+    tareas = iterar_tareas_del_sprint(sprint)
+    primera = next(tareas)
+    # Generador: la primera tarea llega con solo la primera consulta hecha
+    assert cursores == [None] and primera["id"]
+
+    restantes = list(tareas)
+    assert len(restantes) == 6
+    assert cursores == [None, "3", "6"]
+
+
+def test_proyeccion_conserva_solo_propiedades_del_cierre():
+    ws, sprint, _, _ = preparar()
+    completas = paginas_completas(ws, sprint)
+    for tarea in iterar_tareas_del_sprint(sprint):
+        assert set(tarea) == {"id", "properties"}
+        assert set(tarea["properties"]) == set(PROPIEDADES_CIERRE)
+
+    completa = completas[0]
+    proyectada = proyectar_tarea(completa)
+    assert set(completa["properties"]) - set(PROPIEDADES_CIERRE)
+    assert all(proyectada["properties"][nombre] == completa["properties"][nombre] for nombre in PROPIEDADES_CIERRE)
+
+
+def test_resumen_igual_a_listas_de_tareas():
+    ws, sprint, _, (ana, luis) = preparar()
+    personas, sin_asignar = resumir_tareas_por_persona(iterar_tareas_del_sprint(sprint))
+    assert sin_asignar == 1 and set(personas) == {ana, luis}
+
+    # Camino con listas de páginas completas por persona
+    completas = paginas_completas(ws, sprint)
+    for persona_id, resumen in personas.items():
+        de_la_persona = [tarea for tarea in completas
+                         if {"id": persona_id} in tarea["properties"]["Personas"]["relation"]]
+        filtradas, excluidas = filtrar_tareas_para_metricas(de_la_persona)
+        metricas = calcular_metricas_persona(filtradas)
+
+        assert resumen["tareas_ids"] == [tarea["id"] for tarea in de_la_persona]
+        assert resumen["excluidas"] == len(excluidas)
+        assert {clave: resumen[clave] for clave in metricas} == metricas
+
+    assert personas[ana]["carga_asignada"] == 12 and personas[ana]["tareas_completadas"] == 2
+    assert personas[luis]["excluidas"] == 1 and personas[luis]["tareas_totales"] == 2
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
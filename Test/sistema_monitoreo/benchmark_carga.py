@@ -0,0 +1,408 @@
+"""
+Benchmark de Carga - WEBHOOKS SINTÉTICOS CONTRA NOTION SIMULADO
+================================================================
+
+Genera una mezcla realista de webhooks para un workspace del tamaño indicado y la
+envía a webhook_server.py (Flask test client, sin red) con TaskMonitorReactivo
+procesando contra un cliente Notion en memoria (notion_simulado.py).
+
+MEZCLA DE EVENTOS:
+- Cambios de Estado (monitoreado, solo se registra)
+- Cambios de Prioridad / Tamaño / Nombre / Personas (monitoreados, pueden revertirse)
+- Cambios en propiedades no monitoreadas (Notas)
+- Tareas creadas después del día 4 (se convierten a Imprevista)
+- Eliminaciones de tareas imprevistas y planificadas
+- Ecos generados por el bot de la integración (anti-bucle)
+- Reentregas de Notion (mismo id de evento, minutos después)
+Parte de los eventos llegan en ráfagas de la misma página (como envía Notion).
+
+REPORTA:
+- Eventos/s sostenidos (procesados de punta a punta)
+- Percentiles de latencia extremo a extremo (POST → fin de procesamiento)
+- Crecimiento de memoria (RSS) durante la corrida simulada
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/benchmark_carga.py                                   # 1 hora simulada, velocidad máxima
+python Test/sistema_monitoreo/benchmark_carga.py --tareas 20000 --eventos-por-minuto 600
+python Test/sistema_monitoreo/benchmark_carga.py --velocidad 60 --latencia-notion-ms 150
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from collections import deque
+
+DIRECTORIO_MONITOREO = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+sys.path.append(DIRECTORIO_MONITOREO)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from notion_simulado import (
+    NotionSimulado, WorkspaceSimulado, DB_TAREAS, DB_SPRINTS, DB_PERSONAS, DB_LOG, BOT_ID,
+    ESQUEMA_TAREAS, ahora_iso, nuevo_id
+)
+
+logger = logging.getLogger("benchmark_carga")
+
+ESTADOS = ["Sin empezar", "En curso", "En revisión", "Listo"]
+PRIORIDADES = ["Alta", "Media", "Baja"]
+TAMANOS = ["XS", "S", "M", "L", "XL"]
+
+# Peso relativo de cada tipo de acción en la mezcla
+MEZCLA = {
+    "estado": 40,
+    "prioridad": 6,
+    "tamano": 5,
+    "nombre": 4,
+    "personas": 5,
+    "no_monitoreada": 15,
+    "creacion": 4,
+    "eliminacion": 3,
+    "eco_bot": 18,
+    "reentrega": 3
+}
+
+# Probabilidad de que una edición llegue como ráfaga de varios webhooks
+PROBABILIDAD_RAFAGA = 0.3
+
+
+def webhook(tipo, page_id, autor, propiedades=None, bot=False, con_parent=True):
+    """Payload con la estructura de los webhooks de Notion"""
+    data = {}
+    if con_parent:
+        data["parent"] = {"id": DB_TAREAS, "type": "database"}
+    if propiedades:
+        data["updated_properties"] = propiedades
+    return {
+        "id": nuevo_id(),
+        "timestamp": ahora_iso(),
+        "type": tipo,
+        "integration_id": BOT_ID,
+        "authors": [{"id": autor, "type": "bot" if bot else "person"}],
+        "entity": {"id": page_id, "type": "page"},
+        "data": data
+    }
+
+
+class GeneradorEventos:
+    """Genera acciones de usuario + webhooks sobre un WorkspaceSimulado"""
+
+    def __init__(self, workspace, sprint_id, personas, usuarios, tareas, dia_sprint, semilla=7):
+        self.ws = workspace
+        self.sprint_id = sprint_id
+        self.personas = personas
+        self.usuarios = usuarios
+        self.tareas = tareas
+        self.dia_sprint = dia_sprint
+        self.random = random.Random(semilla)
+        self.acciones = list(MEZCLA)
+        self.pesos = [MEZCLA[a] for a in self.acciones]
+        self.enviados_recientes = deque(maxlen=500)
+
+    def tarea_al_azar(self):
+        return self.tareas[self.random.randrange(len(self.tareas))] if self.tareas else None
+
+    def quitar_tarea(self, tarea_id):
+        indice = self.tareas.index(tarea_id)
+        self.tareas[indice] = self.tareas[-1]
+        self.tareas.pop()
+
+    def programar(self, duracion_simulada, eventos_por_minuto):
+        """Instantes (s simulados) y acción de cada evento: llegadas de Poisson"""
+        tasa = eventos_por_minuto / 60
+        t = 0.0
+        while True:
+            t += self.random.expovariate(tasa)
+            if t >= duracion_simulada:
+                return
+            yield t, self.random.choices(self.acciones, self.pesos)[0]
+
+    def ejecutar(self, accion):
+        """Aplica la edición en el workspace y devuelve los webhooks que enviaría Notion"""
+        usuario = self.random.choice(self.usuarios)
+        r = self.random
+
+        if accion == "reentrega":
+            # Notion reenvía el mismo payload si no respondimos a tiempo
+            return [r.choice(self.enviados_recientes)] if self.enviados_recientes else []
+
+        if accion == "creacion":
+            tarea_id = self.ws.crear_tarea(
+                f"Tarea nueva {r.randrange(10**6)}", self.sprint_id, [r.choice(self.personas)],
+                prioridad=r.choice(PRIORIDADES), dias_transcurridos=self.dia_sprint, editor=usuario
+            )
+            self.tareas.append(tarea_id)
+            return [webhook("page.created", tarea_id, usuario)]
+
+        tarea_id = self.tarea_al_azar()
+        if tarea_id is None:
+            return []
+
+        if accion == "eliminacion":
+            self.quitar_tarea(tarea_id)
+            self.ws.eliminar(tarea_id)
+            return [webhook("page.deleted", tarea_id, usuario, con_parent=False)]
+
+        if accion == "eco_bot":
+            return [webhook("page.properties_updated", tarea_id, BOT_ID, ["est1"], bot=True)]
+
+        if accion == "estado":
+            cambios = {"Estado": {"status": {"name": r.choice(ESTADOS)}}}
+        elif accion == "prioridad":
+            cambios = {"Prioridad": {"select": {"name": r.choice(PRIORIDADES + ["Imprevista"])}}}
+        elif accion == "tamano":
+            cambios = {"Tamaño": {"select": {"name": r.choice(TAMANOS)}}}
+        elif accion == "nombre":
+            cambios = {"Nombre": {"title": [{"text": {"content": f"Renombrada {r.randrange(10**6)}"}}]}}
+        elif accion == "personas":
+            asignadas = [] if r.random() < 0.3 else r.sample(self.personas, r.randint(1, 2))
+            cambios = {"Personas": {"relation": [{"id": p} for p in asignadas]}}
+        else:
+            cambios = {"Notas": {"rich_text": [{"text": {"content": f"Nota {r.randrange(10**6)}"}}]}}
+
+        if not self.ws.editar(tarea_id, cambios, usuario):
+            return []
+
+        ids = [ESQUEMA_TAREAS[nombre][0] for nombre in cambios]
+        eventos = [webhook("page.properties_updated", tarea_id, usuario, ids)]
+        if r.random() < PROBABILIDAD_RAFAGA:
+            eventos.extend(webhook("page.properties_updated", tarea_id, usuario, ids) for _ in range(r.randint(1, 2)))
+        return eventos
+
+
+def rss_mb():
+    """Memoria residente actual del proceso (MB)"""
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(muestras):
+    if not muestras:
+        return {"muestras": 0}
+    muestras = sorted(muestras)
+
+    def p(q):
+        return round(muestras[min(len(muestras) - 1, int(q * len(muestras)))] * 1000, 2)
+
+    return {"muestras": len(muestras), "p50": p(0.50), "p95": p(0.95), "p99": p(0.99), "max": p(1.0)}
+
+
+def construir_workspace(num_tareas, num_personas, dia_sprint, latencia_ms, semilla=7):
+    """Workspace con un sprint monitoreado, personas y tareas"""
+    ws = WorkspaceSimulado(latencia_ms)
+    r = random.Random(semilla)
+    sprint_id = ws.crear_sprint("Sprint 1")
+    personas, usuarios = [], []
+    for i in range(num_personas):
+        persona_id, usuario_id = ws.crear_persona(f"Persona {i}")
+        personas.append(persona_id)
+        usuarios.append(usuario_id)
+    tareas = [
+        ws.crear_tarea(
+            f"Tarea {i}", sprint_id, r.sample(personas, r.randint(1, 2)),
+            prioridad="Imprevista" if r.random() < 0.1 else r.choice(PRIORIDADES),
+            estado=r.choice(ESTADOS), tamano=r.choice(TAMANOS), dias_transcurridos=dia_sprint
+        )
+        for i in range(num_tareas)
+    ]
+    return ws, sprint_id, personas, usuarios, tareas
+
+
+def ejecutar_benchmark(args):
+    directorio = tempfile.mkdtemp(prefix="benchmark_webhooks_")
+    os.chdir(directorio)
+
+    # Configuración del servidor antes de importarlo (lee variables al importar)
+    os.environ.update({
+        "NOTION_TOKEN": "benchmark",
+        "DB_TAREAS_ID": DB_TAREAS,
+        "DB_SPRINTS_ID": DB_SPRINTS,
+        "DB_PERSONAS_ID": DB_PERSONAS,
+        "DB_LOG_MODIFICACIONES_ID": DB_LOG,
+        "WEBHOOK_SHARDS": str(args.shards),
+        "WEBHOOK_MAX_COLA": str(args.max_cola),
+        "WEBHOOK_COLA_DURABLE": os.path.join(directorio, "webhook_eventos.db"),
+        "WEBHOOK_VENTANA_COALESCENCIA": str(args.ventana_coalescencia)
+    })
+
+    import task_monitor
+    from metricas import instrumentar_cliente_notion
+    from snapshot_store import SnapshotTarea, escribir_snapshots
+
+    ws, sprint_id, personas, usuarios, tareas = construir_workspace(
+        args.tareas, args.personas, args.dia_sprint, args.latencia_notion_ms
+    )
+    task_monitor.notion = instrumentar_cliente_notion(NotionSimulado(workspace=ws))
+
+    import webhook_server
+
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    monitor = webhook_server.monitor
+    processor = webhook_server.processor
+
+    # Snapshot global inicial (equivalente a setup_monitoring.py)
+    timestamp = ahora_iso()
+    escribir_snapshots(
+        SnapshotTarea.desde_valores(t, monitor.valores_monitoreados(ws.paginas[t]), timestamp, ws.paginas[t]["last_edited_time"])
+        for t in tareas
+    )
+
+    monitor.inicializar()
+    if processor.ventana_coalescencia > 0:
+        monitor.ventana_duplicados = 0
+    processor.iniciar_cola_durable()
+
+    # Latencia extremo a extremo por id de webhook (incluye eventos fusionados)
+    enviados_en = {}
+    fusionados = {}
+    latencias = []
+
+    fusionar_original = processor.fusionar_eventos
+    procesar_original = processor.procesar_evento_tarea
+
+    def fusionar_medido(evento_base, evento_nuevo):
+        fusionados.setdefault(evento_base.get("id"), []).append(evento_nuevo.get("id"))
+        fusionar_original(evento_base, evento_nuevo)
+
+    def procesar_medido(evento):
+        procesar_original(evento)
+        fin = time.perf_counter()
+        for id_evento in [evento.get("id")] + fusionados.pop(evento.get("id"), []):
+            inicio = enviados_en.pop(id_evento, None)
+            if inicio is not None:
+                latencias.append(fin - inicio)
+
+    processor.fusionar_eventos = fusionar_medido
+    processor.procesar_evento_tarea = procesar_medido
+    webhook_server.iniciar_worker()
+
+    # Muestreo de memoria en segundo plano
+    memoria = {"inicio": rss_mb(), "max": rss_mb()}
+    midiendo = threading.Event()
+
+    def muestrear_memoria():
+        while not midiendo.wait(0.5):
+            memoria["max"] = max(memoria["max"], rss_mb())
+
+    threading.Thread(target=muestrear_memoria, daemon=True).start()
+
+    generador = GeneradorEventos(ws, sprint_id, personas, usuarios, list(tareas), args.dia_sprint)
+    programa = list(generador.programar(args.duracion_simulada, args.eventos_por_minuto))
+    cliente = webhook_server.app.test_client()
+    codigos = {}
+    enviados = 0
+
+    logger.info(f"🚀 {len(programa)} acciones en {args.duracion_simulada}s simulados "
+                f"({args.tareas} tareas, velocidad {args.velocidad})")
+
+    inicio = time.perf_counter()
+    velocidad = None if args.velocidad == "max" else float(args.velocidad)
+    siguiente_reporte = 0.1
+
+    for i, (t_simulado, accion) in enumerate(programa):
+        if velocidad:
+            espera = t_simulado / velocidad - (time.perf_counter() - inicio)
+            if espera > 0:
+                time.sleep(espera)
+
+        for payload in generador.ejecutar(accion):
+            enviados_en.setdefault(payload["id"], time.perf_counter())
+            generador.enviados_recientes.append(payload)
+            respuesta = cliente.post("/webhook", json=payload)
+            codigos[respuesta.status_code] = codigos.get(respuesta.status_code, 0) + 1
+            enviados += 1
+            estado = respuesta.get_json().get("status") if respuesta.status_code == 200 else None
+            # Una reentrega no reinicia la medición del evento original aún en proceso
+            if estado not in ("received", "duplicate_delivery"):
+                enviados_en.pop(payload["id"], None)
+
+        if (i + 1) / len(programa) >= siguiente_reporte:
+            logger.info(f"   {int(siguiente_reporte * 100)}% | enviados {enviados} | "
+                        f"en cola {processor.eventos_pendientes()} | RSS {rss_mb():.1f} MB")
+            siguiente_reporte += 0.1
+
+    fin_envio = time.perf_counter()
+
+    # Esperar a que se vacíen las colas (los workers procesan lo retenido al detenerse)
+    while processor.eventos_pendientes() > 0:
+        time.sleep(0.05)
+    processor.detener_workers()
+    processor.cola_durable.detener()
+    fin = time.perf_counter()
+    midiendo.set()
+
+    memoria["fin"] = rss_mb()
+    memoria["max"] = max(memoria["max"], memoria["fin"])
+    duracion = fin - inicio
+
+    return {
+        "workspace": {"tareas": args.tareas, "personas": args.personas, "dia_sprint": args.dia_sprint},
+        "duracion_simulada_s": args.duracion_simulada,
+        "duracion_real_s": round(duracion, 2),
+        "webhooks_enviados": enviados,
+        "codigos_http": codigos,
+        "ingesta_eventos_por_segundo": round(enviados / (fin_envio - inicio), 1),
+        "procesados_extremo_a_extremo": len(latencias),
+        "eventos_por_segundo_sostenidos": round(len(latencias) / duracion, 1),
+        "eventos_coalescidos": processor.eventos_coalescidos,
+        "reentregas_ignoradas": processor.eventos_reentregados,
+        "eventos_descartados": processor.eventos_descartados,
+        "latencia_extremo_a_extremo_ms": percentiles(latencias),
+        "latencia_cola_ms": processor.percentiles_latencia_cola(),
+        "llamadas_notion": ws.llamadas,
+        "memoria_mb": {
+            "inicio": round(memoria["inicio"], 1),
+            "fin": round(memoria["fin"], 1),
+            "max": round(memoria["max"], 1),
+            "crecimiento": round(memoria["fin"] - memoria["inicio"], 1)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga del servidor de webhooks")
+    parser.add_argument("--tareas", type=int, default=5000)
+    parser.add_argument("--personas", type=int, default=30)
+    parser.add_argument("--dia-sprint", type=int, default=6, help="Días transcurridos (>4 = período bloqueado)")
+    parser.add_argument("--eventos-por-minuto", type=float, default=300)
+    parser.add_argument("--duracion-simulada", type=float, default=3600, help="Segundos simulados")
+    parser.add_argument("--velocidad", default="max", help="Factor de aceleración o 'max'")
+    parser.add_argument("--latencia-notion-ms", type=float, default=0)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--max-cola", type=int, default=0, help="0 = ingesta sin límite")
+    parser.add_argument("--ventana-coalescencia", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="Imprimir resultado como JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [BENCH] - %(levelname)s - %(message)s')
+    logger.setLevel(logging.INFO)
+
+    resultado = ejecutar_benchmark(args)
+
+    if args.json:
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+        return
+
+    logger.info("=" * 60)
+    logger.info("📊 RESULTADO DEL BENCHMARK")
+    logger.info("=" * 60)
+    for clave, valor in resultado.items():
+        logger.info(f"   {clave}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Notion Simulado - CLIENTE EN MEMORIA PARA PRUEBAS OFFLINE
+=========================================================
+
+Reemplazo del cliente notion_client.Client con un workspace en memoria
+(Sprints, Tareas, Personas, Log Modificaciones). Implementa solo los endpoints
+que usan el monitor y el setup: pages.retrieve/update/create y
+databases.query/retrieve, con latencia artificial opcional.
+
+USO:
+    import task_monitor
+    task_monitor.notion = NotionSimulado(latencia_ms=0)
+"""
+
+import copy
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+
+DB_SPRINTS = "db-sprints"
+DB_TAREAS = "db-tareas"
+DB_PERSONAS = "db-personas"
+DB_LOG = "db-log"
+
+BOT_ID = "bot-integracion"
+
+# Nombre de propiedad → (id en el esquema, tipo)
+ESQUEMA_TAREAS = {
+    "Nombre": ("title", "title"),
+    "Estado": ("est1", "status"),
+    "Prioridad": ("pri1", "select"),
+    "Tamaño": ("tam1", "select"),
+    "Personas": ("per1", "relation"),
+    "Sprint": ("spr1", "relation"),
+    "Notas": ("not1", "rich_text"),
+    "Días Transcurridos Sprint": ("dia1", "formula"),
+    "Violaciones Detectadas": ("vio1", "number")
+}
+
+
+class ErrorNotionSimulado(Exception):
+    """Equivalente a APIResponseError (p.ej. página eliminada)"""
+
+
+def ahora_iso():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def nuevo_id():
+    return str(uuid.uuid4())
+
+
+def titulo(texto):
+    return [{"type": "text", "text": {"content": texto}, "plain_text": texto}]
+
+
+class WorkspaceSimulado:
+    """Estado del workspace compartido por los endpoints"""
+
+    def __init__(self, latencia_ms=0):
+        self.latencia = latencia_ms / 1000
+        self.paginas = {}
+        self.lock = threading.Lock()
+        self.llamadas = 0
+
+    def esperar(self):
+        self.llamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    # ---------- construcción del workspace ----------
+
+    def crear_persona(self, nombre):
+        persona_id = nuevo_id()
+        usuario_id = nuevo_id()
+        self.paginas[persona_id] = {
+            "object": "page",
+            "id": persona_id,
+            "parent": {"type": "database_id", "database_id": DB_PERSONAS},
+            "created_time": ahora_iso(),
+            "last_edited_time": ahora_iso(),
+            "properties": {
+                "Nombre": {"id": "title", "type": "title", "title": titulo(nombre)},
+                "Cuenta Notion": {"id": "cue1", "type": "people", "people": [{"object": "user", "id": usuario_id}]}
+            }
+        }
+        return persona_id, usuario_id
+
+    def crear_sprint(self, nombre, monitoreo_activo=True, es_actual=True, fecha_fin="2025-06-30"):
+        sprint_id = nuevo_id()
+        self.paginas[sprint_id] = {
+            "object": "page",
+            "id": sprint_id,
+            "parent": {"type": "database_id", "database_id": DB_SPRINTS},
+            "created_time": ahora_iso(),
+            "last_edited_time": ahora_iso(),
+            "properties": {
+                "Nombre": {"id": "title", "type": "title", "title": titulo(nombre)},
+                "Monitoreo Activo": {"id": "mon1", "type": "checkbox", "checkbox": monitoreo_activo},
+                "Es Actual": {"id": "act1", "type": "formula", "formula": {"type": "boolean", "boolean": es_actual}},
+                "Fecha Fin": {"id": "fin1", "type": "date", "date": {"start": fecha_fin}}
+            }
+        }
+        return sprint_id
+
+    def crear_tarea(self, nombre, sprint_id, personas, prioridad="Media", estado="Sin empezar",
+                    tamano="M", dias_transcurridos=0, editor=None):
+        tarea_id = nuevo_id()
+        self.paginas[tarea_id] = {
+            "object": "page",
+            "id": tarea_id,
+            "parent": {"type": "database_id", "database_id": DB_TAREAS},
+            "created_time": ahora_iso(),
+            "last_edited_time": ahora_iso(),
+            "last_edited_by": {"object": "user", "id": editor or BOT_ID},
+            "properties": {
+                "Nombre": {"id": "title", "type": "title", "title": titulo(nombre)},
+                "Estado": {"id": "est1", "type": "status", "status": {"name": estado}},
+                "Prioridad": {"id": "pri1", "type": "select", "select": {"name": prioridad} if prioridad else None},
+                "Tamaño": {"id": "tam1", "type": "select", "select": {"name": tamano} if tamano else None},
+                "Personas": {"id": "per1", "type": "relation", "relation": [{"id": p} for p in personas]},
+                "Sprint": {"id": "spr1", "type": "relation", "relation": [{"id": sprint_id}]},
+                "Notas": {"id": "not1", "type": "rich_text", "rich_text": []},
+                "Días Transcurridos Sprint": {"id": "dia1", "type": "formula", "formula": {"type": "number", "number": dias_transcurridos}},
+                "Violaciones Detectadas": {"id": "vio1", "type": "number", "number": 0}
+            }
+        }
+        return tarea_id
+
+    # ---------- ediciones de usuario (las que originan webhooks) ----------
+
+    def editar(self, page_id, propiedades, editor):
+        """Aplica una edición como la haría un usuario en la UI"""
+        with self.lock:
+            pagina = self.paginas.get(page_id)
+            if pagina is None:
+                return False
+            aplicar_propiedades(pagina, propiedades)
+            pagina["last_edited_time"] = ahora_iso()
+            pagina["last_edited_by"] = {"object": "user", "id": editor}
+            return True
+
+    def eliminar(self, page_id):
+        with self.lock:
+            return self.paginas.pop(page_id, None) is not None
+
+
+def aplicar_propiedades(pagina, propiedades):
+    """Aplica un payload de propiedades con el formato de pages.update"""
+    for nombre, valor in propiedades.items():
+        destino = pagina["properties"].setdefault(nombre, {"id": nombre, "type": next(iter(valor))})
+        for tipo, contenido in valor.items():
+            if tipo == "title" or tipo == "rich_text":
+                contenido = [
+                    {"type": "text", "text": {"content": t["text"]["content"]}, "plain_text": t["text"]["content"]}
+                    for t in contenido
+                ]
+            destino[tipo] = contenido
+
+
+class _Paginas:
+    def __init__(self, workspace):
+        self.ws = workspace
+
+    def retrieve(self, page_id=None, **kwargs):
+        page_id = page_id or kwargs.get("page_id")
+        self.ws.esperar()
+        with self.ws.lock:
+            pagina = self.ws.paginas.get(page_id)
+            if pagina is None:
+                raise ErrorNotionSimulado(f"Could not find page with ID: {page_id}")
+            return copy.deepcopy(pagina)
+
+    def update(self, page_id=None, properties=None, **kwargs):
+        page_id = page_id or kwargs.get("page_id")
+        self.ws.esperar()
+        with self.ws.lock:
+            pagina = self.ws.paginas.get(page_id)
+            if pagina is None:
+                raise ErrorNotionSimulado(f"Could not find page with ID: {page_id}")
+            aplicar_propiedades(pagina, properties or {})
+            pagina["last_edited_time"] = ahora_iso()
+            pagina["last_edited_by"] = {"object": "user", "id": BOT_ID}
+            return copy.deepcopy(pagina)
+
+    def create(self, parent=None, properties=None, **kwargs):
+        self.ws.esperar()
+        page_id = nuevo_id()
+        pagina = {
+            "object": "page",
+            "id": page_id,
+            "parent": {"type": "database_id", "database_id": parent.get("database_id")},
+            "created_time": ahora_iso(),
+            "last_edited_time": ahora_iso(),
+            "last_edited_by": {"object": "user", "id": BOT_ID},
+            "properties": {}
+        }
+        aplicar_propiedades(pagina, properties or {})
+        with self.ws.lock:
+            self.ws.paginas[page_id] = pagina
+        return copy.deepcopy(pagina)
+
+
+class _Databases:
+    def __init__(self, workspace):
+        self.ws = workspace
+
+    def retrieve(self, database_id=None, **kwargs):
+        self.ws.esperar()
+        if database_id == DB_TAREAS:
+            propiedades = {nombre: {"id": pid, "type": tipo, "name": nombre} for nombre, (pid, tipo) in ESQUEMA_TAREAS.items()}
+        else:
+            propiedades = {}
+        return {"object": "database", "id": database_id, "properties": propiedades}
+
+    def query(self, database_id=None, start_cursor=None, page_size=100, filter=None, sorts=None,
+              filter_properties=None, **kwargs):
+        """Consulta paginada; soporta los filtros, el orden por fecha y filter_properties que usa setup"""
+        self.ws.esperar()
+        with self.ws.lock:
+            resultados = [
+                p for p in self.ws.paginas.values()
+                if p["parent"].get("database_id") == database_id and _cumple_filtro(p, filter)
+            ]
+            for orden in reversed(sorts or []):
+                resultados = _ordenar(resultados, orden)
+            inicio = int(start_cursor or 0)
+            pagina = copy.deepcopy(resultados[inicio:inicio + page_size])
+            siguiente = inicio + page_size
+            if filter_properties is not None:
+                # Como la API: la respuesta solo trae las propiedades pedidas (por id)
+                for resultado in pagina:
+                    resultado["properties"] = {
+                        nombre: valor for nombre, valor in resultado["properties"].items()
+                        if ESQUEMA_TAREAS.get(nombre, (nombre,))[0] in filter_properties
+                    }
+            return {
+                "object": "list",
+                "results": pagina,
+                "has_more": siguiente < len(resultados),
+                "next_cursor": str(siguiente) if siguiente < len(resultados) else None
+            }
+
+
+def _cumple_filtro(pagina, filtro):
+    if not filtro:
+        return True
+    if "or" in filtro:
+        return any(_cumple_filtro(pagina, f) for f in filtro["or"])
+    if "and" in filtro:
+        return all(_cumple_filtro(pagina, f) for f in filtro["and"])
+    if "timestamp" in filtro:
+        # Mismo formato ISO con milisegundos: la comparación de texto es cronológica
+        condicion = filtro[filtro["timestamp"]]
+        valor = pagina[filtro["timestamp"]]
+        if "on_or_after" in condicion:
+            return valor >= condicion["on_or_after"]
+        if "after" in condicion:
+            return valor > condicion["after"]
+    propiedad = pagina["properties"].get(filtro.get("property"), {})
+    if "relation" in filtro:
+        ids = [r["id"] for r in propiedad.get("relation", [])]
+        return filtro["relation"].get("contains") in ids
+    if "checkbox" in filtro:
+        return propiedad.get("checkbox") == filtro["checkbox"].get("equals")
+    if "formula" in filtro:
+        condicion = filtro["formula"].get("checkbox", {})
+        return (propiedad.get("formula") or {}).get("boolean") == condicion.get("equals")
+    if "date" in filtro:
+        fecha = (propiedad.get("date") or {}).get("start")
+        if "before" in filtro["date"]:
+            return fecha is not None and fecha < filtro["date"]["before"]
+        if "after" in filtro["date"]:
+            return fecha is not None and fecha > filtro["date"]["after"]
+    return True
+
+
+def _ordenar(paginas, orden):
+    """Orden por propiedad de fecha; como en Notion, las vacías van al final"""
+    def fecha(pagina):
+        return (pagina["properties"].get(orden["property"], {}).get("date") or {}).get("start")
+
+    con_fecha = sorted((p for p in paginas if fecha(p)), key=fecha, reverse=orden.get("direction") == "descending")
+    return con_fecha + [p for p in paginas if not fecha(p)]
+
+
+class NotionSimulado:
+    """Cliente compatible con notion_client.Client para pruebas y benchmarks"""
+
+    def __init__(self, latencia_ms=0, workspace=None):
+        self.workspace = workspace or WorkspaceSimulado(latencia_ms)
+        self.pages = _Paginas(self.workspace)
+        self.databases = _Databases(self.workspace)
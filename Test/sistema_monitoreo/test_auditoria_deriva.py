@@ -0,0 +1,111 @@
+"""
+Test de Auditoría de Deriva
+===========================
+
+Verifica que la comparación columnar entre snapshots y tareas actuales encuentra
+cada campo desfasado y que su clasificación coincide con la decisión de
+procesar_cambio_propiedad (revertir o permitir), sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_auditoria_deriva.py
+"""
+
+import os
+import sys
+import uuid
+import itertools
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from auditoria_deriva import auditar, snapshots_a_tabla, tareas_a_tabla
+from snapshot_store import SnapshotTarea
+from task_monitor import TaskMonitorReactivo
+
+P1 = str(uuid.uuid4())
+P2 = str(uuid.uuid4())
+
+BASE = {"Nombre": "Tarea", "Personas": [P1], "Prioridad": "Media", "Tamaño": "S", "Estado": "Sin empezar"}
+
+# (propiedad, valor en snapshot, valor actual)
+CAMBIOS = [
+    ("Nombre", "Tarea", "Tarea renombrada"),
+    ("Personas", [P1], []),
+    ("Personas", [P1], [P2]),
+    ("Personas", None, []),
+    ("Prioridad", "Media", "Alta"),
+    ("Prioridad", "Media", "Imprevista"),
+    ("Prioridad", "Imprevista", "Alta"),
+    ("Prioridad", None, "Alta"),
+    ("Tamaño", "S", "M"),
+    ("Estado", "Sin empezar", "Listo"),
+]
+
+
+def pagina(tarea_id, valores, dias):
+    """Página de Notion con los campos que leen el monitor y la auditoría"""
+    return {
+        "id": tarea_id,
+        "last_edited_by": {"object": "user", "id": "usuario"},
+        "properties": {
+            "Nombre": {"title": [{"text": {"content": valores["Nombre"]}}]},
+            "Personas": {"relation": [{"id": p} for p in valores["Personas"] or []]},
+            "Prioridad": {"select": {"name": valores["Prioridad"]} if valores["Prioridad"] else None},
+            "Tamaño": {"select": {"name": valores["Tamaño"]}},
+            "Estado": {"status": {"name": valores["Estado"]}},
+            "Días Transcurridos Sprint": {"formula": {"number": dias}}
+        }
+    }
+
+
+def monitor_sin_efectos():
+    monitor = TaskMonitorReactivo()
+    monitor.revertir_cambio_directo = lambda *args: True
+    monitor.incrementar_contador_violaciones_directo = lambda *args: None
+    monitor.registrar_en_log = lambda *args: None
+    monitor.get_usuario_modificacion = lambda tarea: "Usuario"
+    return monitor
+
+
+def test_clasificacion_coincide_con_el_monitor():
+    monitor = monitor_sin_efectos()
+    snapshots, paginas, esperado = [], [], {}
+
+    for (propiedad, anterior, actual), dias, prioridad in itertools.product(CAMBIOS, (2, 6), ("Media", "Imprevista")):
+        if propiedad == "Prioridad" and prioridad != "Media":
+            continue
+        tarea_id = str(uuid.uuid4())
+        valores_actuales = dict(BASE, **{propiedad: actual}) if propiedad == "Prioridad" else \
+            dict(BASE, Prioridad=prioridad, **{propiedad: actual})
+        valores_snapshot = dict(valores_actuales, **{propiedad: anterior})
+        snapshots.append(SnapshotTarea.desde_valores(tarea_id, valores_snapshot, None, None))
+        paginas.append(pagina(tarea_id, valores_actuales, dias))
+
+        resultado = monitor.procesar_cambio_propiedad(paginas[-1], propiedad, anterior, actual)
+        esperado[tarea_id] = resultado == "revertido"
+
+    reporte, resumen = auditar(snapshots_a_tabla(snapshots), tareas_a_tabla(paginas, monitor))
+
+    # Exactamente una deriva por tarea, con la misma decisión que el monitor
+    assert len(reporte) == len(esperado) == resumen["tareas_con_deriva"]
+    obtenido = dict(zip(reporte["tarea_id"], reporte["revertiria"]))
+    assert obtenido == esperado
+    assert resumen["reversiones"] == sum(esperado.values()) > 0
+
+
+def test_tareas_sin_cambios_y_ausentes():
+    iguales = str(uuid.uuid4())
+    solo_snapshot = str(uuid.uuid4())
+    solo_actual = str(uuid.uuid4())
+    snapshots = [SnapshotTarea.desde_valores(t, BASE, None, None) for t in (iguales, solo_snapshot)]
+    paginas = [pagina(t, BASE, 6) for t in (iguales, solo_actual)]
+
+    reporte, resumen = auditar(snapshots_a_tabla(snapshots), tareas_a_tabla(paginas, monitor_sin_efectos()))
+    assert reporte.empty
+    assert resumen["sin_snapshot"] == 1 and resumen["ausentes_en_exportacion"] == 1
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
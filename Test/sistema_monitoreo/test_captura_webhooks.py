@@ -0,0 +1,169 @@
+"""
+Test de Captura y Replay de Webhooks
+====================================
+
+Verifica la captura en segundo plano (varias sesiones en un mismo archivo), la
+lectura de capturas truncadas, el escalado de tiempos del replay, que los
+webhooks de una misma página se reenvían en el orden capturado aunque haya
+envíos simultáneos y que cada corrida usa ids de evento propios (salvo
+--conservar-ids), sin servidor ni red.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_captura_webhooks.py
+"""
+
+import os
+import sys
+import gzip
+import hmac
+import json
+import time
+import random
+import tempfile
+import hashlib
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from captura_webhooks import HEADER_FIRMA, CapturaWebhooks, leer_captura, reproducir
+from idempotencia import IndiceIdempotencia
+
+
+def cuerpo(page_id, secuencia=0):
+    return json.dumps({"type": "page.properties_updated", "entity": {"id": page_id}, "secuencia": secuencia})
+
+
+def test_captura_agrega_sesiones():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "captura.jsonl.gz")
+        captura = CapturaWebhooks(ruta, intervalo_flush=0.05)
+        captura.registrar(cuerpo("pagina-1").encode("utf-8"), "sha256=firma")
+        captura.registrar(cuerpo("pagina-2"))
+        captura.cerrar()
+        assert captura.registros_capturados == 2
+
+        # Reinicio del servidor: la sesión nueva se agrega al mismo archivo
+        segunda = CapturaWebhooks(ruta)
+        segunda.registrar(cuerpo("pagina-3"))
+        segunda.cerrar()
+
+        registros = list(leer_captura(ruta))
+        assert [json.loads(r["body"])["entity"]["id"] for r in registros] == ["pagina-1", "pagina-2", "pagina-3"]
+        assert registros[0]["firma"] == "sha256=firma" and registros[1]["firma"] is None
+        assert registros[0]["t"] <= registros[1]["t"] <= registros[2]["t"]
+
+
+def test_leer_captura_truncada():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "captura.jsonl.gz")
+        captura = CapturaWebhooks(ruta, registros_por_flush=1)
+        for secuencia in range(3):
+            captura.registrar(cuerpo("pagina-1", secuencia))
+        captura.cerrar()
+
+        # Servidor detenido sin cerrar el gzip: falta el final del flujo
+        with open(ruta, "rb") as archivo:
+            datos = archivo.read()
+        with open(ruta, "wb") as archivo:
+            archivo.write(datos[:-8])
+        assert [json.loads(r["body"])["secuencia"] for r in leer_captura(ruta)] == [0, 1, 2]
+
+        # Última línea a medio escribir
+        with gzip.open(ruta, "wt", encoding="utf-8") as archivo:
+            archivo.write(json.dumps({"t": 1.0, "firma": None, "body": cuerpo("pagina-1")}) + "\n")
+            archivo.write('{"t": 2.0, "firma": nu')
+        assert len(list(leer_captura(ruta))) == 1
+
+
+def test_reproducir_escala_los_tiempos():
+    registros = [{"t": 100.0 + offset, "firma": None, "body": cuerpo(f"pagina-{i}")}
+                 for i, offset in enumerate((0.0, 0.2, 0.4))]
+    enviados = []
+
+    def enviar(body, headers):
+        enviados.append(time.perf_counter())
+        return 200
+
+    inicio = time.perf_counter()
+    resumen = reproducir(registros, enviar, velocidad=2)
+    offsets = [t - inicio for t in enviados]
+    # Intervalos originales divididos por la velocidad: 0, 0.1 y 0.2 s
+    for offset, objetivo in zip(sorted(offsets), (0.0, 0.1, 0.2)):
+        assert objetivo - 0.01 <= offset < objetivo + 0.08
+    assert resumen["enviados"] == 3 and resumen["codigos"] == {"200": 3}
+    assert resumen["duracion_original_s"] == 0.4
+
+    enviados.clear()
+    inicio = time.perf_counter()
+    reproducir(registros, enviar, velocidad=None)
+    assert max(enviados) - inicio < 0.1
+
+
+def test_reproducir_conserva_el_orden_por_pagina():
+    paginas = [f"pagina-{i}" for i in range(6)]
+    registros = [{"t": 0.0, "firma": "sha256=firma", "body": cuerpo(page_id, secuencia)}
+                 for secuencia in range(30) for page_id in paginas]
+    recibidos = {page_id: [] for page_id in paginas}
+    lock = threading.Lock()
+    activos = [0, 0]  # (en curso, máximo)
+
+    def enviar(body, headers):
+        assert headers[HEADER_FIRMA] == "sha256=firma"
+        datos = json.loads(body)
+        with lock:
+            activos[0] += 1
+            activos[1] = max(activos)
+        time.sleep(random.random() / 1000)
+        recibidos[datos["entity"]["id"]].append(datos["secuencia"])
+        with lock:
+            activos[0] -= 1
+        return 200
+
+    resumen = reproducir(registros, enviar, velocidad=None, concurrencia=4)
+    assert resumen["codigos"] == {"200": 180}
+    assert all(secuencias == list(range(30)) for secuencias in recibidos.values())
+    # Páginas distintas sí se envían en paralelo
+    assert activos[1] > 1
+
+
+def test_cada_replay_usa_ids_de_evento_propios():
+    secreto = "secreto-de-prueba"
+    registros = [
+        {"t": 0.0, "firma": "sha256=capturada", "body": json.dumps({"id": evento_id, "entity": {"id": page_id}})}
+        for evento_id, page_id in (("evt-1", "pagina-1"), ("evt-2", "pagina-2"), ("evt-1", "pagina-1"))
+    ]
+    # Servidor con índice de idempotencia que ya aceptó la ráfaga original
+    indice = IndiceIdempotencia(ruta=None)
+    indice.iniciar()
+    indice.registrar_si_nuevo("evt-1")
+    indice.registrar_si_nuevo("evt-2")
+    firmas = []
+
+    def enviar(body, headers):
+        firmas.append(headers.get(HEADER_FIRMA))
+        esperada = "sha256=" + hmac.new(secreto.encode(), body.encode("utf-8"), hashlib.sha256).hexdigest()
+        if headers.get(HEADER_FIRMA) not in (esperada, "sha256=capturada"):
+            return 401
+        # 208: el servidor respondería duplicate_delivery
+        return 200 if indice.registrar_si_nuevo(json.loads(body)["id"]) else 208
+
+    # Dos corridas: ninguna choca con la original ni con la anterior; la reentrega
+    # capturada (evt-1 dos veces) sigue siendo una reentrega dentro de la corrida
+    for _ in range(2):
+        resumen = reproducir(registros, enviar, velocidad=None, secreto=secreto)
+        assert resumen["codigos"] == {"200": 2, "208": 1}
+        assert resumen["sufijo_ids"]
+    assert "sha256=capturada" not in firmas
+
+    # --conservar-ids: prueba de deduplicación con los cuerpos y firmas capturados
+    firmas.clear()
+    resumen = reproducir(registros, enviar, velocidad=None, conservar_ids=True)
+    assert resumen["codigos"] == {"208": 3} and resumen["sufijo_ids"] is None
+    assert firmas == ["sha256=capturada"] * 3
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
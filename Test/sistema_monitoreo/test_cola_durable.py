@@ -0,0 +1,141 @@
+"""
+Test de Cola Durable de Eventos
+===============================
+
+Verifica que los eventos aceptados y no confirmados se reproducen al reiniciar
+y que un commit fallido no pierde los acks del lote, sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_cola_durable.py
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+import cola_durable
+from cola_durable import ColaDurable
+
+
+def evento(numero):
+    return {"type": "page.properties_updated", "page_id": f"pagina-{numero}", "_encolado_en": 1.0}
+
+
+def test_reproduce_eventos_no_confirmados():
+    """Solo los eventos sin ack vuelven tras un reinicio, en orden de llegada"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "eventos.db")
+
+        cola = ColaDurable(ruta)
+        assert cola.iniciar() == []
+
+        eventos = [evento(i) for i in range(5)]
+        lotes = [cola.agregar(e) for e in eventos]
+        assert all(lote.esperar(5) for lote in lotes)
+
+        cola.confirmar(eventos[0]["_ids_durables"] + eventos[3]["_ids_durables"])
+        cola.detener()
+
+        reiniciada = ColaDurable(ruta)
+        pendientes = reiniciada.iniciar()
+        assert [e["page_id"] for e in pendientes] == ["pagina-1", "pagina-2", "pagina-4"]
+        assert "_encolado_en" not in pendientes[0]
+        assert reiniciada.pendientes_en_disco == 3
+
+        # Los ids nuevos continúan después de los existentes
+        nuevo = evento(9)
+        reiniciada.agregar(nuevo).esperar(5)
+        assert nuevo["_ids_durables"][0] > pendientes[-1]["_ids_durables"][0]
+        reiniciada.detener()
+
+
+def test_commit_agrupado_concurrente():
+    """Muchos productores concurrentes comparten commits y ninguno se pierde"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "eventos.db")
+        cola = ColaDurable(ruta)
+        cola.iniciar()
+
+        resultados = []
+
+        def productor(base):
+            for i in range(50):
+                resultados.append(cola.agregar(evento(base + i)).esperar(5))
+
+        hilos = [threading.Thread(target=productor, args=(n * 100,)) for n in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        cola.detener()
+
+        assert len(resultados) == 400 and all(resultados)
+        reiniciada = ColaDurable(ruta)
+        assert len(reiniciada.iniciar()) == 400
+        reiniciada.detener()
+
+
+class ConexionConFallo:
+    """Conexión cuyo próximo commit falla (disco lleno, base bloqueada...)"""
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self.fallos = 0
+
+    def commit(self):
+        if self.fallos:
+            self.fallos -= 1
+            raise sqlite3.OperationalError("database or disk is full")
+        return self._conexion.commit()
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+
+def test_commit_fallido_conserva_los_acks():
+    """El rollback descarta las inserciones del lote pero reintenta sus confirmaciones"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "eventos.db")
+        cola = ColaDurable(ruta)
+        conexiones = []
+        conectar = cola._conectar
+        cola._conectar = lambda: conexiones.append(ConexionConFallo(conectar())) or conexiones[-1]
+        espera_original = cola_durable.ESPERA_REINTENTO
+        cola_durable.ESPERA_REINTENTO = 0.05
+        try:
+            cola.iniciar()
+            eventos = [evento(i) for i in range(3)]
+            assert all(cola.agregar(e).esperar(5) for e in eventos)
+
+            # Ack e inserción en el mismo lote, con el commit fallando una vez
+            conexiones[-1].fallos = 1
+            with cola._cond:
+                cola.confirmar(eventos[0]["_ids_durables"])
+                lote = cola.agregar(evento(3))
+            assert not lote.esperar(5) and lote.error is not None
+
+            # El ack se reintenta y el contador no cuenta la inserción deshecha
+            limite = time.time() + 5
+            while cola.contar_pendientes() != 2 and time.time() < limite:
+                time.sleep(0.01)
+            assert cola.contar_pendientes() == 2
+            assert cola.pendientes_en_disco == 2
+            cola.detener()
+        finally:
+            cola_durable.ESPERA_REINTENTO = espera_original
+
+        reiniciada = ColaDurable(ruta)
+        assert [e["page_id"] for e in reiniciada.iniciar()] == ["pagina-1", "pagina-2"]
+        reiniciada.detener()
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
@@ -0,0 +1,86 @@
+"""
+Test de Arranque en Caliente del Monitor
+========================================
+
+Verifica que los caches guardados al apagar se cargan en el siguiente arranque
+(y que un estado viejo se descarta) y que "Monitoreo Activo" de un sprint se
+consulta siempre (ni se guarda ni se cachea), sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_estado_arranque.py
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+import task_monitor
+from task_monitor import TaskMonitorReactivo, MAX_EDAD_ESTADO_ARRANQUE
+from notion_simulado import NotionSimulado, WorkspaceSimulado
+
+
+def monitor_con_caches():
+    monitor = TaskMonitorReactivo()
+    monitor.cache_usuarios["usuario-1"] = "Ana"
+    monitor.cache_nombres_personas["persona-1"] = "Ana"
+    monitor.esquema_propiedades["pri1"] = "Prioridad"
+    return monitor
+
+
+def test_ida_y_vuelta_de_caches():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "monitor_estado.json")
+        monitor_con_caches().guardar_estado_arranque(ruta)
+
+        nuevo = TaskMonitorReactivo()
+        assert nuevo.cargar_estado_arranque(ruta)
+        assert nuevo.cache_usuarios == {"usuario-1": "Ana"}
+        assert nuevo.cache_nombres_personas == {"persona-1": "Ana"}
+        assert nuevo.toca_propiedades_monitoreadas(["pri1"]) is True
+        with open(ruta, encoding="utf-8") as f:
+            assert "sprints" not in json.load(f)
+
+
+def test_estado_viejo_se_descarta():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "monitor_estado.json")
+        monitor_con_caches().guardar_estado_arranque(ruta)
+
+        with open(ruta, encoding="utf-8") as f:
+            estado = json.load(f)
+        estado["guardado_en"] -= MAX_EDAD_ESTADO_ARRANQUE + 1
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(estado, f)
+
+        nuevo = TaskMonitorReactivo()
+        assert not nuevo.cargar_estado_arranque(ruta)
+        assert nuevo.cache_usuarios == {}
+        assert not TaskMonitorReactivo().cargar_estado_arranque(os.path.join(directorio, "no_existe.json"))
+
+
+def test_monitoreo_activo_se_respeta_al_instante():
+    ws = WorkspaceSimulado()
+    sprint = ws.crear_sprint("Sprint 1")
+    cliente = NotionSimulado(workspace=ws)
+    tarea = cliente.pages.retrieve(ws.crear_tarea("Tarea", sprint, []))
+    notion_original = task_monitor.notion
+    task_monitor.notion = cliente
+    try:
+        monitor = TaskMonitorReactivo()
+        assert monitor.verificar_si_sprint_monitoreable(tarea)
+
+        # Desactivar el monitoreo surte efecto en el siguiente webhook
+        ws.editar(sprint, {"Monitoreo Activo": {"checkbox": False}}, "usuario")
+        assert not monitor.verificar_si_sprint_monitoreable(tarea)
+    finally:
+        task_monitor.notion = notion_original
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
@@ -0,0 +1,225 @@
+"""
+Test de Despliegue Multiproceso
+===============================
+
+Verifica el estado compartido entre procesos (snapshots, marcas anti-bucle,
+ids de evento) y la lectura por shard de la cola durable compartida, usando
+instancias separadas sobre la misma base como si fueran procesos distintos.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_estado_compartido.py
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from cola_durable import ColaDurable
+from idempotencia import IndiceIdempotencia
+from estado_compartido import BaseCompartida, MapaCompartido, SnapshotStoreCompartido
+from snapshot_store import SnapshotTarea, escribir_snapshots, leer_snapshots
+
+
+def test_marcas_anti_bucle_visibles_entre_procesos():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "compartido.db")
+        proceso_a = MapaCompartido(BaseCompartida(ruta), "cambios_sistema")
+        proceso_b = MapaCompartido(BaseCompartida(ruta), "cambios_sistema")
+
+        proceso_a["tarea-1"] = 1700000000.5
+        assert "tarea-1" in proceso_b and proceso_b["tarea-1"] == 1700000000.5
+        assert "tarea-1" not in MapaCompartido(proceso_a.base, "webhooks_en_espera")
+
+        del proceso_b["tarea-1"]
+        assert not proceso_a
+
+
+def test_snapshots_importados_y_compartidos():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_json = os.path.join(directorio, "task_snapshots.json")
+        ruta_db = os.path.join(directorio, "compartido.db")
+        tarea_id = str(uuid.uuid4())
+        valores = {"Nombre": "Tarea", "Personas": [], "Prioridad": "Media", "Tamaño": "S", "Estado": "Sin iniciar"}
+        escribir_snapshots([SnapshotTarea.desde_valores(tarea_id, valores, None, None)], ruta_json)
+
+        proceso_a = SnapshotStoreCompartido(BaseCompartida(ruta_db), ruta_json)
+        proceso_b = SnapshotStoreCompartido(BaseCompartida(ruta_db), ruta_json, exportador=True)
+        assert proceso_a.cargar() == 1
+
+        # Lo que un worker actualiza lo ve el otro sin pasar por el JSON
+        proceso_a.actualizar(tarea_id, dict(valores, Prioridad="Alta"), None, None)
+        assert proceso_b.obtener(tarea_id)["Prioridad"] == "Alta"
+
+        # La exportación no provoca una reimportación
+        assert proceso_b.persistir()
+        assert proceso_a.eliminar(tarea_id)
+        assert proceso_b.obtener(tarea_id) is None
+
+
+def test_un_solo_exportador_y_solo_con_cambios():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_json = os.path.join(directorio, "task_snapshots.json")
+        ruta_db = os.path.join(directorio, "compartido.db")
+        tarea_id = str(uuid.uuid4())
+        valores = {"Nombre": "Tarea", "Personas": [], "Prioridad": "Media", "Tamaño": "S", "Estado": "Sin iniciar"}
+        escribir_snapshots([SnapshotTarea.desde_valores(tarea_id, valores, None, None)], ruta_json)
+        worker = SnapshotStoreCompartido(BaseCompartida(ruta_db), ruta_json)
+        exportador = SnapshotStoreCompartido(BaseCompartida(ruta_db), ruta_json, exportador=True)
+        worker.cargar()
+
+        # Recién importado: nada que exportar
+        assert not exportador.persistir()
+        worker.actualizar(tarea_id, dict(valores, Estado="En curso"), None, None)
+        assert not worker.persistir() and not worker.persistir_si_vigente()
+        assert exportador.persistir()
+        assert not exportador.persistir()
+        assert [snapshot["Estado"] for snapshot in leer_snapshots(ruta_json)[1]] == ["En curso"]
+
+        # setup reescribe el archivo: se fusiona en lugar de pisarlo
+        nueva = str(uuid.uuid4())
+        escribir_snapshots([SnapshotTarea.desde_valores(nueva, valores, None, None)], ruta_json,
+                           {"marca_agua": "2025-06-20T00:00:00.000Z"})
+        os.utime(ruta_json, (1, 1))
+        assert not exportador.persistir()
+        assert nueva in worker and tarea_id not in worker
+        assert leer_snapshots(ruta_json)[0] == {"marca_agua": "2025-06-20T00:00:00.000Z"}
+
+
+def test_recarga_conserva_cambios_no_exportados():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_json = os.path.join(directorio, "task_snapshots.json")
+        ruta_db = os.path.join(directorio, "compartido.db")
+        valores = {"Nombre": "Tarea", "Personas": [], "Prioridad": "Media", "Tamaño": "S", "Estado": "Sin iniciar"}
+        editada, pisada, borrada = (str(uuid.uuid4()) for _ in range(3))
+        escribir_snapshots([SnapshotTarea.desde_valores(tarea, valores, None, "2025-06-20T10:00:00.000Z")
+                            for tarea in (editada, pisada, borrada)], ruta_json)
+        worker = SnapshotStoreCompartido(BaseCompartida(ruta_db), ruta_json)
+        exportador = SnapshotStoreCompartido(BaseCompartida(ruta_db), ruta_json, exportador=True)
+        worker.cargar()
+
+        # Cambios del worker posteriores a la última exportación
+        worker.actualizar(editada, dict(valores, Estado="En curso"), None, "2025-06-20T11:00:00.000Z")
+        worker.actualizar(pisada, dict(valores, Estado="En curso"), None, "2025-06-20T11:00:00.000Z")
+        worker.eliminar(borrada)
+
+        # setup --incremental escribe desde una base anterior; solo `pisada` es más reciente
+        nueva = str(uuid.uuid4())
+        escribir_snapshots([
+            SnapshotTarea.desde_valores(editada, valores, None, "2025-06-20T10:00:00.000Z"),
+            SnapshotTarea.desde_valores(pisada, dict(valores, Estado="Listo"), None, "2025-06-20T12:00:00.000Z"),
+            SnapshotTarea.desde_valores(borrada, valores, None, "2025-06-20T10:00:00.000Z"),
+            SnapshotTarea.desde_valores(nueva, valores, None, "2025-06-20T10:00:00.000Z"),
+        ], ruta_json, {"marca_agua": "2025-06-20T11:59:00.000Z"})
+        os.utime(ruta_json, (1, 1))
+
+        assert worker.obtener(editada)["Estado"] == "En curso"
+        assert worker.obtener(pisada)["Estado"] == "Listo"
+        assert borrada not in worker and nueva in worker
+
+        # Lo conservado queda pendiente de exportar, con los metadatos de setup
+        assert exportador.persistir()
+        metadatos, registros = leer_snapshots(ruta_json)
+        assert metadatos == {"marca_agua": "2025-06-20T11:59:00.000Z"}
+        estados = {snapshot.id_texto: snapshot["Estado"] for snapshot in registros}
+        assert estados == {editada: "En curso", pisada: "Listo", nueva: "Sin iniciar"}
+        assert not exportador.persistir()
+
+
+def test_apagado_no_pisa_setup_sin_importar():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_json = os.path.join(directorio, "task_snapshots.json")
+        valores = {"Nombre": "Tarea", "Personas": [], "Prioridad": "Media", "Tamaño": "S", "Estado": "Sin iniciar"}
+        escribir_snapshots([SnapshotTarea.desde_valores(str(uuid.uuid4()), valores, None, None)], ruta_json)
+        store = SnapshotStoreCompartido(BaseCompartida(os.path.join(directorio, "compartido.db")), ruta_json,
+                                        exportador=True)
+        store.cargar()
+        store.eliminar(store.valores()[0].tarea_id.hex())
+        assert store.persistir_si_vigente()
+
+        # setup reescribe con el servidor corriendo: el apagado no lo pisa
+        nueva = str(uuid.uuid4())
+        escribir_snapshots([SnapshotTarea.desde_valores(nueva, valores, None, None)], ruta_json,
+                           {"marca_agua": "2025-06-20T00:00:00.000Z"})
+        os.utime(ruta_json, (1, 1))
+        assert not store.persistir_si_vigente()
+        metadatos, registros = leer_snapshots(ruta_json)
+        assert metadatos == {"marca_agua": "2025-06-20T00:00:00.000Z"}
+        assert [snapshot.tarea_id for snapshot in registros] == [uuid.UUID(nueva).bytes]
+
+
+def test_reentrega_entre_procesos_de_ingesta():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "idempotencia.db")
+        proceso_a = IndiceIdempotencia(ruta, compartido=True)
+        proceso_b = IndiceIdempotencia(ruta, compartido=True)
+        proceso_a.iniciar()
+        proceso_b.iniciar()
+
+        assert proceso_a.registrar_si_nuevo("evt-1")
+        assert not proceso_b.registrar_si_nuevo("evt-1")
+
+        proceso_a.olvidar("evt-1")
+        assert proceso_b.registrar_si_nuevo("evt-1")
+        proceso_a.detener()
+        proceso_b.detener()
+
+
+def test_cola_compartida_por_shard():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "eventos.db")
+        ingesta_a = ColaDurable(ruta, compartida=True)
+        ingesta_b = ColaDurable(ruta, compartida=True)
+        worker = ColaDurable(ruta, compartida=True)
+        assert ingesta_a.iniciar(reproducir=False) == []
+        ingesta_b.iniciar(reproducir=False)
+        worker.iniciar(reproducir=False)
+
+        for i in range(6):
+            ingesta = ingesta_a if i % 2 else ingesta_b
+            assert ingesta.agregar({"page_id": f"pagina-{i}"}, shard=i % 3).esperar(5)
+
+        leidos = worker.leer_pendientes([0, 2])
+        assert [e["page_id"] for e in leidos] == ["pagina-0", "pagina-2", "pagina-3", "pagina-5"]
+        assert worker.contar_pendientes() == 6
+
+        # Un id confirmado no se reasigna: el cursor del worker no salta eventos nuevos
+        ultimo = leidos[-1]["_ids_durables"][0]
+        worker.confirmar([e["_ids_durables"][0] for e in leidos])
+        worker.detener()
+        ingesta_a.agregar({"page_id": "pagina-6"}, shard=0).esperar(5)
+        ingesta_a.detener()
+        ingesta_b.detener()
+
+        reiniciado = ColaDurable(ruta, compartida=True)
+        reiniciado.iniciar(reproducir=False)
+        assert [e["page_id"] for e in reiniciado.leer_pendientes([0, 2], ultimo)] == ["pagina-6"]
+        reiniciado.detener()
+
+
+def test_migra_cola_anterior():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "eventos.db")
+        conexion = sqlite3.connect(ruta)
+        conexion.execute(
+            "CREATE TABLE eventos (id INTEGER PRIMARY KEY, page_id TEXT NOT NULL, "
+            "recibido REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        conexion.execute("INSERT INTO eventos VALUES (7, 'pagina', 0, '{\"page_id\": \"pagina\"}')")
+        conexion.commit()
+        conexion.close()
+
+        cola = ColaDurable(ruta)
+        pendientes = cola.iniciar()
+        assert [e["_ids_durables"] for e in pendientes] == [[7]]
+        cola.detener()
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
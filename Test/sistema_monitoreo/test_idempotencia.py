@@ -0,0 +1,146 @@
+"""
+Test de Idempotencia por Id de Evento
+=====================================
+
+Verifica que las reentregas de Notion se detectan en memoria, fuera del LRU
+(consulta por id en disco dentro de la retención) y después de un reinicio,
+y las altas concurrentes del modo compartido, sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_idempotencia.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from idempotencia import IndiceIdempotencia
+
+
+def test_reentrega_en_memoria():
+    indice = IndiceIdempotencia(ruta=None)
+    indice.iniciar()
+    assert indice.registrar_si_nuevo("evt-1")
+    assert not indice.registrar_si_nuevo("evt-1")
+    assert indice.reentregas_detectadas == 1
+
+    # Un evento rechazado (503) se olvida para que el reintento se procese
+    indice.olvidar("evt-1")
+    assert indice.registrar_si_nuevo("evt-1")
+
+
+def test_reentrega_fuera_del_lru_dentro_de_la_retencion():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "idempotencia.db")
+
+        indice = IndiceIdempotencia(ruta, capacidad=2)
+        indice.iniciar()
+        for i in range(5):
+            assert indice.registrar_si_nuevo(f"evt-{i}")
+        indice.detener()
+
+        # El reinicio precarga los ids más recientes: sus reentregas no tocan SQLite
+        reiniciado = IndiceIdempotencia(ruta, capacidad=2)
+        assert reiniciado.iniciar() == 2
+        assert not reiniciado.registrar_si_nuevo("evt-3")
+        assert not reiniciado.registrar_si_nuevo("evt-4")
+        assert reiniciado._lectores == []
+
+        # Fuera del LRU se consulta el índice por id
+        assert not reiniciado.registrar_si_nuevo("evt-0")
+        assert reiniciado.registrar_si_nuevo("evt-nuevo")
+        assert reiniciado.reentregas_detectadas == 3
+
+        # Vencido (fuera de la retención) aunque aún no se haya purgado
+        reiniciado._conexion.execute("UPDATE eventos_vistos SET visto = visto - 2 * 24 * 3600 WHERE id = 'evt-1'")
+        reiniciado._conexion.commit()
+        assert reiniciado.registrar_si_nuevo("evt-1")
+        reiniciado.detener()
+
+
+def test_olvidado_fuera_del_lru_se_acepta():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "idempotencia.db")
+        indice = IndiceIdempotencia(ruta, capacidad=1)
+        indice.iniciar()
+        assert indice.registrar_si_nuevo("evt-1")
+        indice.detener()
+
+        # La baja aún sin escribir no deja que el índice en disco lo marque como visto
+        reiniciado = IndiceIdempotencia(ruta, capacidad=1)
+        reiniciado.iniciar()
+        reiniciado.olvidar("evt-1")
+        assert reiniciado.registrar_si_nuevo("evt-1")
+        reiniciado.detener()
+
+
+def test_compartido_acepta_ids_vencidos_sin_purgar():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "idempotencia.db")
+        proceso_a = IndiceIdempotencia(ruta, compartido=True)
+        proceso_b = IndiceIdempotencia(ruta, compartido=True, retencion=60)
+        proceso_a.iniciar()
+        proceso_b.iniciar()
+
+        assert proceso_a.registrar_si_nuevo("evt-1")
+        assert not proceso_b.registrar_si_nuevo("evt-1")
+
+        proceso_a._conexion.execute("UPDATE eventos_vistos SET visto = visto - 120")
+        proceso_a._conexion.commit()
+        assert proceso_b.registrar_si_nuevo("evt-1")
+        proceso_a.detener()
+        proceso_b.detener()
+
+
+def test_compartido_altas_concurrentes_en_lotes():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "idempotencia.db")
+        procesos = [IndiceIdempotencia(ruta, compartido=True) for _ in range(2)]
+        for proceso in procesos:
+            proceso.iniciar()
+        commits = []
+        procesos[0]._conexion.set_trace_callback(lambda sql: sql == "COMMIT" and commits.append(sql))
+
+        # Cada id llega ocho veces (cuatro por proceso): se acepta exactamente una
+        aceptados = []
+
+        def recibir(proceso):
+            for i in range(50):
+                if proceso.registrar_si_nuevo(f"evt-{i}"):
+                    aceptados.append(i)
+
+        hilos = [threading.Thread(target=recibir, args=(proceso,)) for proceso in procesos * 4]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert sorted(aceptados) == list(range(50))
+        # Las peticiones que llegan durante un commit comparten el siguiente
+        assert 0 < len(commits) < 200
+        for proceso in procesos:
+            proceso.detener()
+
+
+def test_ids_vencidos_se_purgan():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "idempotencia.db")
+
+        indice = IndiceIdempotencia(ruta, retencion=0)
+        indice.iniciar()
+        indice.registrar_si_nuevo("evt-viejo")
+        indice.detener()
+
+        reiniciado = IndiceIdempotencia(ruta, retencion=0)
+        assert reiniciado.iniciar() == 0
+        assert reiniciado.registrar_si_nuevo("evt-viejo")
+        reiniciado.detener()
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
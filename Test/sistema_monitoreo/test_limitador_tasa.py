@@ -0,0 +1,37 @@
+"""
+Test de Limitador de Tasa
+=========================
+
+Verifica que el token bucket permite la ráfaga inicial y luego espacia las
+llamadas según la tasa configurada.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_limitador_tasa.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from limitador_tasa import LimitadorTasa
+
+
+def test_rafaga_y_luego_espera():
+    limitador = LimitadorTasa(tasa=50, rafaga=2)
+    assert limitador.intentar() and limitador.intentar()
+    assert not limitador.intentar()
+
+    inicio = time.monotonic()
+    for _ in range(5):
+        limitador.adquirir()
+    # 5 tokens a 50/s ≈ 0.1 s
+    assert 0.07 <= time.monotonic() - inicio < 0.5
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
@@ -0,0 +1,67 @@
+"""
+Test de Logging No Bloqueante
+=============================
+
+Verifica el pipeline QueueHandler/QueueListener: registros JSON con campos extra,
+mensaje resuelto al encolar y muestreo de loggers '.detalle'.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_logging_config.py
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from logging_config import configurar_logging, detener_logging, FiltroMuestreo, ManejadorCola
+
+
+def test_registros_json_con_campos_extra():
+    """El archivo recibe un JSON por línea con los extra={...} al primer nivel"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "servidor.log")
+        configurar_logging(ruta, nivel="INFO", muestreo_detalle=0)
+        try:
+            logger = logging.getLogger("prueba")
+            logger.info("🎯 Evento %s | Página: %.8s...", "page.created", "abcdef123456", extra={"page_id": "abcdef123456"})
+            logging.getLogger("prueba.detalle").info("línea por propiedad")
+            logging.getLogger("prueba.detalle").warning("❌ BLOQUEADO")
+        finally:
+            detener_logging()
+
+        with open(ruta, encoding="utf-8") as f:
+            registros = [json.loads(linea) for linea in f]
+
+    assert [r["mensaje"] for r in registros] == ["🎯 Evento page.created | Página: abcdef12...", "❌ BLOQUEADO"]
+    assert registros[0]["page_id"] == "abcdef123456"
+    assert registros[0]["nivel"] == "INFO" and registros[0]["logger"] == "prueba"
+
+
+def test_mensaje_resuelto_al_encolar():
+    """El mensaje se fija al encolar (args mutables); el record original no cambia"""
+    valores = {"Estado": "En curso"}
+    record = logging.makeLogRecord({"msg": "Valores: %s", "args": (valores,)})
+    preparado = ManejadorCola(None).prepare(record)
+    valores["Estado"] = "revertido"
+    assert preparado.msg == "Valores: {'Estado': 'En curso'}" and preparado.args is None
+    assert preparado.getMessage() == preparado.msg
+    assert record.msg == "Valores: %s" and record.args == (valores,)
+
+
+def test_muestreo_solo_en_detalle():
+    filtro = FiltroMuestreo(0)
+    assert filtro.filter(logging.makeLogRecord({"name": "task_monitor", "levelno": logging.INFO}))
+    assert not filtro.filter(logging.makeLogRecord({"name": "task_monitor.detalle", "levelno": logging.INFO}))
+    assert filtro.filter(logging.makeLogRecord({"name": "task_monitor.detalle", "levelno": logging.WARNING}))
+    assert filtro.descartados == 1
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
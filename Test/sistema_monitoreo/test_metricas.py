@@ -0,0 +1,74 @@
+"""
+Test de Métricas Prometheus
+===========================
+
+Verifica el formato de exposición de contadores, histogramas e indicadores
+y la instrumentación del cliente Notion, sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_metricas.py
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from metricas import RegistroMetricas, instrumentar_cliente_notion, NOTION_API_SEGUNDOS, NOTION_API_ERRORES
+
+
+def test_exposicion_contador_e_indicador():
+    registro = RegistroMetricas()
+    contador = registro.contador("eventos_total", "Eventos", ("tipo",))
+    contador.incrementar('page."x"')
+    contador.incrementar('page."x"', cantidad=2)
+    registro.indicador("profundidad", "Profundidad", lambda: 7)
+
+    texto = registro.exponer()
+    assert "# TYPE eventos_total counter" in texto
+    assert 'eventos_total{tipo="page.\\"x\\""} 3' in texto
+    assert "# TYPE profundidad gauge\nprofundidad 7" in texto
+
+
+def test_histograma_acumulativo():
+    registro = RegistroMetricas()
+    histograma = registro.histograma("latencia_segundos", "Latencia", ("tipo",), buckets=(0.1, 1))
+    histograma.observar(0.05, "a")
+    histograma.observar(0.5, "a")
+    histograma.observar(3, "a")
+
+    lineas = registro.exponer().splitlines()
+    assert 'latencia_segundos_bucket{tipo="a",le="0.1"} 1' in lineas
+    assert 'latencia_segundos_bucket{tipo="a",le="1"} 2' in lineas
+    assert 'latencia_segundos_bucket{tipo="a",le="+Inf"} 3' in lineas
+    assert 'latencia_segundos_count{tipo="a"} 3' in lineas
+
+
+def test_instrumentacion_cliente_notion():
+    class Paginas:
+        def retrieve(self, page_id):
+            if page_id == "falla":
+                raise RuntimeError("404")
+            return {"id": page_id}
+
+    class Cliente:
+        pages = Paginas()
+
+    cliente = instrumentar_cliente_notion(Cliente())
+    instrumentar_cliente_notion(cliente)  # idempotente
+
+    antes = NOTION_API_ERRORES.valor("pages.retrieve")
+    assert cliente.pages.retrieve("abc") == {"id": "abc"}
+    try:
+        cliente.pages.retrieve("falla")
+    except RuntimeError:
+        pass
+    assert NOTION_API_ERRORES.valor("pages.retrieve") == antes + 1
+    assert 'notion_api_segundos_count{endpoint="pages.retrieve"}' in "\n".join(NOTION_API_SEGUNDOS.lineas())
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
@@ -0,0 +1,68 @@
+"""
+Test del Planificador por Prioridad
+===================================
+
+Verifica orden por prioridad, orden estricto por página y límite de inanición,
+sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_planificador.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from planificador import (
+    ColaPrioridad, PRIORIDAD_ALTA, PRIORIDAD_NORMAL, PRIORIDAD_BAJA, PRIORIDAD_FONDO
+)
+
+
+def vaciar(cola):
+    return [cola.get_nowait() for _ in range(cola.qsize())]
+
+
+def test_atiende_por_prioridad():
+    """Lo que puede requerir reversión sale antes que lo que solo se registra"""
+    cola = ColaPrioridad()
+    cola.put("log", PRIORIDAD_FONDO)
+    cola.put("estado-a", PRIORIDAD_BAJA, clave="a")
+    cola.put("prioridad-b", PRIORIDAD_ALTA, clave="b")
+    cola.put("desconocido-c", PRIORIDAD_NORMAL, clave="c")
+
+    assert cola.pendientes_por_prioridad() == {"alta": 1, "normal": 1, "baja": 1, "fondo": 1}
+    assert vaciar(cola) == ["prioridad-b", "desconocido-c", "estado-a", "log"]
+
+
+def test_no_adelanta_eventos_de_la_misma_pagina():
+    """Un evento urgente promueve a los anteriores de su página en vez de adelantarlos"""
+    cola = ColaPrioridad()
+    cola.put("a1-estado", PRIORIDAD_BAJA, clave="a")
+    cola.put("b1-estado", PRIORIDAD_BAJA, clave="b")
+    cola.put("a2-prioridad", PRIORIDAD_ALTA, clave="a")
+
+    assert cola.promovidos_por_orden == 1
+    assert vaciar(cola) == ["a1-estado", "a2-prioridad", "b1-estado"]
+    assert cola.pendientes_por_prioridad() == {"alta": 0, "normal": 0, "baja": 0, "fondo": 0}
+
+
+def test_limite_de_inanicion():
+    """La cabeza de un nivel bajo se atiende al superar su espera máxima"""
+    cola = ColaPrioridad(espera_maxima={PRIORIDAD_BAJA: 0.05})
+    cola.put("estado-viejo", PRIORIDAD_BAJA, clave="a")
+    time.sleep(0.1)
+    for i in range(3):
+        cola.put(f"urgente-{i}", PRIORIDAD_ALTA, clave=f"p{i}")
+
+    assert cola.get_nowait() == "estado-viejo"
+    assert cola.atendidos_por_espera == 1
+    assert vaciar(cola) == ["urgente-0", "urgente-1", "urgente-2"]
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
@@ -0,0 +1,191 @@
+"""
+Test del Reconciliador
+======================
+
+Verifica que el barrido periódico encuentra las tareas de sprints monitoreados
+editadas después de su snapshot (webhook perdido) y las encola como eventos
+sintéticos, cediendo ante el tráfico en vivo, contra Notion simulado en memoria.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_reconciliador.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+sys.path.append(os.path.dirname(__file__))
+
+import task_monitor
+import reconciliador
+from notion_simulado import NotionSimulado, WorkspaceSimulado, DB_SPRINTS, DB_TAREAS
+from reconciliador import Reconciliador, ORIGEN_RECONCILIACION
+from snapshot_store import SnapshotStore, SnapshotTarea, escribir_snapshots, iso_a_epoch
+
+ANTES = "2025-01-01T00:00:00.000Z"
+MARCA_SETUP = "2025-01-02T00:00:00.000Z"
+
+
+class ProcesadorFalso:
+    """Lo que el reconciliador usa del WebhookProcessor"""
+
+    def __init__(self, en_vivo=()):
+        self.encolados = []
+        self.actualizaciones_en_cola = {}
+        self.en_vivo = list(en_vivo)
+
+    def eventos_en_vivo(self):
+        return self.en_vivo.pop(0) if self.en_vivo else 0
+
+    def shard_de(self, page_id):
+        return 0
+
+    def encolar_evento(self, evento):
+        self.encolados.append(evento)
+
+
+class ColaFalsa:
+    """Cola compartida del despliegue multiproceso"""
+
+    def __init__(self):
+        self.agregados = []
+
+    def agregar(self, evento, shard=0):
+        self.agregados.append((evento, shard))
+
+
+def preparar(directorio):
+    """Sprint monitoreado con tareas al día, desfasada y sin snapshot + sprint sin monitoreo"""
+    ws = WorkspaceSimulado()
+    persona, _ = ws.crear_persona("Persona")
+    sprint = ws.crear_sprint("Sprint 1")
+    otro = ws.crear_sprint("Sprint 0", monitoreo_activo=False, es_actual=False)
+    tareas = {nombre: ws.crear_tarea(nombre, sprint, [persona])
+              for nombre in ("al_dia", "desfasada", "invalida_vieja", "nueva")}
+    tareas["otro_sprint"] = ws.crear_tarea("otro_sprint", otro, [persona])
+    for pagina in ws.paginas.values():
+        pagina["last_edited_time"] = ANTES
+        pagina["created_time"] = ANTES
+    ws.paginas[tareas["nueva"]]["created_time"] = "2025-01-03T00:00:00.000Z"
+
+    monitor = task_monitor.TaskMonitorReactivo()
+    escribir_snapshots(
+        (SnapshotTarea.desde_valores(tareas[nombre], monitor.valores_monitoreados(ws.paginas[tareas[nombre]]),
+                                     None, ANTES)
+         for nombre in ("al_dia", "desfasada", "otro_sprint")),
+        os.path.join(directorio, "task_snapshots.json"),
+        {"marca_agua": MARCA_SETUP}
+    )
+    monitor.snapshots = SnapshotStore(os.path.join(directorio, "task_snapshots.json"))
+    monitor.snapshots.cargar()
+
+    # Cambio sin webhook
+    ws.editar(tareas["desfasada"], {"Prioridad": {"select": {"name": "Alta"}}}, "usuario")
+
+    cliente = NotionSimulado(workspace=ws)
+    cliente.consultas = []
+    query = cliente.databases.query
+
+    def registrar(**kwargs):
+        cliente.consultas.append(kwargs)
+        return query(**kwargs)
+
+    cliente.databases.query = registrar
+    task_monitor.notion = cliente
+    task_monitor.DB_SPRINTS_ID = DB_SPRINTS
+    task_monitor.DB_TAREAS_ID = DB_TAREAS
+    return ws, monitor, tareas
+
+
+def test_encola_tareas_desfasadas_y_creaciones_perdidas():
+    with tempfile.TemporaryDirectory() as directorio:
+        ws, monitor, tareas = preparar(directorio)
+        processor = ProcesadorFalso()
+        barrido = Reconciliador(monitor, processor, tasa=1000)
+
+        assert barrido.barrer() == 2
+        encolados = {evento["page_id"]: evento for evento in processor.encolados}
+        assert encolados[tareas["desfasada"]]["type"] == "page.properties_updated"
+        assert encolados[tareas["nueva"]]["type"] == "page.created"
+        assert all(evento["origen"] == ORIGEN_RECONCILIACION for evento in processor.encolados)
+
+        # El worker procesa el evento: el snapshot alcanza a la página
+        pagina = ws.paginas[tareas["desfasada"]]
+        monitor.snapshots.actualizar(tareas["desfasada"], monitor.valores_monitoreados(pagina), None,
+                                     pagina["last_edited_time"])
+
+        # Siguiente barrido: solo lo editado desde el anterior
+        processor.encolados.clear()
+        task_monitor.notion.consultas.clear()
+        assert barrido.barrer() == 0
+        assert "and" in task_monitor.notion.consultas[-1]["filter"]
+
+        ws.editar(tareas["al_dia"], {"Tamaño": {"select": {"name": "L"}}}, "usuario")
+        assert barrido.barrer() == 1
+        assert processor.encolados[0]["page_id"] == tareas["al_dia"]
+
+
+def test_omite_paginas_con_webhook_en_cola():
+    with tempfile.TemporaryDirectory() as directorio:
+        _, monitor, tareas = preparar(directorio)
+        processor = ProcesadorFalso()
+        processor.actualizaciones_en_cola[tareas["desfasada"]] = 1
+
+        assert Reconciliador(monitor, processor, tasa=1000).barrer() == 1
+        assert [evento["page_id"] for evento in processor.encolados] == [tareas["nueva"]]
+
+
+def test_cede_ante_trafico_en_vivo():
+    with tempfile.TemporaryDirectory() as directorio:
+        _, monitor, _ = preparar(directorio)
+        processor = ProcesadorFalso(en_vivo=[3, 2, 1])
+        espera_original = reconciliador.ESPERA_TRAFICO
+        reconciliador.ESPERA_TRAFICO = 0
+        try:
+            Reconciliador(monitor, processor, tasa=1000).barrer()
+        finally:
+            reconciliador.ESPERA_TRAFICO = espera_original
+        # Esperó a que se vaciara el tráfico en vivo antes de consultar
+        assert processor.en_vivo == []
+        assert processor.encolados
+
+
+def test_sin_cambios_monitoreados_avanza_snapshot():
+    """Una edición de campos no monitoreados no vuelve a encolarse tras un reinicio"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ws, monitor, tareas = preparar(directorio)
+        ws.editar(tareas["al_dia"], {"Notas": {"rich_text": [{"text": {"content": "nota"}}]}}, "usuario")
+        processor = ProcesadorFalso()
+        assert Reconciliador(monitor, processor, tasa=1000).barrer() == 3
+
+        assert monitor.procesar_tarea_modificada(tareas["al_dia"], {}) == "sin_cambios_monitoreados"
+        pagina = ws.paginas[tareas["al_dia"]]
+        assert monitor.snapshots.obtener(tareas["al_dia"]).last_edited_time == iso_a_epoch(pagina["last_edited_time"])
+
+        # Reinicio: el primer barrido vuelve a revisar todo desde la marca de setup
+        processor.encolados.clear()
+        Reconciliador(monitor, processor, tasa=1000).barrer()
+        assert tareas["al_dia"] not in [evento["page_id"] for evento in processor.encolados]
+
+
+def test_shards_ajenos_van_a_la_cola_compartida():
+    """Multiproceso: un solo reconciliador; las páginas de otros shards van a su dueño"""
+    with tempfile.TemporaryDirectory() as directorio:
+        _, monitor, tareas = preparar(directorio)
+        processor = ProcesadorFalso()
+        processor.shard_de = lambda page_id: 1 if page_id == tareas["nueva"] else 0
+        processor.cola_durable = ColaFalsa()
+
+        assert Reconciliador(monitor, processor, tasa=1000, shards=[0]).barrer() == 2
+        assert [evento["page_id"] for evento in processor.encolados] == [tareas["desfasada"]]
+        assert [(evento["page_id"], shard) for evento, shard in processor.cola_durable.agregados] == [
+            (tareas["nueva"], 1)
+        ]
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
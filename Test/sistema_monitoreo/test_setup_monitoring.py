@@ -0,0 +1,201 @@
+"""
+Test de Setup de Monitoreo
+==========================
+
+Verifica que setup_monitoring obtiene las tareas de los sprints relevantes con
+una sola consulta compuesta (o consultas por sprint en paralelo si falla) y
+crea el snapshot global (completo o incremental desde la marca de agua),
+contra Notion simulado en memoria.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_setup_monitoring.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+sys.path.append(os.path.dirname(__file__))
+
+os.environ.setdefault("DB_TAREAS_ID", "db-tareas")
+os.environ.setdefault("DB_SPRINTS_ID", "db-sprints")
+
+import setup_monitoring
+from notion_simulado import NotionSimulado, WorkspaceSimulado
+from snapshot_store import SnapshotStore
+
+
+def construir_sprints():
+    """Sprint actual + 3 anteriores (solo los 2 más recientes son relevantes)"""
+    ws = WorkspaceSimulado()
+    persona, _ = ws.crear_persona("Persona")
+    sprints = [
+        ws.crear_sprint(f"Sprint {i}", es_actual=(i == 4), fecha_fin=f"2025-0{i + 1}-28")
+        for i in range(1, 5)
+    ]
+    tareas = {sprint: [ws.crear_tarea(f"Tarea {sprint[:4]} {j}", sprint, [persona]) for j in range(3)]
+              for sprint in sprints}
+    # Inválida (sin personas) en el sprint actual
+    ws.crear_tarea("Sin personas", sprints[3], [])
+    return ws, sprints, tareas
+
+
+def instalar(ws, falla_or=False):
+    cliente = NotionSimulado(workspace=ws)
+    consultas = []
+    original = cliente.databases.query
+    cliente.escrituras = []
+    actualizar = cliente.pages.update
+
+    def update(**kwargs):
+        cliente.escrituras.append(kwargs["page_id"])
+        return actualizar(**kwargs)
+
+    cliente.pages.update = update
+
+    def query(**kwargs):
+        if kwargs.get("database_id") == "db-tareas":
+            consultas.append(kwargs["filter"])
+            if falla_or and "or" in kwargs["filter"]:
+                raise RuntimeError("filtro compuesto no disponible")
+        return original(**kwargs)
+
+    cliente.databases.query = query
+    setup_monitoring.notion = cliente
+    return consultas
+
+
+def test_una_consulta_para_todos_los_sprints():
+    ws, sprints, tareas = construir_sprints()
+    consultas = instalar(ws)
+    setup = setup_monitoring.MonitoringSetupInteligente()
+
+    relevantes = setup.obtener_sprints_relevantes()
+    assert [s["id"] for s in relevantes] == [sprints[3], sprints[2], sprints[1]]
+
+    obtenidas = {t["id"] for t in setup.obtener_tareas_sprints_monitoreados(relevantes)}
+    assert obtenidas == set(tareas[sprints[3]] + tareas[sprints[2]] + tareas[sprints[1]])
+    assert len(consultas) == 1 and len(consultas[0]["or"]) == 3
+
+
+def test_consultas_por_sprint_si_falla_la_compuesta():
+    ws, sprints, tareas = construir_sprints()
+    consultas = instalar(ws, falla_or=True)
+    setup = setup_monitoring.MonitoringSetupInteligente()
+
+    relevantes = setup.obtener_sprints_relevantes()
+    obtenidas = [t["id"] for t in setup.obtener_tareas_sprints_monitoreados(relevantes)]
+    assert sorted(obtenidas) == sorted(tareas[sprints[3]] + tareas[sprints[2]] + tareas[sprints[1]])
+    assert len(consultas) == 1 + 3
+
+
+def test_configuracion_completa_crea_snapshot_global():
+    ws, sprints, tareas = construir_sprints()
+    instalar(ws)
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as directorio:
+        os.chdir(directorio)
+        try:
+            assert setup_monitoring.MonitoringSetupInteligente().configurar_monitoreo_inteligente()
+            store = SnapshotStore()
+            assert store.cargar() == 9
+        finally:
+            os.chdir(directorio_original)
+
+    activos = [ws.paginas[s]["properties"]["Monitoreo Activo"]["checkbox"] for s in sprints]
+    assert activos == [False, True, True, True]
+
+
+def test_monitoreo_activo_solo_escribe_diferencias():
+    ws, sprints, _ = construir_sprints()
+    instalar(ws)
+    setup = setup_monitoring.MonitoringSetupInteligente()
+    relevantes = setup.obtener_sprints_relevantes()
+
+    # Todos marcados (valor por defecto del workspace): solo se desmarca el más antiguo
+    assert setup.sincronizar_monitoreo_activo(relevantes) == 1
+    assert setup_monitoring.notion.escrituras == [sprints[0]]
+
+    # Sin cambios: ninguna escritura
+    assert setup.sincronizar_monitoreo_activo(relevantes) == 0
+
+    # Empieza un sprint nuevo: se marca el nuevo y se desmarca el que sale de la ventana
+    for sprint in sprints:
+        ws.paginas[sprint]["properties"]["Es Actual"]["formula"]["boolean"] = False
+    nuevo = ws.crear_sprint("Sprint 5", monitoreo_activo=False, es_actual=True, fecha_fin="2025-06-28")
+    setup_monitoring.notion.escrituras.clear()
+    relevantes = setup.obtener_sprints_relevantes()
+    assert setup.sincronizar_monitoreo_activo(relevantes) == 2
+    assert sorted(setup_monitoring.notion.escrituras) == sorted([nuevo, sprints[1]])
+
+
+def test_descubrimiento_corta_al_tener_n_anteriores():
+    ws, sprints, _ = construir_sprints()
+    consultas = instalar(ws)
+    sprint_consultas = []
+    query = setup_monitoring.notion.databases.query
+
+    def contar(**kwargs):
+        if kwargs.get("database_id") == "db-sprints":
+            sprint_consultas.append(kwargs)
+        return query(**kwargs)
+
+    setup_monitoring.notion.databases.query = contar
+    # Sprint sin fecha fin: nunca cuenta como anterior
+    ws.crear_sprint("Sin fecha", es_actual=False, fecha_fin=None)
+
+    relevantes = setup_monitoring.MonitoringSetupInteligente(sprints_anteriores=1).obtener_sprints_relevantes()
+    assert [s["id"] for s in relevantes] == [sprints[3], sprints[2]]
+    assert [c["page_size"] for c in sprint_consultas] == [1, 1]
+
+    relevantes = setup_monitoring.MonitoringSetupInteligente(sprints_anteriores=5).obtener_sprints_relevantes()
+    assert [s["id"] for s in relevantes] == [sprints[3], sprints[2], sprints[1], sprints[0]]
+    assert not consultas
+
+
+def test_incremental_solo_actualiza_lo_editado():
+    ws, sprints, tareas = construir_sprints()
+    consultas = instalar(ws)
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as directorio:
+        os.chdir(directorio)
+        try:
+            setup = setup_monitoring.MonitoringSetupInteligente()
+            assert setup.configurar_monitoreo_inteligente()
+            assert SnapshotStore().cargar() == 9
+
+            # Todo lo existente queda antes de la marca de agua
+            for pagina in ws.paginas.values():
+                pagina["last_edited_time"] = "2025-01-01T00:00:00.000Z"
+            editada, eliminada, movida = tareas[sprints[3]]
+            ws.editar(editada, {"Prioridad": {"select": {"name": "Alta"}}}, "usuario")
+            ws.eliminar(eliminada)
+            ws.editar(movida, {"Sprint": {"relation": [{"id": sprints[0]}]}}, "usuario")
+            consultas.clear()
+
+            assert setup.configurar_monitoreo_inteligente(incremental=True)
+            store = SnapshotStore()
+            assert store.cargar() == 7
+            assert store.obtener(editada)["Prioridad"] == "Alta"
+            assert eliminada not in store and movida not in store
+            assert store.metadatos["sprints"] == sorted([sprints[3], sprints[2], sprints[1]])
+
+            # Tareas editadas + reconciliación de ids
+            assert len(consultas) == 2 and "and" in consultas[0] and "or" in consultas[1]
+
+            # Cambia la ventana de sprints: reconstrucción completa
+            consultas.clear()
+            assert setup_monitoring.MonitoringSetupInteligente(sprints_anteriores=1).configurar_monitoreo_inteligente(
+                incremental=True)
+            assert SnapshotStore().cargar() == 4
+            assert len(consultas) == 1 and "and" not in consultas[0]
+        finally:
+            os.chdir(directorio_original)
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
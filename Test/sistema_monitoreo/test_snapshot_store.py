@@ -0,0 +1,264 @@
+"""
+Test de Snapshots Compactos
+===========================
+
+Verifica el registro compacto de snapshots (SnapshotTarea) y su almacén en disco,
+sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_snapshot_store.py
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from snapshot_store import EscritorSnapshots, LectorSnapshots, SnapshotStore, SnapshotTarea, escribir_snapshots
+
+TAREA_ID = "1f2e3d4c-5b6a-4978-8a9b-0c1d2e3f4a5b"
+PERSONA_1 = "aaaaaaaa-bbbb-4ccc-8ddd-eeeeeeeeeeee"
+PERSONA_2 = "11111111-2222-4333-8444-555555555555"
+
+VALORES = {
+    "Nombre": "Diseñar landing",
+    "Personas": [PERSONA_1, PERSONA_2],
+    "Prioridad": "Alta",
+    "Tamaño": "M",
+    "Estado": "En curso"
+}
+
+
+def test_snapshot_compatible_con_dict():
+    """El snapshot compacto responde igual que el dict anterior"""
+    snapshot = SnapshotTarea.desde_valores(TAREA_ID, VALORES, "2025-06-19T15:00:00.000Z", "2025-06-19T14:59:00.000Z")
+
+    assert snapshot.get("Nombre") == "Diseñar landing"
+    assert snapshot.get("nombre_tarea") == "Diseñar landing"
+    assert snapshot.get("Personas") == [PERSONA_1, PERSONA_2]
+    assert snapshot.get("Prioridad") == "Alta"
+    assert snapshot.get("last_edited_time") == "2025-06-19T14:59:00.000Z"
+    assert snapshot.get("inexistente", "x") == "x"
+    assert len(snapshot.tarea_id) == 16
+    assert not hasattr(snapshot, "__dict__")
+
+
+def test_valores_enum_internados():
+    """Estado/Prioridad/Tamaño comparten una única copia por valor"""
+    a = SnapshotTarea.desde_valores(TAREA_ID, dict(VALORES, Estado="".join(["Lis", "to"])), None, None)
+    b = SnapshotTarea.desde_valores(PERSONA_1, dict(VALORES, Estado="".join(["Li", "sto"])), None, None)
+    assert a.estado is b.estado
+
+
+def test_personas_vacias_y_ausentes():
+    """Se distingue relación vacía ([]) de propiedad ausente (None)"""
+    vacia = SnapshotTarea.desde_valores(TAREA_ID, dict(VALORES, Personas=[]), None, None)
+    ausente = SnapshotTarea.desde_valores(TAREA_ID, dict(VALORES, Personas=None), None, None)
+    assert vacia.get("Personas") == []
+    assert ausente.get("Personas") is None
+
+
+def test_persistencia_y_carga():
+    """Ida y vuelta por disco en formato compacto"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        snapshot = SnapshotTarea.desde_valores(TAREA_ID, VALORES, "2025-06-19T15:00:00.000Z", None)
+        escribir_snapshots([snapshot], ruta)
+
+        store = SnapshotStore(ruta)
+        assert store.cargar() == 1
+        cargado = store.obtener(TAREA_ID)
+        assert cargado.get("Personas") == VALORES["Personas"]
+        assert cargado.get("Tamaño") == "M"
+        assert cargado.get("last_edited_time") is None
+
+        assert store.eliminar(TAREA_ID)
+        store.persistir()
+        assert SnapshotStore(ruta).cargar() == 0
+
+
+def test_carga_formato_anterior():
+    """Los archivos v1 (dict con indentación) siguen siendo legibles"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        legado = {TAREA_ID: dict(VALORES, timestamp="2025-06-19T15:00:00Z", last_edited_time=None, nombre_tarea="Diseñar landing")}
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(legado, f, ensure_ascii=False, indent=2)
+
+        store = SnapshotStore(ruta)
+        assert store.cargar() == 1
+        assert store.obtener(TAREA_ID).get("Estado") == "En curso"
+
+
+
+def test_carga_formato_documento_v2():
+    """Los archivos v2 (documento único con "tareas") siguen siendo legibles"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        snapshot = SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, None)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"version": 2, "marca_agua": "2025-06-19T15:00:00.000Z",
+                       "tareas": {snapshot.tarea_id.hex(): snapshot.a_registro()}}, f)
+
+        store = SnapshotStore(ruta)
+        assert store.cargar() == 1
+        assert store.metadatos == {"marca_agua": "2025-06-19T15:00:00.000Z"}
+        assert store.obtener(TAREA_ID).get("Tamaño") == "M"
+
+
+def test_lector_perezoso_por_linea():
+    """Una línea por tarea; obtener() parsea solo la línea pedida"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        escribir_snapshots(
+            (SnapshotTarea.desde_valores(tarea_id, dict(VALORES, Nombre=tarea_id), None, None)
+             for tarea_id in (TAREA_ID, PERSONA_1, PERSONA_2)),
+            ruta,
+            {"marca_agua": "2025-06-19T15:00:00.000Z"}
+        )
+        with open(ruta, encoding="utf-8") as f:
+            assert len(f.readlines()) == 1 + 3
+
+        lector = LectorSnapshots(ruta)
+        assert lector.metadatos == {"marca_agua": "2025-06-19T15:00:00.000Z"}
+        assert lector.obtener(PERSONA_1).get("Nombre") == PERSONA_1
+        assert lector.obtener("00000000-0000-4000-8000-000000000000") is None
+        assert len(lector) == 3 and TAREA_ID in lector
+        assert [s.id_texto for s in lector] == [TAREA_ID, PERSONA_1, PERSONA_2]
+
+
+def test_escritura_fallida_conserva_archivo_anterior():
+    """Un error a mitad de la escritura no deja un archivo parcial"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        escribir_snapshots([SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, None)], ruta)
+
+        def snapshots_con_error():
+            yield SnapshotTarea.desde_valores(PERSONA_1, VALORES, None, None)
+            raise RuntimeError("consulta interrumpida")
+
+        try:
+            escribir_snapshots(snapshots_con_error(), ruta)
+        except RuntimeError:
+            pass
+        assert SnapshotStore(ruta).cargar() == 1
+        assert os.listdir(directorio) == ["task_snapshots.json"]
+
+        with EscritorSnapshots(ruta) as escritor:
+            escritor.descartar()
+        assert TAREA_ID in LectorSnapshots(ruta)
+
+
+def test_persistir_sin_cambios_no_escribe():
+    """Un almacén sin cambios locales no toca el archivo"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        escribir_snapshots([SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, None)], ruta)
+        store = SnapshotStore(ruta)
+        store.cargar()
+        escrito = os.stat(ruta).st_mtime_ns
+
+        assert not store.modificado and store.persistir() is False
+        assert os.stat(ruta).st_mtime_ns == escrito
+
+
+def test_persistir_fusiona_archivo_reescrito_por_setup():
+    """Si setup reescribió el archivo, persistir conserva sus tareas y metadatos
+    y agrega encima solo los cambios locales
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        escribir_snapshots([SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, None)], ruta)
+        store = SnapshotStore(ruta)
+        store.cargar()
+
+        # Cambio local del servidor (tarea existente)
+        store.actualizar(TAREA_ID, dict(VALORES, Estado="Listo"), None, "2025-06-19T15:00:00.000Z")
+
+        # setup_monitoring reescribe con la tarea del sprint nuevo y su marca de agua
+        escribir_snapshots(
+            [SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, "2025-06-19T14:00:00.000Z"),
+             SnapshotTarea.desde_valores(PERSONA_1, VALORES, None, None)],
+            ruta,
+            {"marca_agua": "2025-06-20T00:00:00.000Z"}
+        )
+
+        assert store.persistir()
+        en_disco = SnapshotStore(ruta)
+        assert en_disco.cargar() == 2
+        assert en_disco.metadatos == {"marca_agua": "2025-06-20T00:00:00.000Z"}
+        assert en_disco.obtener(TAREA_ID).get("Estado") == "Listo"
+        assert PERSONA_1 in en_disco
+        assert not store.modificado
+
+
+def test_apagado_tras_setup_no_pisa_archivo():
+    """setup reescribe el archivo con el servidor corriendo; al apagar no se pisa
+    y el reinicio arranca con las tareas y la marca de agua de setup
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        escribir_snapshots([SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, None)], ruta)
+        servidor = SnapshotStore(ruta)
+        servidor.cargar()
+
+        # Apagado sin cambios: no escribe
+        escrito = os.stat(ruta).st_mtime_ns
+        assert servidor.persistir_si_vigente() is False
+        assert os.stat(ruta).st_mtime_ns == escrito
+
+        servidor.actualizar(TAREA_ID, dict(VALORES, Estado="Listo"), None, "2025-06-19T15:00:00.000Z")
+        escribir_snapshots(
+            [SnapshotTarea.desde_valores(PERSONA_1, VALORES, None, None)],
+            ruta,
+            {"marca_agua": "2025-06-20T00:00:00.000Z"}
+        )
+        escrito = os.stat(ruta).st_mtime_ns
+        assert servidor.persistir_si_vigente() is False
+        assert os.stat(ruta).st_mtime_ns == escrito
+
+        reinicio = SnapshotStore(ruta)
+        assert reinicio.cargar() == 1
+        assert PERSONA_1 in reinicio and TAREA_ID not in reinicio
+        assert reinicio.metadatos == {"marca_agua": "2025-06-20T00:00:00.000Z"}
+
+        # Archivo vigente con cambios propios: sí se escribe
+        reinicio.guardar(SnapshotTarea.desde_valores(PERSONA_2, VALORES, None, None))
+        assert reinicio.persistir_si_vigente() is True
+        final = SnapshotStore(ruta)
+        assert final.cargar() == 2 and final.metadatos == {"marca_agua": "2025-06-20T00:00:00.000Z"}
+
+
+def test_recarga_conserva_cambios_locales():
+    """Recargar tras una reescritura externa no pierde lo que aún no se persistió"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        escribir_snapshots([SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, None)], ruta)
+        store = SnapshotStore(ruta)
+        store.cargar()
+        store.guardar(SnapshotTarea.desde_valores(PERSONA_2, VALORES, None, None))
+
+        escribir_snapshots([SnapshotTarea.desde_valores(PERSONA_1, VALORES, None, None)], ruta)
+        store.recargar_si_cambio()
+        assert PERSONA_1 in store and PERSONA_2 in store and TAREA_ID not in store
+
+
+def test_carga_en_segundo_plano():
+    """Arranque en caliente: las consultas esperan a que termine la carga"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "task_snapshots.json")
+        escribir_snapshots([SnapshotTarea.desde_valores(TAREA_ID, VALORES, None, None)], ruta)
+
+        store = SnapshotStore(ruta)
+        store.cargar_en_segundo_plano()
+        assert store.obtener(TAREA_ID).get("Prioridad") == "Alta"
+        assert store.listo and len(store) == 1
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
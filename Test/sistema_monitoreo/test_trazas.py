@@ -0,0 +1,81 @@
+"""
+Test de Trazas por Etapa
+========================
+
+Verifica spans anidados por etapa, el registro de las trazas más lentas
+y la exportación JSONL, sin conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_trazas.py
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+from trazas import RegistroTrazas, etapa, trazar, iniciar_traza, finalizar_traza
+
+
+@trazar("revertir")
+def revertir():
+    time.sleep(0.002)
+
+
+@trazar("procesar_cambio")
+def procesar_cambio():
+    revertir()
+
+
+def test_spans_anidados_con_espera_de_cola():
+    iniciar_traza("pagina-1", "evt-1", "page.properties_updated", espera_cola=0.5)
+    with etapa("obtener_tarea"):
+        pass
+    procesar_cambio()
+    traza = finalizar_traza("procesado_1_cambios")
+
+    etapas = {span["etapa"]: span for span in traza.a_dict()["etapas"]}
+    assert list(etapas) == ["cola", "obtener_tarea", "revertir", "procesar_cambio"]
+    assert etapas["cola"]["inicio_ms"] == 0 and etapas["cola"]["duracion_ms"] == 500
+    assert etapas["revertir"]["profundidad"] == 1 and etapas["procesar_cambio"]["profundidad"] == 0
+    # El total cuenta desde que el evento entró a la cola
+    assert traza.total_ms >= 502 and traza.evento_id == "evt-1"
+
+
+def test_sin_traza_activa_no_registra():
+    assert finalizar_traza() is None
+    procesar_cambio()
+    assert finalizar_traza() is None
+
+
+def test_conserva_las_mas_lentas_y_exporta():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "trazas.jsonl")
+        registro = RegistroTrazas(capacidad=2)
+        registro.exportar_a(ruta)
+
+        for i, espera in enumerate([0.3, 0.1, 0.5, 0.2]):
+            traza = iniciar_traza(f"pagina-{i}", espera_cola=espera)
+            finalizar_traza()
+            registro.registrar(traza)
+
+        assert [t["page_id"] for t in registro.mas_lentas()] == ["pagina-2", "pagina-0"]
+        assert registro.trazas_registradas == 4
+
+        for _ in range(50):
+            with open(ruta, encoding="utf-8") as f:
+                lineas = f.readlines()
+            if len(lineas) == 4:
+                break
+            time.sleep(0.02)
+        assert [json.loads(linea)["page_id"] for linea in lineas] == [f"pagina-{i}" for i in range(4)]
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")
@@ -0,0 +1,345 @@
+"""
+Test del Servidor de Webhooks
+=============================
+
+Verifica la coalescencia por página (fusión, ack de todos los ids en la cola
+durable, vaciado al vencer la ventana y al apagar) y la ingesta acotada (descarte,
+503 con Retry-After, reintento del mismo id, sin descarte de duplicados en la
+ingesta multiproceso), el orden por página entre shards, la
+espera bloqueante de los workers y el drenado con sentinel al apagar, con
+procesadores propios por test y el monitor reemplazado por un registro, sin
+conexión a Notion.
+
+EJECUCIÓN:
+python Test/sistema_monitoreo/test_webhook_server.py
+"""
+
+import os
+import sys
+import time
+import uuid
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../Auto/sistema_monitoreo'))
+
+# Servidor solo en memoria (sin cola durable, índice de ids ni estado de arranque en disco);
+# el log del import queda en un directorio temporal
+os.environ.update({
+    "WEBHOOK_MODO": "unico",
+    "WEBHOOK_COLA_DURABLE": "",
+    "WEBHOOK_IDEMPOTENCIA": "",
+    "WEBHOOK_ESTADO_ARRANQUE": "",
+    "WEBHOOK_SECRET": ""
+})
+_directorio_original = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="webhook_server_"))
+try:
+    import webhook_server
+    from logging_config import detener_logging
+finally:
+    os.chdir(_directorio_original)
+
+# Sin el listener de consola del servidor (apunta al stderr del import); pytest captura
+# los registros de cada test por su cuenta
+detener_logging()
+logging.basicConfig(level=logging.WARNING, handlers=[logging.NullHandler()], force=True)
+
+from cola_durable import ColaDurable
+from webhook_server import WebhookProcessor
+
+PAGINA_A = "aaaaaaaa-0000-4000-8000-000000000001"
+PAGINA_B = "bbbbbbbb-0000-4000-8000-000000000002"
+
+
+def evento(page_id, tipo="page.properties_updated", propiedades=("pri1",)):
+    datos = {"id": str(uuid.uuid4()), "type": tipo, "page_id": page_id}
+    if tipo == "page.properties_updated":
+        datos["properties"] = list(propiedades)
+    return datos
+
+
+def procesador(num_shards=1, ventana_coalescencia=0, max_cola=0):
+    return WebhookProcessor(num_shards=num_shards, ventana_coalescencia=ventana_coalescencia, max_cola=max_cola)
+
+
+def iniciar_workers(processor):
+    for shard in range(processor.num_shards):
+        worker = threading.Thread(target=processor.worker_eventos, args=(shard,),
+                                  name=f"worker-shard-{shard}", daemon=True)
+        worker.start()
+        processor.workers.append(worker)
+
+
+def esperar(condicion, timeout=2):
+    limite = time.monotonic() + timeout
+    while not condicion() and time.monotonic() < limite:
+        time.sleep(0.01)
+    return condicion()
+
+
+@contextmanager
+def monitor_registrado():
+    """Reemplaza el procesamiento del monitor por un registro (hilo, tipo, page_id, evento)"""
+    monitor = webhook_server.monitor
+    procesados = []
+
+    def registrar(tipo):
+        def procesar(page_id, evento):
+            procesados.append((threading.current_thread().name, tipo, page_id, dict(evento)))
+            return "procesado"
+        return procesar
+
+    monitor.procesar_tarea_modificada = registrar("page.properties_updated")
+    monitor.procesar_tarea_nueva = registrar("page.created")
+    monitor.procesar_tarea_eliminada = registrar("page.deleted")
+    try:
+        yield procesados
+    finally:
+        del monitor.procesar_tarea_modificada
+        del monitor.procesar_tarea_nueva
+        del monitor.procesar_tarea_eliminada
+
+
+def test_coalescencia_fusiona_eventos_de_la_pagina():
+    with monitor_registrado() as procesados:
+        processor = procesador(ventana_coalescencia=60)
+        pendientes = OrderedDict()
+        for item in (evento(PAGINA_A, propiedades=["pri1"]), evento(PAGINA_A, propiedades=["tam1"]),
+                     evento(PAGINA_B), evento(PAGINA_A, propiedades=["pri1", "nom1"])):
+            processor.coalescer_o_procesar(item, pendientes)
+        assert procesados == [] and list(pendientes) == [PAGINA_A, PAGINA_B]
+
+        # Una eliminación procesa antes lo retenido de su página (orden por página)
+        processor.coalescer_o_procesar(evento(PAGINA_A, tipo="page.deleted"), pendientes)
+        assert [(tipo, page_id) for _, tipo, page_id, _ in procesados] == [
+            ("page.properties_updated", PAGINA_A), ("page.deleted", PAGINA_A)
+        ]
+        fusionado = procesados[0][3]
+        assert fusionado["properties"] == ["pri1", "tam1", "nom1"]
+        assert fusionado["_eventos_fusionados"] == 3 and processor.eventos_coalescidos == 2
+        assert list(pendientes) == [PAGINA_B]
+
+
+def test_coalescencia_confirma_todos_los_ids_durables():
+    with tempfile.TemporaryDirectory() as directorio, monitor_registrado() as procesados:
+        ruta = os.path.join(directorio, "eventos.db")
+        processor = procesador(ventana_coalescencia=60)
+        processor.cola_durable = ColaDurable(ruta)
+        processor.cola_durable.iniciar()
+
+        pendientes = OrderedDict()
+        for _ in range(3):
+            item = evento(PAGINA_A)
+            assert processor.cola_durable.agregar(item, 0).esperar(5)
+            processor.coalescer_o_procesar(item, pendientes)
+        processor.procesar_vencidos(pendientes, todos=True)
+        processor.cola_durable.detener()
+
+        assert len(procesados) == 1 and procesados[0][3]["_ids_durables"] == [1, 2, 3]
+        # Ningún evento fusionado se reproduce al reiniciar
+        reinicio = ColaDurable(ruta)
+        assert reinicio.iniciar() == []
+        reinicio.detener()
+
+
+def test_coalescencia_vacia_al_vencer_la_ventana():
+    with monitor_registrado() as procesados:
+        processor = procesador(ventana_coalescencia=0.05)
+        iniciar_workers(processor)
+        processor.encolar_evento(evento(PAGINA_A, propiedades=["pri1"]))
+        processor.encolar_evento(evento(PAGINA_A, propiedades=["tam1"]))
+
+        # Sin más eventos: el worker despierta cuando vence la ventana
+        assert esperar(lambda: len(procesados) == 1)
+        assert procesados[0][3]["properties"] == ["pri1", "tam1"]
+        assert processor.detener_workers(5)
+
+
+def test_coalescencia_vacia_al_apagar():
+    with monitor_registrado() as procesados:
+        processor = procesador(ventana_coalescencia=60)
+        iniciar_workers(processor)
+        processor.encolar_evento(evento(PAGINA_A))
+        processor.encolar_evento(evento(PAGINA_B))
+        assert esperar(lambda: processor.eventos_pendientes() == 0)
+        assert procesados == []
+
+        # El apagado no espera la ventana: lo retenido se procesa antes de terminar
+        assert processor.detener_workers(5)
+        assert [page_id for _, _, page_id, _ in procesados] == [PAGINA_A, PAGINA_B]
+
+
+@contextmanager
+def esquema_conocido():
+    """Ids de propiedad de los webhooks → nombres (decide qué se puede descartar)"""
+    monitor = webhook_server.monitor
+    anterior = monitor.esquema_propiedades
+    monitor.esquema_propiedades = {"pri1": "Prioridad", "tam1": "Tamaño", "not1": "Notas"}
+    try:
+        yield
+    finally:
+        monitor.esquema_propiedades = anterior
+
+
+@contextmanager
+def servidor_con(processor):
+    """Cliente de prueba de Flask con el endpoint usando el procesador indicado"""
+    anteriores = webhook_server.processor, webhook_server.DB_TAREAS_ID
+    webhook_server.processor = processor
+    webhook_server.DB_TAREAS_ID = "db-tareas"
+    try:
+        yield webhook_server.app.test_client()
+    finally:
+        webhook_server.processor, webhook_server.DB_TAREAS_ID = anteriores
+
+
+def webhook(page_id, propiedades=("pri1",), id_evento=None):
+    """Payload con la estructura de los webhooks de Notion"""
+    return {
+        "id": id_evento or str(uuid.uuid4()),
+        "type": "page.properties_updated",
+        "authors": [{"id": "usuario", "type": "person"}],
+        "entity": {"id": page_id, "type": "page"},
+        "data": {"parent": {"id": "db-tareas", "type": "database"}, "updated_properties": list(propiedades)}
+    }
+
+
+def test_cola_llena_descarta_lo_de_menor_valor():
+    with esquema_conocido():
+        processor = procesador(max_cola=2)
+        assert processor.aceptar_evento(evento(PAGINA_A)) == "encolado"
+        assert processor.aceptar_evento(evento(PAGINA_B, tipo="page.created")) == "encolado"
+
+        # Solo campos no monitoreados: nada que revertir ni registrar
+        assert processor.aceptar_evento(evento(PAGINA_B, propiedades=["not1"])) == "descartado"
+        # Ya hay una actualización de la página en cola: su diff completo lo cubre
+        assert processor.aceptar_evento(evento(PAGINA_A, propiedades=["tam1"])) == "descartado"
+        assert processor.eventos_descartados == {"no_monitoreado": 1, "duplicado": 1}
+
+        # Lo que puede requerir reversión no se descarta: se pide reintento
+        assert processor.aceptar_evento(evento(PAGINA_B)) == "saturado"
+        assert processor.aceptar_evento(evento(PAGINA_B, tipo="page.deleted")) == "saturado"
+        assert processor.eventos_rechazados == 2 and processor.eventos_pendientes() == 2
+
+
+def test_ingesta_multiproceso_no_descarta_duplicados():
+    with esquema_conocido(), tempfile.TemporaryDirectory() as directorio:
+        processor = WebhookProcessor(num_shards=2, ventana_coalescencia=0, max_cola=2, modo="ingesta")
+        processor.iniciar_cola_durable(os.path.join(directorio, "eventos.db"))
+        try:
+            assert processor.aceptar_evento(evento(PAGINA_A)) == "encolado"
+            assert processor.aceptar_evento(evento(PAGINA_B)) == "encolado"
+            # Sin esperar el TTL del conteo compartido
+            processor.conteo_compartido = (0, 0.0)
+
+            # Otra actualización de la página: el worker puede estar procesándola, se pide reintento
+            assert processor.aceptar_evento(evento(PAGINA_A, propiedades=["tam1"])) == "saturado"
+            # El descarte por campos no monitoreados no depende de la cola
+            assert processor.aceptar_evento(evento(PAGINA_A, propiedades=["not1"])) == "descartado"
+            assert processor.eventos_descartados == {"no_monitoreado": 1, "duplicado": 0}
+        finally:
+            processor.cola_durable.detener()
+
+
+def test_endpoint_saturado_responde_503_y_olvida_el_id():
+    with esquema_conocido():
+        processor = procesador(max_cola=1)
+        with servidor_con(processor) as cliente:
+            assert cliente.post("/webhook", json=webhook(PAGINA_A)).get_json() == {"status": "received"}
+            assert cliente.post("/webhook", json=webhook(PAGINA_B, ["not1"])).get_json() == {"status": "shed"}
+
+            rechazado = webhook(PAGINA_B, id_evento="evento-rechazado")
+            respuesta = cliente.post("/webhook", json=rechazado)
+            assert respuesta.status_code == 503
+            assert respuesta.headers["Retry-After"] == str(webhook_server.WEBHOOK_RETRY_AFTER)
+
+            # Con espacio en la cola, el reintento de Notion (mismo id) se acepta
+            processor.max_cola = 2
+            respuesta = cliente.post("/webhook", json=rechazado)
+            assert respuesta.status_code == 200 and respuesta.get_json() == {"status": "received"}
+            assert cliente.post("/webhook", json=rechazado).get_json() == {"status": "duplicate_delivery"}
+            assert processor.eventos_pendientes() == 2
+
+
+def test_shards_conservan_el_orden_por_pagina():
+    with monitor_registrado() as procesados:
+        processor = procesador(num_shards=3)
+        iniciar_workers(processor)
+        # Dos páginas por shard
+        paginas = []
+        while len(paginas) < 6:
+            page_id = str(uuid.uuid4())
+            if sum(processor.shard_de(otra) == processor.shard_de(page_id) for otra in paginas) < 2:
+                paginas.append(page_id)
+        for secuencia in range(25):
+            for page_id in paginas:
+                item = evento(page_id)
+                item["secuencia"] = secuencia
+                processor.encolar_evento(item)
+        assert processor.detener_workers(5)
+
+        assert len(procesados) == 25 * len(paginas)
+        for page_id in paginas:
+            de_la_pagina = [(hilo, item["secuencia"]) for hilo, _, pagina, item in procesados if pagina == page_id]
+            # Siempre el worker de su shard, en el orden de llegada
+            assert {hilo for hilo, _ in de_la_pagina} == {f"worker-shard-{processor.shard_de(page_id)}"}
+            assert [secuencia for _, secuencia in de_la_pagina] == list(range(25))
+        assert len({hilo for hilo, _, _, _ in procesados}) == 3
+
+
+def test_worker_bloquea_en_la_cola_sin_sondear():
+    with monitor_registrado() as procesados:
+        processor = procesador()
+        cola = processor.colas_shard[0]
+        llamadas = []
+        get_original = cola.get
+
+        def get(timeout=None):
+            llamadas.append(timeout)
+            return get_original(timeout=timeout)
+
+        cola.get = get
+        iniciar_workers(processor)
+        time.sleep(0.2)
+        # Sin eventos ni ventanas abiertas: una sola espera sin timeout
+        assert llamadas == [None] and procesados == []
+
+        processor.encolar_evento(evento(PAGINA_A))
+        assert esperar(lambda: len(procesados) == 1)
+        assert processor.detener_workers(5)
+
+
+def test_apagado_drena_la_cola_antes_del_join():
+    with monitor_registrado() as procesados:
+        processor = procesador(num_shards=2)
+        trabajos = []
+
+        def procesar_lento(page_id, evento):
+            time.sleep(0.002)
+            procesados.append((threading.current_thread().name, evento["type"], page_id, dict(evento)))
+            # Como la persistencia de snapshots: trabajo de fondo generado al procesar
+            processor.encolar_trabajo(trabajos.append, page_id)
+            return "procesado"
+
+        webhook_server.monitor.procesar_tarea_modificada = procesar_lento
+        for _ in range(20):
+            processor.encolar_evento(evento(PAGINA_A))
+            processor.encolar_evento(evento(PAGINA_B))
+        iniciar_workers(processor)
+
+        # El sentinel va en prioridad de fondo: todo lo encolado antes se procesa
+        assert processor.detener_workers(5)
+        assert not any(worker.is_alive() for worker in processor.workers)
+        assert len(procesados) == 40 and len(trabajos) == 40
+        assert all(cola.qsize() == 0 for cola in processor.colas_shard)
+
+
+if __name__ == "__main__":
+    for nombre, funcion in list(globals().items()):
+        if nombre.startswith("test_"):
+            funcion()
+            print(f"✅ {nombre}")